@@ -5,6 +5,11 @@ class Action:
     ACTION_TAKE_DOMINO = "Take domino"
     ACTION_NEXT_PLAYER_TURN = "Next player turn"
 
+    # Small int encoding of actions. Save dice actions are encoded as the die number (1-6) and take domino actions
+    # are encoded as the domino number (21-36)
+    CODE_ROLL_DICE = 0
+    CODE_NEXT_PLAYER_TURN = 7
+
     def __init__(self, name, optional_args=None):
         self.name = name
         self.optional_args = optional_args
@@ -14,3 +19,31 @@ class Action:
 
     def __eq__(self, other):
         return self.name == other.name and self.optional_args == other.optional_args
+
+    def to_code(self) -> int:
+        """
+        Encode the action as a small int
+        :return: Int code for the action
+        """
+        if self.name == Action.ACTION_SAVE_DICE:
+            return self.optional_args
+        elif self.name == Action.ACTION_TAKE_DOMINO:
+            return self.optional_args[0]
+        elif self.name == Action.ACTION_ROLL_DICE:
+            return Action.CODE_ROLL_DICE
+        return Action.CODE_NEXT_PLAYER_TURN
+
+    @staticmethod
+    def from_code(code: int) -> 'Action':
+        """
+        Decode an action from the int code created by to_code
+        :param code: Int code for the action
+        :return: Action for the code
+        """
+        if code == Action.CODE_ROLL_DICE:
+            return Action(Action.ACTION_ROLL_DICE)
+        elif code == Action.CODE_NEXT_PLAYER_TURN:
+            return Action(Action.ACTION_NEXT_PLAYER_TURN)
+        elif code < Action.CODE_NEXT_PLAYER_TURN:
+            return Action(Action.ACTION_SAVE_DICE, code)
+        return Action(Action.ACTION_TAKE_DOMINO, (code, (code - 17) // 4))
@@ -0,0 +1,464 @@
+import random
+from collections import defaultdict
+from Action import Action
+from dice_tables import sample_roll
+from GameState import GameState, InvalidGameStateError, ALL_COMMUNITY_DOMINOES, BIT_DOMINOES
+from typing import DefaultDict, List, Tuple
+
+# Number of worms on each domino, indexed by domino number
+WORMS = tuple(0 if i < GameState.MIN_DOMINO else (i - 17) // 4 for i in range(GameState.MAX_DOMINO))
+
+# Score contributed by one die of each number, indexed by die number
+DIE_SCORES = (0, 1, 2, 3, 4, 5, 5)
+
+ALL_DIE_NUMBERS = 0b111111
+
+
+class CompactGameState:
+    """
+    Alternate representation of GameState that stores the state in small ints and tuples. Plays exactly the same game
+    as GameState, but copies are cheap and key() can be used directly as a dictionary key.
+
+    Community dominoes are a bitmask where bit i is set if domino MIN_DOMINO + i is available. Saved dice are stored
+    as the die numbers in the order they were saved (3 bits each) and a count of each die number (4 bits each).
+    Player stacks are tuples of domino numbers.
+    """
+
+    MIN_DOMINO = GameState.MIN_DOMINO
+    MAX_DOMINO = GameState.MAX_DOMINO
+    NUM_DICE = GameState.NUM_DICE
+    STARTING_PLAYER_TURN = GameState.STARTING_PLAYER_TURN
+    DEBUG = GameState.DEBUG
+    VALIDATE_EVERY = GameState.VALIDATE_EVERY
+    _validation_counter = 0
+
+    __slots__ = ("num_players", "player_stacks", "worm_counts", "community", "player_turn", "saved_order",
+                 "saved_counts", "saved_mask", "num_saved", "score", "roll", "is_roll_resolved", "dice_log", "rng")
+
+    def __init__(self, num_players):
+        """
+        Create a CompactGameState for a new game
+        """
+        self.num_players = num_players
+        self.player_stacks = ((),) * num_players
+        self.worm_counts = (0,) * num_players
+        self.community = ALL_COMMUNITY_DOMINOES
+        self.player_turn = self.STARTING_PLAYER_TURN
+
+        self.saved_order = 0
+        self.saved_counts = 0
+        self.saved_mask = 0
+        self.num_saved = 0
+        self.score = 0
+        self.roll = ()
+
+        self.is_roll_resolved = True
+
+        # List to record every dice roll in, or None to not record dice rolls. Not copied
+        self.dice_log = None
+
+        # Random number generator to roll dice with. See GameState.rng. Shared with copies
+        self.rng = None
+
+    def __copy__(self):
+        # Every field is immutable, so the copy can share them
+        gs_copy = CompactGameState.__new__(CompactGameState)
+        gs_copy.num_players = self.num_players
+        gs_copy.player_stacks = self.player_stacks
+        gs_copy.worm_counts = self.worm_counts
+        gs_copy.community = self.community
+        gs_copy.player_turn = self.player_turn
+        gs_copy.saved_order = self.saved_order
+        gs_copy.saved_counts = self.saved_counts
+        gs_copy.saved_mask = self.saved_mask
+        gs_copy.num_saved = self.num_saved
+        gs_copy.score = self.score
+        gs_copy.roll = self.roll
+        gs_copy.is_roll_resolved = self.is_roll_resolved
+        gs_copy.dice_log = None
+        gs_copy.rng = self.rng
+        return gs_copy
+
+    def __repr__(self):
+        return f"num_players:{self.num_players}.player_states:{self.player_states}." \
+            f"community_dominoes:{self.community_dominoes}.player_turn:{self.player_turn}." \
+            f"num_dice:{self.num_dice}.saved_dice:{self.saved_dice}.dice_roll:{self.dice_roll}." \
+            f"is_roll_resolved:{self.is_roll_resolved}"
+
+    def __str__(self):
+        return f"Player_turn:{self.player_turn}." \
+            f"Saved_dice:{self.saved_dice}.Dice_roll:{self.dice_roll}.RR:{self.is_roll_resolved}." \
+            f"Player_states:{self.player_states}." \
+            f"Community_dominoes:{self.community_dominoes}."
+
+    def key(self) -> Tuple:
+        """
+        Hashable key for the state. Two states have equal keys exactly when they have equal str() representations
+        """
+        return (self.player_turn, self.saved_order, self.saved_counts, self.roll, self.is_roll_resolved,
+                self.player_stacks, self.community)
+
+    def canonical_key(self) -> Tuple:
+        """
+        Hashable key that is equal for states that play out the same. Saved dice and the dice roll are compared as
+        multisets, so saving the same dice in a different order reaches the same key
+        """
+        return (self.player_turn, self.saved_counts, tuple(sorted(self.roll)), self.is_roll_resolved,
+                self.player_stacks, self.community)
+
+    @classmethod
+    def from_game_state(cls, game_state: GameState) -> 'CompactGameState':
+        """
+        Create a CompactGameState equal to a list based GameState
+        """
+        gs = cls(game_state.num_players)
+        gs.player_stacks = tuple(tuple(d[0] for d in ps) for ps in game_state.player_states)
+        gs.worm_counts = tuple(sum([WORMS[d] for d in stack]) for stack in gs.player_stacks)
+        gs.community = game_state.community
+        gs.player_turn = game_state.player_turn
+        for die in game_state.saved_dice:
+            gs._save_die(die, 1)
+        gs.roll = tuple(game_state.dice_roll)
+        gs.is_roll_resolved = game_state.is_roll_resolved
+        gs.rng = game_state.rng
+        return gs
+
+    def to_game_state(self) -> GameState:
+        """
+        Create a list based GameState equal to this state
+        """
+        gs = GameState(self.num_players)
+        gs.player_states = self.player_states
+        gs.community = self.community
+        gs.player_turn = self.player_turn
+        gs.saved_dice = self.saved_dice
+        gs.dice_roll = self.dice_roll
+        gs.is_roll_resolved = self.is_roll_resolved
+        gs.rng = self.rng
+        return gs
+
+    @property
+    def num_dice(self) -> int:
+        return self.NUM_DICE
+
+    @property
+    def player_states(self) -> List[List[Tuple[int, int]]]:
+        return [[(d, WORMS[d]) for d in stack] for stack in self.player_stacks]
+
+    @property
+    def community_dominoes(self) -> List[Tuple[int, int]]:
+        return [domino for i, domino in enumerate(BIT_DOMINOES) if self.community >> i & 1]
+
+    @property
+    def saved_dice(self) -> List[int]:
+        saved_dice = []
+        order = self.saved_order
+        while order:
+            shift = (order.bit_length() - 1) // 3 * 3
+            die = order >> shift
+            order &= (1 << shift) - 1
+            saved_dice.extend([die] * (self.saved_counts >> (4 * die) & 0xF))
+        return saved_dice
+
+    @property
+    def dice_roll(self) -> List[int]:
+        return list(self.roll)
+
+    def is_game_over(self):
+        return self.community == 0
+
+    def get_next_action_codes(self) -> List[int]:
+        """
+        Same as get_next_actions, but returns int codes of the actions (see Action.to_code)
+        :return: list of action codes with >= 1 codes
+        """
+        if self.community == 0:
+            print("Game over. Final game state below")
+            self.print_current_state()
+            raise RuntimeError("get_next_action shouldn't be called on a complete game")
+
+        codes = []
+        if not self.is_roll_resolved:
+            # Die numbers that were rolled but have not been saved yet, in ascending order
+            for die in range(1, 7):
+                if not self.saved_mask >> die & 1 and die in self.roll:
+                    codes.append(die)
+        else:
+            # Must have a worm saved to take a domino
+            if self.saved_mask >> 6 & 1:
+                score = self.score
+                domino = self.highest_community_domino(score)
+                if domino:
+                    codes.append(domino)
+
+                for player_num, stack in enumerate(self.player_stacks):
+                    if player_num != self.player_turn and stack and stack[-1] == score:
+                        codes.append(score)
+
+            if self.saved_mask != ALL_DIE_NUMBERS << 1 and self.num_saved < self.NUM_DICE:
+                codes.append(Action.CODE_ROLL_DICE)
+
+        if not codes:
+            codes.append(Action.CODE_NEXT_PLAYER_TURN)
+        return codes
+
+    def get_next_actions(self) -> List[Action]:
+        """
+        Get all possible actions to take based on the current game state. Does not mutate self
+        :return: list of actions with >= 1 actions
+        """
+        return [Action.from_code(code) for code in self.get_next_action_codes()]
+
+    def highest_community_domino(self, score: int) -> int:
+        """
+        :return: Largest community domino number <= score, or 0 if there is no such domino
+        """
+        if score < self.MIN_DOMINO:
+            return 0
+        available = self.community & ((1 << (score - self.MIN_DOMINO + 1)) - 1)
+        if available == 0:
+            return 0
+        return self.MIN_DOMINO - 1 + available.bit_length()
+
+    def resolve_action(self, action: Action, dice: Tuple[int, ...] = None) -> Tuple:
+        """
+        Play the action out on the state. Mutates game state. If you need a new state, first
+        create a shallow copy of the state and then call resolve_action.
+        :param action: Action to take
+        :param dice: Dice to roll for a roll dice action instead of rolling with rng, for searches that choose roll
+        outcomes
+        :return: Undo record. Pass it to undo_action to restore the state from before the action
+        """
+        return self.resolve_action_code(action.to_code(), dice)
+
+    def resolve_action_code(self, code: int, dice: Tuple[int, ...] = None) -> Tuple:
+        """
+        Same as resolve_action, but takes the int code of the action (see Action.to_code)
+        :param code: Code of the action to take
+        :param dice: Dice to roll for a roll dice action instead of rolling with rng
+        :return: Undo record. Pass it to undo_action to restore the state from before the action
+        """
+        # Every field is immutable, so the undo record is the old fields
+        record = (self.player_stacks, self.worm_counts, self.community, self.player_turn, self.saved_order,
+                  self.saved_counts, self.saved_mask, self.num_saved, self.score, self.roll, self.is_roll_resolved)
+
+        validate = self.DEBUG and self.validation_due()
+        if validate:
+            try:
+                self.assert_valid_game_state()
+            except InvalidGameStateError:
+                raise InvalidGameStateError("resolve_action called with invalid state", game_state=self,
+                                            action=Action.from_code(code))
+
+        if code == Action.CODE_ROLL_DICE:
+            if validate:
+                if self.is_roll_resolved is False:
+                    raise InvalidGameStateError("Attempted to roll dice when dice roll has not been resolved",
+                                                game_state=self, action=Action.from_code(code))
+                if self.num_saved == self.NUM_DICE:
+                    raise InvalidGameStateError("Attempted to roll dice when all dice have already been saved",
+                                                game_state=self, action=Action.from_code(code))
+                if self.saved_mask == ALL_DIE_NUMBERS << 1:
+                    raise InvalidGameStateError("Attempted to roll dice when all dice all six dice numbers have been "
+                                                "saved", game_state=self, action=Action.from_code(code))
+
+            # Roll dice
+            self.roll = self.roll_dice(self.NUM_DICE - self.num_saved, dice)
+            self.is_roll_resolved = False
+
+            # Check if player busted
+            for die in self.roll:
+                if not self.saved_mask >> die & 1:
+                    break
+            else:
+                self.lose_domino()
+                self.increment_player_turn()
+
+        elif code < Action.CODE_NEXT_PLAYER_TURN:
+            if validate:
+                if self.is_roll_resolved is True:
+                    raise InvalidGameStateError("Attempted to save dice when roll has already been resolved",
+                                                game_state=self, action=Action.from_code(code))
+                if self.saved_mask >> code & 1:
+                    raise InvalidGameStateError("Attempted to save dice number that was saved earlier in the "
+                                                "player's turn", game_state=self, action=Action.from_code(code))
+                if code not in self.roll:
+                    raise InvalidGameStateError("Attempted to save dice number that was not rolled",
+                                                game_state=self, action=Action.from_code(code))
+
+            # Save all dice rolled of the number to be saved
+            self._save_die(code, self.roll.count(code))
+            self.roll = ()
+            self.is_roll_resolved = True
+
+        elif code == Action.CODE_NEXT_PLAYER_TURN:
+            self.lose_domino()
+            self.increment_player_turn()
+
+        else:
+            bit = 1 << (code - self.MIN_DOMINO)
+            stacks = self.player_stacks
+            worm_counts = self.worm_counts
+            if self.community & bit:
+                # Remove domino from community dominoes
+                self.community &= ~bit
+            else:
+                # Domino was in a player stack
+                for player_num, stack in enumerate(stacks):
+                    if player_num != self.player_turn and stack and stack[-1] == code:
+                        stacks = stacks[:player_num] + (stack[:-1],) + stacks[player_num + 1:]
+                        worm_counts = worm_counts[:player_num] + (worm_counts[player_num] - WORMS[code],) + \
+                            worm_counts[player_num + 1:]
+                        break
+                else:
+                    raise InvalidGameStateError("Attempted to take a domino that was not available", game_state=self,
+                                                action=Action.from_code(code))
+
+            # Add domino to player
+            turn = self.player_turn
+            self.player_stacks = stacks[:turn] + (stacks[turn] + (code,),) + stacks[turn + 1:]
+            self.worm_counts = worm_counts[:turn] + (worm_counts[turn] + WORMS[code],) + worm_counts[turn + 1:]
+            self.increment_player_turn()
+
+        if validate:
+            try:
+                self.assert_valid_game_state()
+            except InvalidGameStateError:
+                raise InvalidGameStateError("GameState after resolving action is invalid", game_state=self,
+                                            action=Action.from_code(code))
+
+        return record
+
+    def undo_action(self, record: Tuple) -> None:
+        """
+        Restore the state from before the action that returned record. Actions must be undone in the reverse order
+        they were resolved in. Dice rolls already recorded in dice_log are kept
+        :param record: Undo record returned by resolve_action
+        """
+        (self.player_stacks, self.worm_counts, self.community, self.player_turn, self.saved_order, self.saved_counts,
+         self.saved_mask, self.num_saved, self.score, self.roll, self.is_roll_resolved) = record
+
+    def roll_dice(self, num_dice: int, dice: Tuple[int, ...] = None) -> Tuple[int, ...]:
+        """
+        Roll dice for the current player with rng and record the roll in dice_log
+        :param num_dice: Number of dice to roll
+        :param dice: Dice to use instead of rolling
+        :return: Rolled dice
+        """
+        dice = sample_roll(num_dice, self.rng if self.rng is not None else random) if dice is None else tuple(dice)
+        if self.dice_log is not None:
+            self.dice_log.append(dice)
+        return dice
+
+    def validation_due(self) -> bool:
+        """
+        Counts a validation opportunity
+        :return: True if the state should be validated now. Only meaningful when DEBUG is on
+        """
+        if self.VALIDATE_EVERY == 1:
+            return True
+        CompactGameState._validation_counter += 1
+        if CompactGameState._validation_counter >= self.VALIDATE_EVERY:
+            CompactGameState._validation_counter = 0
+            return True
+        return False
+
+    def _save_die(self, die: int, count: int) -> None:
+        if not self.saved_mask >> die & 1:
+            self.saved_order = self.saved_order << 3 | die
+            self.saved_mask |= 1 << die
+        self.saved_counts += count << (4 * die)
+        self.num_saved += count
+        self.score += DIE_SCORES[die] * count
+
+    def lose_domino(self) -> bool:
+        """
+        The current player loses the domino on the top of their stack if they have any dominoes. If a player loses a
+        domino, that domino is added back to the community dominoes and the largest community domino is removed from
+        the game.
+        :return: True if player lost a domino
+        """
+        turn = self.player_turn
+        stack = self.player_stacks[turn]
+        if stack:
+            stacks = self.player_stacks
+            self.player_stacks = stacks[:turn] + (stack[:-1],) + stacks[turn + 1:]
+            worm_counts = self.worm_counts
+            self.worm_counts = worm_counts[:turn] + (worm_counts[turn] - WORMS[stack[-1]],) + worm_counts[turn + 1:]
+
+            # Add domino back to community and remove largest community domino from the game
+            community = self.community | 1 << (stack[-1] - self.MIN_DOMINO)
+            self.community = community & ~(1 << (community.bit_length() - 1))
+            return True
+        return False
+
+    def increment_player_turn(self) -> None:
+        """
+        Increments the player turn and resets dice state
+        :return: None
+        """
+        self.saved_order = 0
+        self.saved_counts = 0
+        self.saved_mask = 0
+        self.num_saved = 0
+        self.score = 0
+        self.roll = ()
+        self.is_roll_resolved = True
+
+        if self.player_turn == self.num_players - 1:
+            self.player_turn = 0
+        else:
+            self.player_turn += 1
+
+    def print_current_state(self) -> None:
+        """
+        Prints current game state. Useful for debugging.
+        """
+        print("####### Current State #######\n")
+
+        print(f"Roll Resolved:\t{self.is_roll_resolved}")
+        print(f"Saved Dice:\t\t{self.saved_dice}\tScore:\t{self.score}")
+        print(f"Rolled Dice:\t{self.dice_roll}\n")
+
+        print(f"Community Dominoes:")
+        print(self.community_dominoes)
+        for player_num, dominoes in enumerate(self.player_states):
+            if player_num == self.player_turn:
+                print("*", end='')
+            print(f"Player {player_num}:\t{dominoes}\tWorms:\t{sum(d[1] for d in dominoes)}")
+        print("#############################\n")
+
+    def calculate_worm_count(self) -> DefaultDict[int, int]:
+        """
+        Returns the number of worms each player has
+        :return: Dictionary mapping player number to number of worms that player has
+        """
+        counts = defaultdict(int)
+        for player_num, worm_count in enumerate(self.worm_counts):
+            counts[player_num] = worm_count
+        return counts
+
+    def get_worm_count(self, player: int) -> int:
+        """
+        Returns the number of worms a player has
+        """
+        return self.worm_counts[player]
+
+    def assert_valid_game_state(self):
+        # Check that there is not more than the starting number of dominoes present in the game
+        total_game_dominoes = bin(self.community).count("1")
+        for stack in self.player_stacks:
+            total_game_dominoes += len(stack)
+        if total_game_dominoes > self.MAX_DOMINO - self.MIN_DOMINO:
+            raise InvalidGameStateError("Invalid number of dominoes in the game", game_state=self)
+
+        # Check that extra dice did not appear
+        if self.num_saved + len(self.roll) > self.NUM_DICE:
+            raise InvalidGameStateError("Invalid number of dice (saved + rolled)", game_state=self)
+
+        # Check that the incrementally updated values match a full recompute
+        if self.score != sum([DIE_SCORES[d] * (self.saved_counts >> 4 * d & 0b1111) for d in range(1, 7)]):
+            raise InvalidGameStateError("Score does not match saved dice", game_state=self)
+        for player_num, stack in enumerate(self.player_stacks):
+            if self.worm_counts[player_num] != sum([WORMS[d] for d in stack]):
+                raise InvalidGameStateError("Worm count does not match player dominoes", game_state=self)
@@ -1,8 +1,8 @@
-import math
 import random
 from collections import defaultdict
 from Action import Action
-from typing import DefaultDict, List
+from dice_tables import sample_roll
+from typing import DefaultDict, List, Tuple
 
 
 class GameState:
@@ -12,6 +12,9 @@ class GameState:
     NUM_DICE = 8
     STARTING_PLAYER_TURN = 0
     DEBUG = True
+    # Validate on every VALIDATE_EVERY-th copy or action when DEBUG is on. See validation.set_validation_mode
+    VALIDATE_EVERY = 1
+    _validation_counter = 0
 
     def __init__(self, num_players):
         """
@@ -20,15 +23,13 @@ class GameState:
         self.num_players = num_players
 
         # Populate player states with an empty stack of dominoes
-        self.player_states = []
+        player_states = []
         for i in range(0, num_players):
-            self.player_states.append([])
+            player_states.append([])
+        self.player_states = player_states
 
-        # Populate community dominoes
-        self.community_dominoes = []
-        for i in range(self.MIN_DOMINO, self.MAX_DOMINO):
-            num_worms = math.floor((i - 17) / 4)
-            self.community_dominoes.append((i, num_worms))
+        # Community dominoes as a bitmask. Bit i is set if domino MIN_DOMINO + i is available
+        self.community = ALL_COMMUNITY_DOMINOES
 
         # Turn for a player. Should be an int from [0-num_players)
         self.player_turn = self.STARTING_PLAYER_TURN
@@ -40,19 +41,32 @@ class GameState:
 
         self.is_roll_resolved = True
 
+        # List to record every dice roll in, or None to not record dice rolls. Not copied
+        self.dice_log = None
+
+        # Random number generator to roll dice with, such as random.Random or rng.NumpyRandom, or None to use the
+        # random module. Shared with copies
+        self.rng = None
+
     def __copy__(self):
-        if self.DEBUG:
+        validate = self.DEBUG and self.validation_due()
+        if validate:
             self.assert_valid_game_state()
-        gs_copy = GameState(self.num_players)
-        gs_copy.player_states = []
-        for ps in self.player_states:
-            gs_copy.player_states.append(ps.copy())
-        gs_copy.community_dominoes = self.community_dominoes.copy()
+        # Every attribute is assigned, so __init__ is skipped
+        gs_copy = GameState.__new__(GameState)
+        gs_copy.num_players = self.num_players
+        gs_copy._player_states = [ps.copy() for ps in self._player_states]
+        gs_copy._worm_counts = self._worm_counts.copy()
+        gs_copy.community = self.community
         gs_copy.player_turn = self.player_turn
-        gs_copy.saved_dice = self.saved_dice.copy()
+        gs_copy.num_dice = self.num_dice
+        gs_copy._saved_dice = self._saved_dice.copy()
+        gs_copy._score = self._score
         gs_copy.dice_roll = self.dice_roll.copy()
         gs_copy.is_roll_resolved = self.is_roll_resolved
-        if self.DEBUG:
+        gs_copy.dice_log = None
+        gs_copy.rng = self.rng
+        if validate:
             gs_copy.assert_valid_game_state()
         return gs_copy
 
@@ -68,8 +82,81 @@ class GameState:
             f"Player_states:{self.player_states}." \
             f"Community_dominoes:{self.community_dominoes}."
 
+    @property
+    def player_states(self) -> List[List[Tuple[int, int]]]:
+        """
+        Stack of dominoes of each player. Assigning recomputes the worm counts. Stacks should only be changed in place
+        through resolve_action and lose_domino, which keep the worm counts up to date
+        """
+        return self._player_states
+
+    @player_states.setter
+    def player_states(self, player_states: List[List[Tuple[int, int]]]):
+        self._player_states = player_states
+        self._worm_counts = [sum([d[1] for d in dominoes]) for dominoes in player_states]
+
+    @property
+    def community_dominoes(self) -> 'DominoRow':
+        """
+        Community dominoes in ascending order, as a view of the community bitmask. Assigning a list of dominoes sets
+        the bitmask
+        """
+        return DominoRow(self)
+
+    @community_dominoes.setter
+    def community_dominoes(self, community_dominoes: List[Tuple[int, int]]):
+        community = 0
+        for domino in community_dominoes:
+            community |= 1 << (domino[0] - self.MIN_DOMINO)
+        self.community = community
+
+    @property
+    def saved_dice(self) -> List[int]:
+        """
+        Dice saved this turn. Assigning recomputes the score. Saved dice should only be changed in place through
+        resolve_action, which keeps the score up to date
+        """
+        return self._saved_dice
+
+    @saved_dice.setter
+    def saved_dice(self, saved_dice: List[int]):
+        self._saved_dice = saved_dice
+        self._score = self.calculate_score(saved_dice)
+
+    @property
+    def score(self) -> int:
+        """
+        Score of the saved dice
+        """
+        return self._score
+
+    @staticmethod
+    def calculate_score(dice: List[int]) -> int:
+        score = 0
+        for die in dice:
+            if die == 6:
+                score += 5
+            else:
+                score += die
+        return score
+
+    def key(self) -> Tuple:
+        """
+        Hashable key for the state. Two states have equal keys exactly when they have equal str() representations
+        """
+        return (self.player_turn, tuple(self.saved_dice), tuple(self.dice_roll), self.is_roll_resolved,
+                tuple([tuple(ps) for ps in self.player_states]), self.community)
+
+    def canonical_key(self) -> Tuple:
+        """
+        Hashable key that is equal for states that play out the same. Saved dice and the dice roll are compared as
+        multisets, so saving the same dice in a different order reaches the same key
+        """
+        return (self.player_turn, tuple(sorted(self._saved_dice)), tuple(sorted(self.dice_roll)),
+                self.is_roll_resolved, tuple([tuple(ps) for ps in self._player_states]), self.community)
+
     def is_game_over(self):
-        if len(self.community_dominoes) == 0:
+        if self.community == 0:
             return True
         return False
 
@@ -97,36 +184,27 @@ class GameState:
         # Find the possible dominoes that can be taken
         else:
             # Must have a worm saved to take a domino
-            if self.saved_dice.__contains__(6):
-                score = 0
-                for die in self.saved_dice:
-                    if die == 6:
-                        score += 5
-                    else:
-                        score += die
+            if self._saved_dice.__contains__(6):
+                score = self._score
 
                 # Check if community dominoes has the domino with current score
                 # And if not, the next highest domino
-                for domino in reversed(self.community_dominoes):
-                    if domino[0] > score:
-                        continue
-                    elif domino[0] == score:
-                        possible_actions.append(Action(Action.ACTION_TAKE_DOMINO, domino))
-                        break
-                    elif domino[0] < score:
-                        possible_actions.append(Action(Action.ACTION_TAKE_DOMINO, domino))
-                        break
+                if score >= self.MIN_DOMINO:
+                    available = self.community & ((1 << (score - self.MIN_DOMINO + 1)) - 1)
+                    if available:
+                        possible_actions.append(Action(Action.ACTION_TAKE_DOMINO,
+                                                       BIT_DOMINOES[available.bit_length() - 1]))
 
                 # Check if any player (excluding the current player) has the domino on the top
                 # of their domino stack
-                for player_num, player_dominoes in enumerate(self.player_states):
+                for player_num, player_dominoes in enumerate(self._player_states):
                     if player_num != self.player_turn and len(player_dominoes) > 0:
                         player_top_domino = player_dominoes[-1]
                         if player_top_domino[0] == score:
                             possible_actions.append(Action(Action.ACTION_TAKE_DOMINO, player_top_domino))
 
             # Check if possible to roll again
-            if len(set(self.saved_dice)) < 6 and len(self.saved_dice) < self.num_dice:
+            if len(set(self._saved_dice)) < 6 and len(self._saved_dice) < self.num_dice:
                 possible_actions.append(Action(Action.ACTION_ROLL_DICE))
 
         if len(possible_actions) == 0:
@@ -135,49 +213,67 @@ class GameState:
 
         return possible_actions
 
-    def resolve_action(self, action: Action):
+    def get_next_action_codes(self) -> List[int]:
+        """
+        Same as get_next_actions, but returns int codes of the actions (see Action.to_code)
+        :return: list of action codes with >= 1 codes
+        """
+        return [action.to_code() for action in self.get_next_actions()]
+
+    def resolve_action(self, action: Action, dice: List[int] = None) -> Tuple:
         """
         Play the action out on the state. Mutates game state. If you need a new state, first
         create a shallow copy of the state and then call resolve_action.
         :param action: Action to take
+        :param dice: Dice to roll for a roll dice action instead of rolling with rng, for searches that choose roll
+        outcomes
+        :return: Undo record. Pass it to undo_action to restore the state from before the action
         """
 
         # Ensure action is being resolved on a valid game state
-        if self.DEBUG:
+        validate = self.DEBUG and self.validation_due()
+        if validate:
             try:
                 self.assert_valid_game_state()
             except InvalidGameStateError:
                 raise InvalidGameStateError("resolve_action called with invalid state", game_state=self, action=action)
 
+        # Lists that are changed in place are either extended (saved dice, the current player's stack) or replaced,
+        # so the undo record can keep the old lists and the number of saved dice
+        record_dice = (self.player_turn, self._saved_dice, len(self._saved_dice), self._score, self.dice_roll,
+                       self.is_roll_resolved)
+        record_dominoes = None
+
         if action.name == Action.ACTION_ROLL_DICE:
-            if self.DEBUG:
+            if validate:
                 # Check that rolling dice is a valid action
                 if self.is_roll_resolved is False:
                     raise InvalidGameStateError("Attempted to roll dice when dice roll has not been resolved",
                                                 game_state=self, action=action)
-                if len(self.saved_dice) == self.NUM_DICE:
+                if len(self._saved_dice) == self.NUM_DICE:
                     raise InvalidGameStateError("Attempted to roll dice when all dice have already been saved",
                                                 game_state=self, action=action)
-                if len(set(self.saved_dice)) == 6:
+                if len(set(self._saved_dice)) == 6:
                     raise InvalidGameStateError("Attempted to roll dice when all dice all six dice numbers have been saved",
                                                 game_state=self, action=action)
 
             # Roll dice
-            self.dice_roll = [random.randrange(1, 7) for x in range(self.num_dice - len(self.saved_dice))]
+            self.dice_roll = self.roll_dice(self.num_dice - len(self._saved_dice), dice)
             self.is_roll_resolved = False
 
             # Check if player busted
-            if set(self.dice_roll).issubset(set(self.saved_dice)):
+            if set(self.dice_roll).issubset(set(self._saved_dice)):
+                record_dominoes = self._lose_domino_record()
                 self.lose_domino()
                 self.increment_player_turn()
 
         elif action.name == Action.ACTION_SAVE_DICE:
-            if self.DEBUG:
+            if validate:
                 # Check that rolling dice is a valid action
                 if self.is_roll_resolved is True:
                     raise InvalidGameStateError("Attempted to save dice when roll has already been resolved",
                                                 game_state=self, action=action)
-                if action.optional_args in self.saved_dice:
+                if action.optional_args in self._saved_dice:
                     raise InvalidGameStateError("Attempted to save dice number that was saved earlier in the player's turn",
                                                 game_state=self, action=action)
                 if action.optional_args not in self.dice_roll:
@@ -187,22 +283,29 @@ class GameState:
             # Save all dice rolled of the number to be saved
             for die in self.dice_roll:
                 if die == action.optional_args:
-                    self.saved_dice.append(die)
-            self.dice_roll.clear()
+                    self._saved_dice.append(die)
+                    self._score += 5 if die == 6 else die
+            self.dice_roll = []
             self.is_roll_resolved = True
 
         elif action.name == Action.ACTION_TAKE_DOMINO:
-            prev_length = len(self.community_dominoes)
+            domino = action.optional_args
+            worm_counts = self._worm_counts.copy()
 
             # Remove domino from community dominoes
-            self.community_dominoes[:] = [x for x in self.community_dominoes if not x == action.optional_args]
+            bit = 1 << (domino[0] - self.MIN_DOMINO)
+            if self.community & bit:
+                record_dominoes = (worm_counts, None, None, domino, self.community)
+                self.community &= ~bit
 
             # Domino was in a player stack
-            if prev_length == len(self.community_dominoes):
+            else:
                 domino_found = False
-                for player_num, player in enumerate(self.player_states):
-                    if player_num != self.player_turn and len(player) > 0 and player[-1] == action.optional_args:
-                        self.player_states[player_num] = player[:-1]
+                for player_num, player in enumerate(self._player_states):
+                    if player_num != self.player_turn and len(player) > 0 and player[-1] == domino:
+                        record_dominoes = (worm_counts, player_num, player, domino, self.community)
+                        self._player_states[player_num] = player[:-1]
+                        self._worm_counts[player_num] -= domino[1]
                         domino_found = True
                         break
                 if domino_found is False:
@@ -210,20 +313,82 @@ class GameState:
                                                 action=action)
 
             # Add domino to player
-            self.player_states[self.player_turn].append(action.optional_args)
+            self._player_states[self.player_turn].append(domino)
+            self._worm_counts[self.player_turn] += domino[1]
             self.increment_player_turn()
 
         elif action.name == Action.ACTION_NEXT_PLAYER_TURN:
+            record_dominoes = self._lose_domino_record()
             self.lose_domino()
             self.increment_player_turn()
 
-        if self.DEBUG:
+        if validate:
             # Ensure GameState is still valid after completing action
             try:
                 self.assert_valid_game_state()
             except InvalidGameStateError:
                 raise InvalidGameStateError("GameState after resolving action is invalid", game_state=self, action=action)
 
+        return record_dice, record_dominoes
+
+    def _lose_domino_record(self):
+        # Undo records of the dominoes are (worm counts, player whose stack was replaced, their old stack, domino taken
+        # or lost, community bitmask)
+        stack = self._player_states[self.player_turn]
+        if len(stack) == 0:
+            return None
+        return self._worm_counts.copy(), self.player_turn, stack, stack[-1], self.community
+
+    def undo_action(self, record: Tuple) -> None:
+        """
+        Restore the state from before the action that returned record. Actions must be undone in the reverse order
+        they were resolved in. Dice rolls already recorded in dice_log are kept
+        :param record: Undo record returned by resolve_action
+        """
+        (player_turn, saved_dice, num_saved, score, dice_roll, is_roll_resolved), record_dominoes = record
+
+        if record_dominoes is not None:
+            worm_counts, stack_player, stack, _, community = record_dominoes
+            if stack_player != player_turn:
+                # The domino was taken by the player, from the community or from the top of another stack
+                self._player_states[player_turn].pop()
+            if stack_player is not None:
+                self._player_states[stack_player] = stack
+            self.community = community
+            self._worm_counts = worm_counts
+
+        del saved_dice[num_saved:]
+        self._saved_dice = saved_dice
+        self._score = score
+        self.dice_roll = dice_roll
+        self.is_roll_resolved = is_roll_resolved
+        self.player_turn = player_turn
+
+    def roll_dice(self, num_dice: int, dice: List[int] = None) -> List[int]:
+        """
+        Roll dice for the current player with rng and record the roll in dice_log
+        :param num_dice: Number of dice to roll
+        :param dice: Dice to use instead of rolling
+        :return: Rolled dice
+        """
+        dice = list(sample_roll(num_dice, self.rng if self.rng is not None else random) if dice is None else dice)
+        if self.dice_log is not None:
+            self.dice_log.append(tuple(dice))
+        return dice
+
+    def validation_due(self) -> bool:
+        """
+        Counts a validation opportunity
+        :return: True if the state should be validated now. Only meaningful when DEBUG is on
+        """
+        if self.VALIDATE_EVERY == 1:
+            return True
+        GameState._validation_counter += 1
+        if GameState._validation_counter >= self.VALIDATE_EVERY:
+            GameState._validation_counter = 0
+            return True
+        return False
+
     def lose_domino(self) -> bool:
         """
         The current player loses the domino on the top of their stack if they have any dominoes. If a player loses a
@@ -232,23 +397,16 @@ class GameState:
         :return: True if player lost a domino
         """
         # Only lose domino if player has 1 or more dominoes
-        if len(self.player_states[self.player_turn]) > 0:
-            domino = self.player_states[self.player_turn][-1]
+        if len(self._player_states[self.player_turn]) > 0:
+            domino = self._player_states[self.player_turn][-1]
 
             # Remove domino from player
-            self.player_states[self.player_turn] = self.player_states[self.player_turn][:-1]
-
-            # Add domino back to community in sorted order
-            num_community_dominoes = len(self.community_dominoes)
-            for index, community_domino in enumerate(self.community_dominoes):
-                if domino < community_domino:
-                    self.community_dominoes[index:index] = [domino]
-                    break
-                if index == num_community_dominoes - 1:
-                    self.community_dominoes.append(domino)
-
-            # Remove largest community domino from the game
-            self.community_dominoes = self.community_dominoes[:-1]
+            self._player_states[self.player_turn] = self._player_states[self.player_turn][:-1]
+            self._worm_counts[self.player_turn] -= domino[1]
+
+            # Add domino back to community and remove largest community domino from the game
+            community = self.community | 1 << (domino[0] - self.MIN_DOMINO)
+            self.community = community & ~(1 << (community.bit_length() - 1))
             return True
         return False
 
@@ -257,9 +415,10 @@ class GameState:
         Increments the player turn and resets dice state
         :return: None
         """
-        # Reset Dice
-        self.saved_dice.clear()
-        self.dice_roll.clear()
+        # Reset Dice. The lists are replaced rather than cleared so undo records can keep them
+        self._saved_dice = []
+        self._score = 0
+        self.dice_roll = []
         self.is_roll_resolved = True
 
         # Increment player turn
@@ -272,17 +431,10 @@ class GameState:
         """
         Prints current game state. Useful for debugging.
         """
-        score = 0
-        for die in self.saved_dice:
-            if die == 6:
-                score += 5
-            else:
-                score += die
-
         print("####### Current State #######\n")
 
         print(f"Roll Resolved:\t{self.is_roll_resolved}")
-        print(f"Saved Dice:\t\t{self.saved_dice}\tScore:\t{score}")
+        print(f"Saved Dice:\t\t{self.saved_dice}\tScore:\t{self.score}")
         print(f"Rolled Dice:\t{self.dice_roll}\n")
 
         print(f"Community Dominoes:")
@@ -302,19 +454,23 @@ class GameState:
         :return: Dictionary mapping player number to number of worms that player has
         """
         counts = defaultdict(int)
-        for player_num, dominoes in enumerate(self.player_states):
-            for d in dominoes:
-                counts[player_num] += d[1]
-            if len(dominoes) == 0:
-                counts[player_num] = 0
+        for player_num, worm_count in enumerate(self._worm_counts):
+            counts[player_num] = worm_count
         return counts
 
+    def get_worm_count(self, player: int) -> int:
+        """
+        Returns the number of worms a player has
+        """
+        return self._worm_counts[player]
+
     def assert_valid_game_state(self):
         # Check that there is not more than the starting number of dominoes present in the game
         total_game_dominoes = 0
         for i in self.player_states:
             total_game_dominoes += len(i)
-        if total_game_dominoes + len(self.community_dominoes) > self.MAX_DOMINO - self.MIN_DOMINO:
+        if total_game_dominoes + len(self.community_dominoes) > self.MAX_DOMINO - self.MIN_DOMINO or \
+                self.community & ~ALL_COMMUNITY_DOMINOES:
             self.print_current_state()
             raise InvalidGameStateError("Invalid number of dominoes in the game", game_state=self)
 
@@ -322,6 +478,80 @@ class GameState:
         if len(self.saved_dice) + len(self.dice_roll) > self.NUM_DICE:
             raise InvalidGameStateError("Invalid number of dice (saved + rolled)", game_state=self)
 
+        # Check that the incrementally updated values match a full recompute
+        if self._score != self.calculate_score(self._saved_dice):
+            raise InvalidGameStateError("Score does not match saved dice", game_state=self)
+        for player_num, dominoes in enumerate(self._player_states):
+            if self._worm_counts[player_num] != sum([d[1] for d in dominoes]):
+                raise InvalidGameStateError("Worm count does not match player dominoes", game_state=self)
+
+
+# Domino for each bit of a community bitmask. Bit i is domino MIN_DOMINO + i
+BIT_DOMINOES = tuple((i, (i - 17) // 4) for i in range(GameState.MIN_DOMINO, GameState.MAX_DOMINO))
+ALL_COMMUNITY_DOMINOES = (1 << len(BIT_DOMINOES)) - 1
+
+
+class DominoRow:
+    """
+    Community dominoes of a GameState in ascending order, as a view of its community bitmask. Changes are written
+    to the bitmask
+    """
+
+    __slots__ = ("game_state",)
+
+    def __init__(self, game_state: GameState):
+        self.game_state = game_state
+
+    def __len__(self):
+        return bin(self.game_state.community).count("1")
+
+    def __iter__(self):
+        community = self.game_state.community
+        while community:
+            low = community & -community
+            yield BIT_DOMINOES[low.bit_length() - 1]
+            community ^= low
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __contains__(self, domino) -> bool:
+        i = domino[0] - GameState.MIN_DOMINO
+        return 0 <= i < len(BIT_DOMINOES) and BIT_DOMINOES[i] == domino and bool(self.game_state.community >> i & 1)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def highest_at_or_below(self, score: int):
+        """
+        :return: Highest domino <= score, or None if there is no such domino
+        """
+        if score < GameState.MIN_DOMINO:
+            return None
+        available = self.game_state.community & ((1 << (score - GameState.MIN_DOMINO + 1)) - 1)
+        return BIT_DOMINOES[available.bit_length() - 1] if available else None
+
+    def add(self, domino) -> None:
+        self.game_state.community |= 1 << (domino[0] - GameState.MIN_DOMINO)
+
+    def remove(self, domino) -> None:
+        if domino not in self:
+            raise ValueError(f"{domino} is not a community domino")
+        self.game_state.community &= ~(1 << (domino[0] - GameState.MIN_DOMINO))
+
+    def pop(self):
+        """
+        Remove and return the largest community domino
+        """
+        community = self.game_state.community
+        if community == 0:
+            raise IndexError("pop from empty community dominoes")
+        self.game_state.community = community & ~(1 << (community.bit_length() - 1))
+        return BIT_DOMINOES[community.bit_length() - 1]
+
 
 class InvalidGameStateError(RuntimeError):
     """
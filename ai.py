@@ -1,19 +1,63 @@
-from random import choice
+import atexit
+import random
 from collections import defaultdict
-from math import sqrt
-from typing import List
+from functools import partial
+from math import ceil, sqrt
+from multiprocessing import Pool
+from time import perf_counter
+from typing import Dict, List, Tuple
 from GameState import GameState
 from Action import Action
+from bisect import bisect_right
+from dice_tables import ROLL_DICE, ROLL_PROBABILITIES, bust_probability, non_bust_roll_indices
+from rollout import random_rollout_worm_changes
+from transposition import TranspositionTable, EVICT_LRU
 
+# Chance node outcome for every roll that busts. See chance_mcts_search
+BUST_OUTCOME = -1
 
-def random_ai(game_state: GameState, possible_actions: List[Action]) -> Action:
+# Values of a full game search. See game_state_score
+SCORE_WORMS = "worms"
+SCORE_MARGIN = "margin"
+SCORE_RANK = "rank"
+
+# Stream that the searches of ais without a generator of their own draw from. It is separate from the random module,
+# which games without a generator roll their dice with, so a search never changes the dice of the game it is in
+search_rng = random.Random()
+
+
+def seed_search_rng(seed) -> None:
+    """
+    Seed the stream that searches draw from when their ai has no generator of its own. See run_mcts
+    """
+    search_rng.seed(seed)
+
+
+def random_ai(game_state: GameState, possible_actions: List[Action], rng=random) -> Action:
     """
     Picks a random possible action
     :param game_state: GameState. Is not used by the random ai
     :param possible_actions: Possible actions to take
+    :param rng: Random number generator with a choice method. Bind with functools.partial for a per-agent stream
     :return: Random possible action
     """
-    return choice(possible_actions)
+    return rng.choice(possible_actions)
+
+
+def decide_batch(ai, game_states: List[GameState], possible_actions: List[List[Action]]) -> List[Action]:
+    """
+    Choose the next action in many games at once. Ais that can decide a batch faster than one decision at a time
+    have a decide_batch attribute taking the lists of game states and possible actions. Other ais are called once
+    per game
+    :param ai: ai function
+    :param game_states: Game state of each game
+    :param possible_actions: Possible actions of each game
+    :return: Action chosen in each game
+    """
+    batch = getattr(ai, "decide_batch", None)
+    if batch is not None:
+        return batch(game_states, possible_actions)
+    return [ai(game_state, actions) for game_state, actions in zip(game_states, possible_actions)]
 
 
 def safe_ai(game_state: GameState, possible_actions: List[Action]) -> Action:
@@ -75,57 +119,625 @@ def take_domino_if_possible(possible_actions: List[Action]):
     return None
 
 
-def monte_carlo_ai_random_playouts(game_state: GameState, possible_actions: List[Action]) -> Action:
+def monte_carlo_ai_random_playouts(game_state: GameState, possible_actions: List[Action], num_sims: int = 200,
+                                   num_workers: int = 1, leaf_batch: int = 1, rng=None) -> Action:
     """
     Uses a Monte Carlo Tree Search with random playouts at the simulation step to determine
     the best next move
 
     :param game_state: Current GameState
     :param possible_actions: Possible actions to take
+    :param num_sims: Number of simulations to run per search tree
+    :param num_workers: Number of worker processes. With more than one worker, each worker searches an independent
+    tree with num_sims simulations and the visit counts of the root actions are summed (root parallelism)
+    :param leaf_batch: Number of random playouts to average each time a leaf is expanded. The playouts run one after
+    another in the searching process
+    :param rng: Random number generator for the search, or None to use search_rng. See run_mcts
     :return: Next action to take
     """
     # Do not monte carlo search if there is only one potential action
     if len(possible_actions) == 1:
         return possible_actions[0]
 
-    NUM_SIMS = 200
+    if num_workers > 1:
+        visit_counts = root_parallel_visit_counts(game_state, num_sims, num_workers, leaf_batch, rng)
+    else:
+        visit_counts = mcts_visit_counts(game_state, num_sims, leaf_batch, rng)
+
+    sorted_actions = sorted(possible_actions, key=lambda a: visit_counts.get(a.to_code(), float("-inf")))
+    return sorted_actions.pop()
+
+
+def make_parallel_mcts_ai(num_workers: int, num_sims: int = 200, leaf_batch: int = 1, rng=None):
+    """
+    Create a parallel Monte Carlo Tree Search ai. See monte_carlo_ai_random_playouts. The ai is picklable, but
+    cannot use more than one worker inside a daemonic process, such as a tournament worker. The worker processes are
+    kept between decisions until close_mcts_pools is called
+    :return: ai function
+    """
+    return partial(monte_carlo_ai_random_playouts, num_sims=num_sims, num_workers=num_workers, leaf_batch=leaf_batch,
+                   rng=rng)
 
+
+def mcts_visit_counts(game_state: GameState, num_sims: int, leaf_batch: int = 1, rng=None) -> Dict[int, int]:
+    """
+    Run a Monte Carlo Tree Search from game_state
+    :return: Dictionary mapping action code to the number of times the action was taken from game_state
+    """
     Qsa = {}
     Nsa = {}
     Ns = {}
     visited = set()
+    run_mcts(game_state, Qsa, Nsa, Ns, visited, num_sims=num_sims, leaf_batch=leaf_batch, rng=rng)
+    return root_visit_counts(game_state, Nsa)
+
+
+def run_mcts(game_state: GameState, Qsa, Nsa, Ns, visited, num_sims: int = None, time_budget: float = None,
+             leaf_batch: int = 1, children=None, table: TranspositionTable = None, rng=None, simulate=None) -> int:
+    """
+    Run Monte Carlo Tree Search simulations from game_state until a budget runs out. At least one of num_sims and
+    time_budget must be given. States are keyed on game_state.canonical_key()
+    :param num_sims: Maximum number of simulations to run
+    :param time_budget: Maximum wall-clock time to search for, in seconds
+    :param leaf_batch: Number of random playouts to average each time a leaf is expanded
+    :param children: Optional dictionary to record the keys of the child states of every searched state in
+    :param table: TranspositionTable that Qsa, Nsa, Ns and visited belong to. Its state limit is enforced after every
+    simulation
+    :param rng: Random number generator for the dice rolls and playouts of the search. If None, the search uses
+    search_rng. The game state's generator is never drawn from, so searching does not change the game's dice
+    :param simulate: Function running one simulation on the search's copy of game_state, which it must leave as it
+    found it. Defaults to mcts_search, which values states by the player's worm change by the end of the turn
+    :return: Number of simulations run
+    """
+    if num_sims is None and time_budget is None:
+        raise ValueError("run_mcts needs a simulation budget or a time budget")
+
+    player_turn = game_state.player_turn
+    num_worms = game_state.get_worm_count(player_turn)
+
+    # Search walks the tree on a single copy of the state, undoing actions on the way back up
+    game_state = game_state.__copy__()
+    game_state.rng = rng if rng is not None else search_rng
+
+    if simulate is None:
+        def simulate(gs):
+            return mcts_search(gs, player_turn, num_worms, Qsa, Nsa, Ns, visited, leaf_batch, children)
 
     # Simulate playouts
-    for num_playout in range(NUM_SIMS):
-        mcts_search(game_state, game_state.player_turn, game_state.calculate_worm_count().get(game_state.player_turn),
-                    Qsa, Nsa, Ns, visited)
+    num_playout = 0
+    if time_budget is None:
+        for num_playout in range(num_sims):
+            simulate(game_state)
+            if table is not None:
+                table.enforce_limit()
+        return num_sims
+
+    deadline = perf_counter() + time_budget
+    while (num_sims is None or num_playout < num_sims) and perf_counter() < deadline:
+        simulate(game_state)
+        if table is not None:
+            table.enforce_limit()
+        num_playout += 1
+    return num_playout
+
+
+def root_visit_counts(game_state: GameState, Nsa) -> Dict[int, int]:
+    """
+    :return: Dictionary mapping action code to the number of times the action was taken from game_state
+    """
+    s = game_state.canonical_key()
+    visit_counts = {}
+    for a in game_state.get_next_action_codes():
+        if (s, a) in Nsa:
+            visit_counts[a] = Nsa[(s, a)]
+    return visit_counts
+
+
+class MctsAi:
+    """
+    Anytime Monte Carlo Tree Search ai. Searches until its simulation budget or time budget runs out and then takes
+    the most visited action found so far. Call like any other ai function
+    """
+
+    def __init__(self, time_budget: float = None, max_sims: int = None, leaf_batch: int = 1,
+                 max_table_states: int = None, eviction: str = EVICT_LRU, share_table: bool = False, rng=None):
+        """
+        :param time_budget: Maximum wall-clock time per decision, in seconds
+        :param max_sims: Maximum number of simulations per decision
+        :param leaf_batch: Number of random playouts to average each time a leaf is expanded
+        :param max_table_states: Maximum number of states in the transposition table, or None for no limit
+        :param eviction: Eviction policy of the transposition table. See TranspositionTable
+        :param share_table: Keep the transposition table between decisions instead of starting each search empty
+        :param rng: Random number generator for the searches, or None to use search_rng. Searches never draw from
+        the game's stream
+        """
+        if time_budget is None and max_sims is None:
+            raise ValueError("MctsAi needs a simulation budget or a time budget")
+        self.time_budget = time_budget
+        self.max_sims = max_sims
+        self.leaf_batch = leaf_batch
+        self.share_table = share_table
+        self.table = TranspositionTable(max_table_states, eviction)
+        self.rng = rng
+
+        # Number of simulations completed in the last decision and in every decision so far
+        self.last_num_sims = 0
+        self.total_num_sims = 0
+        self.num_decisions = 0
+
+    def __call__(self, game_state: GameState, possible_actions: List[Action]) -> Action:
+        if len(possible_actions) == 1:
+            return possible_actions[0]
+
+        visit_counts = self.search(game_state)
+        self.total_num_sims += self.last_num_sims
+        self.num_decisions += 1
+
+        sorted_actions = sorted(possible_actions, key=lambda a: visit_counts.get(a.to_code(), float("-inf")))
+        return sorted_actions.pop()
+
+    def search(self, game_state: GameState) -> Dict[int, int]:
+        """
+        Search from game_state and set last_num_sims
+        :return: Dictionary mapping action code to the number of times the action was taken from game_state
+        """
+        table = self.table
+        if not self.share_table:
+            table.clear()
+        self.last_num_sims = run_mcts(game_state, table.Qsa, table.Nsa, table.Ns, table.visited,
+                                      num_sims=self.max_sims, time_budget=self.time_budget,
+                                      leaf_batch=self.leaf_batch, table=table, rng=self.rng)
+        return root_visit_counts(game_state, table.Nsa)
+
+
+class PersistentMctsAi(MctsAi):
+    """
+    Anytime Monte Carlo Tree Search ai that keeps its search tree between decisions in a turn. Each decision re-roots
+    the tree on the state reached by the chosen action and dice roll, so the simulations already spent on that subtree
+    are reused. Nodes that can no longer be reached are evicted, and the tree is cleared at the start of every turn.
+    Use one instance per player
+    """
+
+    def __init__(self, time_budget: float = None, max_sims: int = None, leaf_batch: int = 1, rng=None):
+        super().__init__(time_budget=time_budget, max_sims=max_sims, leaf_batch=leaf_batch, rng=rng)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear the search tree
+        """
+        self.Qsa = {}
+        self.Nsa = {}
+        self.Ns = {}
+        self.visited = set()
+        self.children = {}
+        self.player_turn = None
+        self.num_worms = None
+
+    def tree_size(self) -> int:
+        """
+        :return: Number of states in the search tree
+        """
+        return len(self.visited)
+
+    def search(self, game_state: GameState) -> Dict[int, int]:
+        root = game_state.canonical_key()
+        num_worms = game_state.get_worm_count(game_state.player_turn)
+        if root in self.visited and game_state.player_turn == self.player_turn and num_worms == self.num_worms:
+            self.reroot(root)
+        else:
+            self.reset()
+            self.player_turn = game_state.player_turn
+            self.num_worms = num_worms
+
+        self.last_num_sims = run_mcts(game_state, self.Qsa, self.Nsa, self.Ns, self.visited, num_sims=self.max_sims,
+                                      time_budget=self.time_budget, leaf_batch=self.leaf_batch,
+                                      children=self.children, rng=self.rng)
+        return root_visit_counts(game_state, self.Nsa)
+
+    def reroot(self, root) -> None:
+        """
+        Evict every state that is not reachable from root
+        """
+        reachable = {root}
+        frontier = [root]
+        while frontier:
+            for child in self.children.get(frontier.pop(), ()):
+                if child not in reachable:
+                    reachable.add(child)
+                    frontier.append(child)
+
+        self.visited &= reachable
+        self.Ns = {s: n for s, n in self.Ns.items() if s in reachable}
+        self.children = {s: c for s, c in self.children.items() if s in reachable}
+        self.Qsa = {sa: q for sa, q in self.Qsa.items() if sa[0] in reachable}
+        self.Nsa = {sa: n for sa, n in self.Nsa.items() if sa[0] in reachable}
+
+
+def make_mcts_ai(time_budget: float = None, max_sims: int = None, leaf_batch: int = 1,
+                 reuse_tree: bool = False, max_table_states: int = None, eviction: str = EVICT_LRU,
+                 share_table: bool = False, rng=None) -> MctsAi:
+    """
+    Create an anytime Monte Carlo Tree Search ai with a per-decision time budget, simulation budget, or both.
+    For example, make_mcts_ai(time_budget=0.005) searches for at most 5 ms per decision
+    :param reuse_tree: Keep the search tree between decisions in a turn. See PersistentMctsAi
+    :param max_table_states: Maximum number of states in the transposition table. See MctsAi
+    :param eviction: Eviction policy of the transposition table. See TranspositionTable
+    :param share_table: Keep the transposition table between decisions. See MctsAi
+    :param rng: Random number generator for the searches. See MctsAi
+    :return: ai function. Its last_num_sims attribute is the number of simulations run in the last decision
+    """
+    if reuse_tree:
+        return PersistentMctsAi(time_budget=time_budget, max_sims=max_sims, leaf_batch=leaf_batch, rng=rng)
+    return MctsAi(time_budget=time_budget, max_sims=max_sims, leaf_batch=leaf_batch,
+                  max_table_states=max_table_states, eviction=eviction, share_table=share_table, rng=rng)
+
+
+class FullGameMctsAi(MctsAi):
+    """
+    Anytime Monte Carlo Tree Search ai that looks past the end of its turn. The tree covers the current turn, and
+    every simulation continues with a rollout of later turns played by cheap policies, so stealing, losing the top
+    domino in later turns and the final ranking count towards the value of an action. Rollouts stop after
+    max_rollout_turns turns to keep the cost per simulation bounded
+    """
+
+    def __init__(self, time_budget: float = None, max_sims: int = None, rollout_ai=None, opponent_ai=None,
+                 max_rollout_turns: int = 2, scoring: str = SCORE_MARGIN, rng=None):
+        """
+        :param time_budget: Maximum wall-clock time per decision, in seconds
+        :param max_sims: Maximum number of simulations per decision
+        :param rollout_ai: Ai playing the searching player's moves in rollouts. Defaults to safe_ai_better_die_saving
+        :param opponent_ai: Ai playing the other players' moves in rollouts. Defaults to safe_ai_better_die_saving
+        :param max_rollout_turns: Number of turns played out from the decision, counting the current turn, or None to
+        play out to the end of the game. Every simulation looks the same number of turns ahead, whether its leaf is
+        before or after the end of the current turn
+        :param scoring: Value of the state a rollout ends in. See game_state_score
+        :param rng: Random number generator for the searches. See MctsAi
+        """
+        super().__init__(time_budget=time_budget, max_sims=max_sims, rng=rng)
+        self.rollout_ai = rollout_ai if rollout_ai is not None else safe_ai_better_die_saving
+        self.opponent_ai = opponent_ai if opponent_ai is not None else safe_ai_better_die_saving
+        self.max_rollout_turns = max_rollout_turns
+        self.scoring = scoring
+
+    def search(self, game_state: GameState) -> Dict[int, int]:
+        table = self.table
+        table.clear()
+        simulate = partial(full_game_mcts_search, player_turn=game_state.player_turn, Qsa=table.Qsa, Nsa=table.Nsa,
+                           Ns=table.Ns, visited=table.visited, rollout_ai=self.rollout_ai,
+                           opponent_ai=self.opponent_ai, max_rollout_turns=self.max_rollout_turns,
+                           scoring=self.scoring,
+                           root_score=game_state_score(game_state, game_state.player_turn, self.scoring))
+        self.last_num_sims = run_mcts(game_state, table.Qsa, table.Nsa, table.Ns, table.visited,
+                                      num_sims=self.max_sims, time_budget=self.time_budget, rng=self.rng,
+                                      simulate=simulate)
+        return root_visit_counts(game_state, table.Nsa)
+
+
+def make_full_game_mcts_ai(time_budget: float = None, max_sims: int = None, rollout_ai=None, opponent_ai=None,
+                           max_rollout_turns: int = 2, scoring: str = SCORE_MARGIN, rng=None) -> FullGameMctsAi:
+    """
+    Create a Monte Carlo Tree Search ai that values actions by multi-turn rollouts. See FullGameMctsAi. For example,
+    make_full_game_mcts_ai(max_sims=200, max_rollout_turns=None, scoring=SCORE_RANK) values actions by the player's
+    final rank
+    :return: ai function
+    """
+    return FullGameMctsAi(time_budget=time_budget, max_sims=max_sims, rollout_ai=rollout_ai, opponent_ai=opponent_ai,
+                          max_rollout_turns=max_rollout_turns, scoring=scoring, rng=rng)
+
+
+class ChanceMctsAi(MctsAi):
+    """
+    Anytime Monte Carlo Tree Search ai with explicit chance nodes for dice rolls. Rolling leads to a chance node whose
+    children are the distinct rolls (face count multisets) of the dice left. Outcomes are sampled by probability and
+    progressively widened: a chance node visited n times has at most ceil(widening_constant * n ** widening_exponent)
+    outcomes, so simulations are spent on revisiting outcomes rather than expanding rarely seen ones. The value of
+    rolling is the probability-weighted mean of the values of the outcomes tried
+    """
+
+    def __init__(self, time_budget: float = None, max_sims: int = None, leaf_batch: int = 1,
+                 widening_constant: float = 2.0, widening_exponent: float = 0.5, rng=None):
+        """
+        :param time_budget: Maximum wall-clock time per decision, in seconds
+        :param max_sims: Maximum number of simulations per decision
+        :param leaf_batch: Number of random playouts to average each time a leaf is expanded
+        :param widening_constant: Number of outcomes of a chance node after its first visit
+        :param widening_exponent: Growth of the number of outcomes of a chance node with its visits, from 0 (fixed)
+        to 1 (a new outcome every visit)
+        :param rng: Random number generator for the searches. See MctsAi
+        """
+        super().__init__(time_budget=time_budget, max_sims=max_sims, leaf_batch=leaf_batch, rng=rng)
+        self.widening_constant = widening_constant
+        self.widening_exponent = widening_exponent
+        # Outcomes of every chance node in the last search. See chance_mcts_search
+        self.outcomes = {}
+
+    def search(self, game_state: GameState) -> Dict[int, int]:
+        table = self.table
+        table.clear()
+        self.outcomes = {}
+        player_turn = game_state.player_turn
+        simulate = partial(chance_mcts_search, player_turn=player_turn,
+                           num_worms=game_state.get_worm_count(player_turn), Qsa=table.Qsa, Nsa=table.Nsa,
+                           Ns=table.Ns, visited=table.visited, outcomes=self.outcomes, leaf_batch=self.leaf_batch,
+                           widening_constant=self.widening_constant, widening_exponent=self.widening_exponent)
+        self.last_num_sims = run_mcts(game_state, table.Qsa, table.Nsa, table.Ns, table.visited,
+                                      num_sims=self.max_sims, time_budget=self.time_budget, rng=self.rng,
+                                      simulate=simulate)
+        return root_visit_counts(game_state, table.Nsa)
+
+    def tree_size(self) -> int:
+        """
+        :return: Number of states in the last search tree
+        """
+        return len(self.table.visited)
+
+
+def make_chance_mcts_ai(time_budget: float = None, max_sims: int = None, leaf_batch: int = 1,
+                        widening_constant: float = 2.0, widening_exponent: float = 0.5, rng=None) -> ChanceMctsAi:
+    """
+    Create a Monte Carlo Tree Search ai with chance nodes for dice rolls. See ChanceMctsAi
+    :return: ai function
+    """
+    return ChanceMctsAi(time_budget=time_budget, max_sims=max_sims, leaf_batch=leaf_batch,
+                        widening_constant=widening_constant, widening_exponent=widening_exponent, rng=rng)
 
-    s = str(game_state)
-    sorted_actions = sorted(possible_actions, key=lambda a: Nsa.get((s, str(a)), float("-inf")))
-    return sorted_actions.pop()
 
+def _seeded_mcts_visit_counts(args) -> Dict[int, int]:
+    game_state, num_sims, leaf_batch, seed = args
+    return mcts_visit_counts(game_state, num_sims, leaf_batch, random.Random(seed))
 
-def mcts_search(game_state: GameState, player_turn, num_worms, Qsa, Nsa, Ns, visited):
+
+# Worker pools of root parallel searches, keyed by number of workers
+_mcts_pools: Dict[int, Pool] = {}
+
+
+def _get_mcts_pool(num_workers: int) -> Pool:
+    # Pools are kept between searches, since starting workers costs more than a search
+    if num_workers not in _mcts_pools:
+        _mcts_pools[num_workers] = Pool(num_workers)
+    return _mcts_pools[num_workers]
+
+
+def close_mcts_pools() -> None:
+    """
+    Stop the worker processes of root parallel searches and wait for them to exit. The next parallel search starts
+    new workers
+    :return: None
+    """
+    while _mcts_pools:
+        _, pool = _mcts_pools.popitem()
+        pool.close()
+        pool.join()
+
+
+def _terminate_mcts_pools() -> None:
+    while _mcts_pools:
+        _, pool = _mcts_pools.popitem()
+        pool.terminate()
+
+
+atexit.register(_terminate_mcts_pools)
+
+
+def root_parallel_visit_counts(game_state: GameState, num_sims: int, num_workers: int, leaf_batch: int = 1,
+                               rng=None) -> Dict[int, int]:
+    """
+    Run num_workers independent Monte Carlo Tree Searches from game_state in worker processes. Workers are seeded from
+    rng, or from search_rng if rng is None, so results are reproducible
+    :return: Dictionary mapping action code to the total number of times the action was taken from game_state
+    """
+    if rng is None:
+        rng = search_rng
+    root = game_state.__copy__()
+    # Every worker searches with its own seeded stream
+    root.rng = None
+    tasks = [(root, num_sims, leaf_batch, rng.getrandbits(63)) for _ in range(num_workers)]
+    visit_counts = defaultdict(int)
+    for worker_counts in _get_mcts_pool(num_workers).map(_seeded_mcts_visit_counts, tasks):
+        for a, n in worker_counts.items():
+            visit_counts[a] += n
+    return visit_counts
+
+
+def mcts_search(game_state: GameState, player_turn, num_worms, Qsa, Nsa, Ns, visited, leaf_batch=1, children=None):
+    if game_state.player_turn != player_turn:
+        return get_change_worm_count(game_state, player_turn, num_worms)
+
+    s = game_state.canonical_key()
+    if s not in visited:
+        visited.add(s)
+        Ns[s] = 0
+        # Average leaf_batch random playouts of the rest of the turn to get a better estimate of the leaf's value
+        v = sum(random_rollout_worm_changes(game_state, leaf_batch, game_state.rng))
+        if leaf_batch > 1:
+            v /= leaf_batch
+        v += get_change_worm_count(game_state, player_turn, num_worms)
+        if game_state.DEBUG and game_state.validation_due():
+            game_state.assert_valid_game_state()
+        return v
+
+    ucb_action = get_best_action_ucb(game_state, Qsa, Nsa, Ns)
+    record = game_state.resolve_action(ucb_action)
+    if children is not None:
+        children.setdefault(s, set()).add(game_state.canonical_key())
+    v = mcts_search(game_state, player_turn, num_worms, Qsa, Nsa, Ns, visited, leaf_batch, children)
+    game_state.undo_action(record)
+    update_search_values(v, s, ucb_action.to_code(), Qsa, Nsa, Ns)
+    return v
+
+
+def chance_mcts_search(game_state: GameState, player_turn, num_worms, Qsa, Nsa, Ns, visited, outcomes: Dict,
+                       leaf_batch: int = 1, widening_constant: float = 2.0, widening_exponent: float = 0.5):
+    """
+    One simulation of a chance node search. Same as mcts_search, except that rolling the dice goes through a chance
+    node. Leaves game_state as it found it
+    :param outcomes: Dictionary mapping the key of every state the dice were rolled from to its chance node, a
+    dictionary mapping roll index (see dice_tables), or BUST_OUTCOME for all rolls that bust, to
+    [probability, visits, mean value]
+    :return: Change in player_turn's worm count by the end of the turn
+    """
     if game_state.player_turn != player_turn:
         return get_change_worm_count(game_state, player_turn, num_worms)
 
-    s = str(game_state)
+    s = game_state.canonical_key()
     if s not in visited:
         visited.add(s)
         Ns[s] = 0
-        gs_copy = game_state.__copy__()
-        gs_end_turn = random_rollout_result(gs_copy, player_turn)
-        game_state.assert_valid_game_state()
-        return get_change_worm_count(gs_end_turn, player_turn, num_worms)
-
-    next_state = game_state.__copy__()
-    ucb_action = get_best_action_ucb(next_state, Qsa, Nsa, Ns)
-    next_state.resolve_action(ucb_action)
-    v = mcts_search(next_state, player_turn, num_worms, Qsa, Nsa, Ns, visited)
-    update_search_values(v, s, str(ucb_action), Qsa, Nsa, Ns)
+        v = sum(random_rollout_worm_changes(game_state, leaf_batch, game_state.rng))
+        if leaf_batch > 1:
+            v /= leaf_batch
+        return v + get_change_worm_count(game_state, player_turn, num_worms)
+
+    ucb_action = get_best_action_ucb(game_state, Qsa, Nsa, Ns)
+    a = ucb_action.to_code()
+    if a != Action.CODE_ROLL_DICE:
+        record = game_state.resolve_action(ucb_action)
+        v = chance_mcts_search(game_state, player_turn, num_worms, Qsa, Nsa, Ns, visited, outcomes, leaf_batch,
+                               widening_constant, widening_exponent)
+        game_state.undo_action(record)
+        update_search_values(v, s, a, Qsa, Nsa, Ns)
+        return v
+
+    saved_dice = game_state.saved_dice
+    num_dice = game_state.num_dice - len(saved_dice)
+    saved_mask = 0
+    for die in saved_dice:
+        saved_mask |= 1 << die
+    indices, cumulative = non_bust_roll_indices(num_dice, saved_mask)
+    rng = game_state.rng
+
+    node = outcomes.get(s)
+    if node is None:
+        node = outcomes[s] = {}
+        # Every bust plays out the same, so busting is one outcome with a known value
+        p_bust = bust_probability(num_dice, saved_mask)
+        if p_bust > 0:
+            record = game_state.resolve_action(ucb_action, (saved_dice[0],) * num_dice)
+            node[BUST_OUTCOME] = [p_bust, 1, get_change_worm_count(game_state, player_turn, num_worms)]
+            game_state.undo_action(record)
+
+    if len(node) < ceil(widening_constant * (Nsa.get((s, a), 0) + 1) ** widening_exponent) + (BUST_OUTCOME in node):
+        # Widen with a roll sampled from the rolls that do not bust. It may be one already tried
+        o = indices[min(bisect_right(cumulative, rng.random() * cumulative[-1]), len(indices) - 1)]
+        if o not in node:
+            node[o] = [ROLL_PROBABILITIES[num_dice][o], 0, 0.0]
+    else:
+        # Revisit a roll already tried, sampled by probability
+        r = rng.random() * sum([stats[0] for o, stats in node.items() if o != BUST_OUTCOME])
+        for o, stats in node.items():
+            if o != BUST_OUTCOME:
+                r -= stats[0]
+                if r < 0:
+                    break
+
+    record = game_state.resolve_action(ucb_action, ROLL_DICE[num_dice][o])
+    v = chance_mcts_search(game_state, player_turn, num_worms, Qsa, Nsa, Ns, visited, outcomes, leaf_batch,
+                           widening_constant, widening_exponent)
+    game_state.undo_action(record)
+
+    stats = node[o]
+    stats[1] += 1
+    stats[2] += (v - stats[2]) / stats[1]
+    # The value of rolling is the exact bust term plus the probability-weighted mean over the rolls tried that do not
+    # bust, scaled to the probability of not busting. Weighting by probability rather than averaging simulations
+    # keeps rolls sampled more often than their probability from skewing it, and scaling keeps the bust term at its
+    # true weight while few rolls have been tried
+    p_bust, _, bust_value = node.get(BUST_OUTCOME, (0, 0, 0.0))
+    tried = [stats for o, stats in node.items() if o != BUST_OUTCOME]
+    Qsa[(s, a)] = p_bust * bust_value + (1 - p_bust) * sum([p * value for p, _, value in tried]) / \
+        sum([p for p, _, _ in tried])
+    Nsa[(s, a)] = Nsa.get((s, a), 0) + 1
+    Ns[s] += 1
     return v
 
 
+def full_game_mcts_search(game_state: GameState, player_turn: int, Qsa, Nsa, Ns, visited, rollout_ai, opponent_ai,
+                          max_rollout_turns: int = None, scoring: str = SCORE_MARGIN, root_score: float = 0):
+    """
+    One simulation of a full game search. Walks the tree over player_turn's turn with UCB, then values the leaf with
+    a policy rollout. Leaves game_state as it found it
+    :param root_score: Score of the root state, subtracted from every value so values are changes, like the worm
+    changes of mcts_search. UCB explores untried actions only while the values of tried actions are small
+    :return: Change in the score of player_turn from the root to the end of the rollout. See game_state_score
+    """
+    if game_state.player_turn != player_turn or game_state.is_game_over():
+        # The turn ended in the tree, which counts towards the turns played out
+        max_turns = max_rollout_turns - 1 if max_rollout_turns is not None else None
+        return policy_rollout_value(game_state, player_turn, rollout_ai, opponent_ai, max_turns, scoring) - root_score
+
+    s = game_state.canonical_key()
+    if s not in visited:
+        visited.add(s)
+        Ns[s] = 0
+        return policy_rollout_value(game_state, player_turn, rollout_ai, opponent_ai, max_rollout_turns,
+                                    scoring) - root_score
+
+    ucb_action = get_best_action_ucb(game_state, Qsa, Nsa, Ns)
+    record = game_state.resolve_action(ucb_action)
+    v = full_game_mcts_search(game_state, player_turn, Qsa, Nsa, Ns, visited, rollout_ai, opponent_ai,
+                              max_rollout_turns, scoring, root_score)
+    game_state.undo_action(record)
+    update_search_values(v, s, ucb_action.to_code(), Qsa, Nsa, Ns)
+    return v
+
+
+def policy_rollout(game_state: GameState, player: int, player_ai, opponent_ai, max_turns: int = None,
+                   undo_records: List = None) -> GameState:
+    """
+    Play the game on with ais until max_turns turns have ended or the game is over
+    :param game_state: GameState to roll out from. Mutated in place
+    :param player: Player whose moves player_ai makes. opponent_ai makes every other player's moves
+    :param max_turns: Number of turns to end, counting the turn in progress, or None to play to the end of the game
+    :param undo_records: Optional list to append the undo record of every action resolved to
+    :return: game_state
+    """
+    turn = game_state.player_turn
+    turns_left = max_turns
+    while turns_left != 0 and not game_state.is_game_over():
+        ai = player_ai if turn == player else opponent_ai
+        record = game_state.resolve_action(ai(game_state, game_state.get_next_actions()))
+        if undo_records is not None:
+            undo_records.append(record)
+        if game_state.player_turn != turn:
+            turn = game_state.player_turn
+            if turns_left is not None:
+                turns_left -= 1
+    return game_state
+
+
+def policy_rollout_value(game_state: GameState, player: int, player_ai, opponent_ai, max_turns: int = None,
+                         scoring: str = SCORE_MARGIN) -> float:
+    """
+    Score of the state reached by a policy rollout from game_state. See policy_rollout. Leaves game_state as it
+    found it
+    """
+    records = []
+    policy_rollout(game_state, player, player_ai, opponent_ai, max_turns, records)
+    v = game_state_score(game_state, player, scoring)
+    undo_actions(game_state, records)
+    return v
+
+
+def game_state_score(game_state: GameState, player: int, scoring: str = SCORE_MARGIN) -> float:
+    """
+    Value of a state for a player
+    :param scoring: SCORE_WORMS for the player's worm count, SCORE_MARGIN for their worm count minus the most worms
+    of any other player, or SCORE_RANK for the fraction of other players they have more worms than, with ties
+    counting half
+    :return: Value of the state
+    """
+    worms = game_state.get_worm_count(player)
+    if scoring == SCORE_WORMS:
+        return worms
+    others = [game_state.get_worm_count(p) for p in range(game_state.num_players) if p != player]
+    if scoring == SCORE_MARGIN:
+        return worms - max(others)
+    if scoring == SCORE_RANK:
+        return sum([1 if worms > w else 0.5 if worms == w else 0 for w in others]) / len(others)
+    raise ValueError(f"Unknown scoring {scoring}")
+
+
 def get_change_worm_count(game_state: GameState, player: int, orig_num_worms: int) -> int:
     """
     Returns the difference between the original worm count and the worm count in the current
@@ -135,24 +747,36 @@ def get_change_worm_count(game_state: GameState, player: int, orig_num_worms: in
     :param orig_num_worms: Original worm count to calculate against
     :return: Difference in worm count for player between the current worm count in game_state and orig_num_worms
     """
-    worm_counts = game_state.calculate_worm_count()
-    return worm_counts[player] - orig_num_worms
+    return game_state.get_worm_count(player) - orig_num_worms
 
 
-def random_rollout_result(game_state: GameState, player_turn: int):
+def random_rollout_result(game_state: GameState, player_turn: int, undo_records: List = None):
     """
     Performs a random rollout from a given game state for the current player until the end of their turn
     :param game_state: GameState to perform rollout from
     :param player_turn: Player to perform rollout for. Rollout finishes when this player's turn is over
-    :return: GameState after the player's turn is over
+    :param undo_records: Optional list to append the undo record of every action resolved to
+    :return: GameState after the player's turn is over. Actions are chosen and dice rolled with the state's generator,
+    so roll out a copy with a generator of its own to leave a game's dice as they are
     """
+    rng = game_state.rng if game_state.rng is not None else random
     while game_state.player_turn == player_turn:
         possible_actions = game_state.get_next_actions()
-        game_state.resolve_action(choice(possible_actions))
+        record = game_state.resolve_action(rng.choice(possible_actions))
+        if undo_records is not None:
+            undo_records.append(record)
 
     return game_state
 
 
+def undo_actions(game_state: GameState, undo_records: List) -> None:
+    """
+    Undo every action in undo_records, most recent first, and empty the list
+    """
+    while undo_records:
+        game_state.undo_action(undo_records.pop())
+
+
 def get_best_action_ucb(game_state: GameState, Qsa, Nsa, Ns) -> Action:
     """
     Get the best valid action, calculate by Upper Confidence Bound.
@@ -163,14 +787,14 @@ def get_best_action_ucb(game_state: GameState, Qsa, Nsa, Ns) -> Action:
     :return: Best valid action
     """
     c = 1.41
-    s = str(game_state)
+    s = game_state.canonical_key()
     possible_actions = game_state.get_next_actions()
 
     # Calculate best action using UCB
     best_u = -float("inf")
     best_a = None
     for action in possible_actions:
-        a = str(action)
+        a = action.to_code()
         if (s, a) in Qsa:
             u = Qsa[(s, a)] + c * sqrt(Ns[s])/(1 + Nsa[(s, a)])
         else:
@@ -183,7 +807,7 @@ def get_best_action_ucb(game_state: GameState, Qsa, Nsa, Ns) -> Action:
     return best_a
 
 
-def update_search_values(v: int, s: str, a: str, Qsa, Nsa, Ns):
+def update_search_values(v: int, s: Tuple, a: int, Qsa, Nsa, Ns):
     if (s, a) in Qsa:
         Qsa[(s, a)] = (Nsa[(s, a)] * Qsa[(s, a)] + v) / (Nsa[(s, a)] + 1)
         Nsa[(s, a)] += 1
@@ -0,0 +1,301 @@
+import numpy as np
+from Action import Action
+from CompactGameState import WORMS, DIE_SCORES
+from dice_tables import MAX_DICE, ROLL_COUNTS, ROLL_MASKS, ROLL_WAYS
+from GameState import GameState
+from ai import random_ai, safe_ai, safe_ai_better_die_saving
+from typing import Dict
+
+NUM_DOMINOES = GameState.MAX_DOMINO - GameState.MIN_DOMINO
+ALL_COMMUNITY_DOMINOES = (1 << NUM_DOMINOES) - 1
+ALL_DIE_NUMBERS_MASK = 0b1111110
+WORM_DIE = 6
+
+WORMS_TABLE = np.array(WORMS + (0,), dtype=np.int16)
+DIE_SCORES_TABLE = np.array(DIE_SCORES, dtype=np.int16)
+
+# Number of bits needed to represent each community bitmask, i.e. 1 + index of the highest available domino
+BIT_LENGTHS = np.array([i.bit_length() for i in range(1 << NUM_DOMINOES)], dtype=np.int8)
+# Number of die numbers in each saved die number mask
+MASK_SIZES = np.array([bin(i).count("1") for i in range(1 << 7)], dtype=np.int8)
+
+# Dice roll tables as arrays, indexed by number of dice. Counts are indexed by die number (column 0 is unused)
+ROLL_COUNTS_TABLES = [np.array([(0,) + c for c in counts], dtype=np.int16) for counts in ROLL_COUNTS]
+ROLL_MASKS_TABLES = [np.array(masks, dtype=np.int16) for masks in ROLL_MASKS]
+CUMULATIVE_WAYS_TABLES = [np.cumsum(np.array(ways, dtype=np.int64)) for ways in ROLL_WAYS]
+
+
+class BatchGameState:
+    """
+    Many games stored in NumPy arrays and advanced in lockstep. Plays the same game as GameState.
+
+    Dice are stored as counts per die number, indexed by die number (column 0 is unused). Saved die numbers and
+    community dominoes are bitmasks, as in CompactGameState. Player stacks are padded arrays of domino numbers.
+    """
+
+    def __init__(self, num_games: int, num_players: int, rng: np.random.Generator):
+        self.num_games = num_games
+        self.num_players = num_players
+        self.rng = rng
+
+        self.community = np.full(num_games, ALL_COMMUNITY_DOMINOES, dtype=np.int32)
+        self.stacks = np.zeros((num_games, num_players, NUM_DOMINOES), dtype=np.int16)
+        self.stack_heights = np.zeros((num_games, num_players), dtype=np.int16)
+        # Domino on top of every player's stack, or 0 for empty stacks
+        self.tops = np.zeros((num_games, num_players), dtype=np.int16)
+        self.player_turn = np.full(num_games, GameState.STARTING_PLAYER_TURN, dtype=np.int16)
+        self.num_turns = np.zeros(num_games, dtype=np.int32)
+
+        self.saved_counts = np.zeros((num_games, 7), dtype=np.int16)
+        self.saved_mask = np.zeros(num_games, dtype=np.int16)
+        self.num_saved = np.zeros(num_games, dtype=np.int16)
+        self.score = np.zeros(num_games, dtype=np.int16)
+        self.roll_counts = np.zeros((num_games, 7), dtype=np.int16)
+        self.roll_mask = np.zeros(num_games, dtype=np.int16)
+        self.is_roll_resolved = np.ones(num_games, dtype=bool)
+
+    def active_games(self) -> np.ndarray:
+        """
+        :return: Indices of the games that are not over
+        """
+        return np.flatnonzero(self.community != 0)
+
+    def community_take(self, idx: np.ndarray) -> np.ndarray:
+        """
+        :return: Highest community domino that can be taken in the games idx, or 0 if none can be taken
+        """
+        score = self.score[idx].astype(np.int32)
+        below = np.left_shift(1, np.clip(score - GameState.MIN_DOMINO + 1, 0, NUM_DOMINOES)) - 1
+        highest = BIT_LENGTHS[self.community[idx] & below].astype(np.int16)
+        can_take = self.is_roll_resolved[idx] & (self.saved_mask[idx] >> WORM_DIE & 1 == 1) & (highest > 0)
+        return np.where(can_take, highest + GameState.MIN_DOMINO - 1, 0)
+
+    def steal_takes(self, idx: np.ndarray) -> np.ndarray:
+        """
+        :return: Domino that can be stolen from every player in the games idx, or 0 if none can be stolen. Shape
+        (games, players)
+        """
+        tops = self.tops[idx]
+        score = self.score[idx]
+        can_take = self.is_roll_resolved[idx] & (self.saved_mask[idx] >> WORM_DIE & 1 == 1)
+        not_current = np.arange(self.num_players)[None, :] != self.player_turn[idx][:, None]
+        return np.where((tops == score[:, None]) & not_current & can_take[:, None], tops, 0)
+
+    def can_roll(self, idx: np.ndarray) -> np.ndarray:
+        return self.is_roll_resolved[idx] & (self.saved_mask[idx] != ALL_DIE_NUMBERS_MASK) & \
+            (self.num_saved[idx] < GameState.NUM_DICE)
+
+    def savable_dice(self, idx: np.ndarray) -> np.ndarray:
+        """
+        :return: Boolean array of the die numbers that can be saved in the games idx. Shape (games, 7), indexed by
+        die number
+        """
+        savable = self.roll_mask[idx] & ~self.saved_mask[idx]
+        return (savable[:, None] >> np.arange(7)[None, :] & 1) == 1
+
+    def resolve_actions(self, idx: np.ndarray, codes: np.ndarray) -> None:
+        """
+        Play one action in each of the games idx. codes are Action codes (see Action.to_code)
+        """
+        roll = idx[codes == Action.CODE_ROLL_DICE]
+        save = codes < Action.CODE_NEXT_PLAYER_TURN
+        save &= codes != Action.CODE_ROLL_DICE
+        next_turn = idx[codes == Action.CODE_NEXT_PLAYER_TURN]
+        take = codes > Action.CODE_NEXT_PLAYER_TURN
+
+        if roll.size:
+            self._roll(roll)
+        if save.any():
+            self._save(idx[save], codes[save])
+        if next_turn.size:
+            self._lose_domino(next_turn)
+            self._increment_player_turn(next_turn)
+        if take.any():
+            self._take(idx[take], codes[take])
+
+    def _roll(self, idx: np.ndarray) -> None:
+        # Sample each roll with one draw from the dice roll tables
+        num_dice = GameState.NUM_DICE - self.num_saved[idx]
+        for n in range(1, MAX_DICE + 1):
+            rolling = idx[num_dice == n]
+            if rolling.size:
+                draws = self.rng.integers(0, 6 ** n, size=rolling.size)
+                rolls = np.searchsorted(CUMULATIVE_WAYS_TABLES[n], draws, side="right")
+                self.roll_counts[rolling] = ROLL_COUNTS_TABLES[n][rolls]
+                self.roll_mask[rolling] = ROLL_MASKS_TABLES[n][rolls]
+        self.is_roll_resolved[idx] = False
+
+        # Bust if every die rolled was saved before
+        bust = idx[(self.roll_mask[idx] & ~self.saved_mask[idx]) == 0]
+        if bust.size:
+            self._lose_domino(bust)
+            self._increment_player_turn(bust)
+
+    def _save(self, idx: np.ndarray, dice: np.ndarray) -> None:
+        counts = self.roll_counts[idx, dice]
+        self.saved_counts[idx, dice] += counts
+        self.num_saved[idx] += counts
+        self.score[idx] += DIE_SCORES_TABLE[dice] * counts
+        self.saved_mask[idx] |= np.left_shift(1, dice).astype(np.int16)
+        self.roll_counts[idx] = 0
+        self.roll_mask[idx] = 0
+        self.is_roll_resolved[idx] = True
+
+    def _take(self, idx: np.ndarray, dominoes: np.ndarray) -> None:
+        bits = np.left_shift(1, dominoes.astype(np.int32) - GameState.MIN_DOMINO)
+        from_community = (self.community[idx] & bits) != 0
+        self.community[idx[from_community]] &= ~bits[from_community]
+
+        # Steal from the other player with the domino on top of their stack
+        steal = ~from_community
+        if steal.any():
+            steal_idx = idx[steal]
+            not_current = np.arange(self.num_players)[None, :] != self.player_turn[steal_idx][:, None]
+            rows, players = np.nonzero((self.tops[steal_idx] == dominoes[steal][:, None]) & not_current)
+            if rows.size != steal_idx.size:
+                raise RuntimeError("Attempted to take a domino that was not available")
+            self._pop(steal_idx[rows], players)
+
+        turns = self.player_turn[idx]
+        self.stacks[idx, turns, self.stack_heights[idx, turns]] = dominoes
+        self.stack_heights[idx, turns] += 1
+        self.tops[idx, turns] = dominoes
+        self._increment_player_turn(idx)
+
+    def _pop(self, idx: np.ndarray, players: np.ndarray) -> None:
+        # Remove the top domino of the stack of players in the games idx
+        heights = self.stack_heights[idx, players] - 1
+        self.stack_heights[idx, players] = heights
+        self.tops[idx, players] = np.where(heights > 0, self.stacks[idx, players, np.maximum(heights - 1, 0)], 0)
+
+    def _lose_domino(self, idx: np.ndarray) -> None:
+        turns = self.player_turn[idx]
+        heights = self.stack_heights[idx, turns]
+        has_domino = heights > 0
+        idx, turns, heights = idx[has_domino], turns[has_domino], heights[has_domino]
+        if idx.size == 0:
+            return
+
+        domino = self.tops[idx, turns].astype(np.int32)
+        self._pop(idx, turns)
+
+        # Add domino back to community and remove largest community domino from the game
+        community = self.community[idx] | np.left_shift(1, domino - GameState.MIN_DOMINO)
+        self.community[idx] = community & ~np.left_shift(1, BIT_LENGTHS[community].astype(np.int32) - 1)
+
+    def _increment_player_turn(self, idx: np.ndarray) -> None:
+        self.saved_counts[idx] = 0
+        self.saved_mask[idx] = 0
+        self.num_saved[idx] = 0
+        self.score[idx] = 0
+        self.roll_counts[idx] = 0
+        self.roll_mask[idx] = 0
+        self.is_roll_resolved[idx] = True
+        self.player_turn[idx] = (self.player_turn[idx] + 1) % self.num_players
+        self.num_turns[idx] += 1
+
+    def worm_counts(self) -> np.ndarray:
+        """
+        :return: Number of worms each player has in each game. Shape (games, players)
+        """
+        held = np.arange(NUM_DOMINOES)[None, None, :] < self.stack_heights[:, :, None]
+        return (WORMS_TABLE[self.stacks] * held).sum(axis=2)
+
+    def winners(self) -> np.ndarray:
+        """
+        :return: Winner of each game. The player with the most worms, with ties won by the highest domino
+        """
+        held = np.arange(NUM_DOMINOES)[None, None, :] < self.stack_heights[:, :, None]
+        highest = np.where(held, self.stacks, 0).max(axis=2)
+        return np.argmax(self.worm_counts() * 64 + highest, axis=1)
+
+
+def batch_random_policy(state: BatchGameState, idx: np.ndarray) -> np.ndarray:
+    """
+    Batch version of random_ai. Picks a random possible action in each of the games idx
+    :return: Action codes
+    """
+    savable = state.savable_dice(idx)[:, 1:]
+    community_take = state.community_take(idx)
+    steals = state.steal_takes(idx)
+    can_roll = state.can_roll(idx)
+
+    codes = np.concatenate([np.broadcast_to(np.arange(1, 7), savable.shape), community_take[:, None], steals,
+                            np.zeros((idx.size, 1), dtype=np.int16)], axis=1)
+    possible = np.concatenate([savable, community_take[:, None] > 0, steals > 0, can_roll[:, None]], axis=1)
+
+    # Uniform choice between possible actions by taking the largest random key
+    keys = np.where(possible, state.rng.random(possible.shape), -1.0)
+    chosen = codes[np.arange(idx.size), np.argmax(keys, axis=1)]
+    return np.where(possible.any(axis=1), chosen, Action.CODE_NEXT_PLAYER_TURN)
+
+
+def _take_or_roll(state: BatchGameState, idx: np.ndarray) -> np.ndarray:
+    # Take the highest domino possible. Otherwise roll if possible, or end the turn
+    take = np.maximum(state.community_take(idx), state.steal_takes(idx).max(axis=1))
+    codes = np.where(state.can_roll(idx), Action.CODE_ROLL_DICE, Action.CODE_NEXT_PLAYER_TURN)
+    return np.where(take > 0, take, codes)
+
+
+def batch_safe_policy(state: BatchGameState, idx: np.ndarray) -> np.ndarray:
+    """
+    Batch version of safe_ai. Takes a domino whenever possible and otherwise saves the largest die
+    :return: Action codes
+    """
+    codes = _take_or_roll(state, idx)
+    savable = state.savable_dice(idx)
+    largest = 6 - np.argmax(savable[:, :0:-1], axis=1)
+    return np.where(savable.any(axis=1), largest, codes)
+
+
+def batch_safe_better_die_saving_policy(state: BatchGameState, idx: np.ndarray) -> np.ndarray:
+    """
+    Batch version of safe_ai_better_die_saving. Takes a domino whenever possible. Otherwise saves a worm if 3 or more
+    die numbers are saved but no worms, and otherwise saves the die number with the largest total score
+    :return: Action codes
+    """
+    codes = _take_or_roll(state, idx)
+    savable = state.savable_dice(idx)
+
+    # Largest total score, with ties broken by the larger die number
+    totals = state.roll_counts[idx] * DIE_SCORES_TABLE[None, :] * 8 + np.arange(7)[None, :]
+    best = np.argmax(np.where(savable, totals, -1), axis=1)
+
+    saved_mask = state.saved_mask[idx]
+    save_worm = (MASK_SIZES[saved_mask] > 2) & (saved_mask >> WORM_DIE & 1 == 0) & savable[:, WORM_DIE]
+    best = np.where(save_worm, WORM_DIE, best)
+    return np.where(savable.any(axis=1), best, codes)
+
+
+# Batch policies equal to ai functions
+BATCH_POLICIES = {
+    random_ai: batch_random_policy,
+    safe_ai: batch_safe_policy,
+    safe_ai_better_die_saving: batch_safe_better_die_saving_policy,
+}
+
+
+def simulate_batch(num_games: int, num_players: int, player_ais: Dict, seed: int = None) -> BatchGameState:
+    """
+    Play num_games games in lockstep until every game finishes
+    :param num_games: Number of games to play
+    :param num_players: Number of players in each game
+    :param player_ais: Dictionary mapping player number to ai function or batch policy. ai functions must have a
+    batch version in BATCH_POLICIES
+    :param seed: Seed for the games
+    :return: Final BatchGameState
+    """
+    policies = {p: BATCH_POLICIES.get(ai, ai) for p, ai in player_ais.items()}
+    state = BatchGameState(num_games, num_players, np.random.default_rng(seed))
+
+    idx = state.active_games()
+    while idx.size:
+        codes = np.empty(idx.size, dtype=np.int16)
+        turns = state.player_turn[idx]
+        for player_num, policy in policies.items():
+            players_games = turns == player_num
+            if players_games.any():
+                codes[players_games] = policy(state, idx[players_games])
+        state.resolve_actions(idx, codes)
+        idx = state.active_games()
+    return state
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Callable, Dict, List
+from ai import random_ai, safe_ai, safe_ai_better_die_saving, monte_carlo_ai_random_playouts, random_rollout_result, \
+    seed_search_rng
+from CompactGameState import CompactGameState
+from GameState import GameState
+from main import play_game
+from validation import get_validation_mode, set_validation_mode, VALIDATION_OFF
+
+# Ai for each player in the play_game benchmarks
+LINEUPS = {
+    "random": {0: random_ai, 1: random_ai, 2: random_ai, 3: random_ai},
+    "safe": {0: safe_ai, 1: safe_ai_better_die_saving, 2: safe_ai, 3: safe_ai_better_die_saving},
+    "mcts_vs_safe": {0: monte_carlo_ai_random_playouts, 1: safe_ai_better_die_saving,
+                     2: monte_carlo_ai_random_playouts, 3: safe_ai_better_die_saving},
+}
+
+# A benchmark is slower than the baseline if its ops/sec dropped by more than this fraction
+DEFAULT_TOLERANCE = 0.2
+
+# Reference results compared against when --baseline is given without a file. Regenerate with
+# python benchmark.py --output benchmark_baseline.json on the machine the comparison runs on
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(make_values: Callable[[], List], op: Callable, repeat: int = 1, seed: int = 0) -> Dict[str, float]:
+    """
+    Time op once for every value made by make_values, repeat times over
+    :param make_values: Function returning the values to call op with. Called before every pass and not timed
+    :param op: Function to benchmark. Called with one value at a time, and each call is timed on its own
+    :param repeat: Number of passes through the values
+    :param seed: Seed of the random module and the search stream (see ai.search_rng) for every pass
+    :return: Dictionary of ops_per_sec, p50_us and p99_us latency, and peak_memory_kb allocated during one pass
+    """
+    times = []
+    total = 0
+    for _ in range(repeat):
+        values = make_values()
+        random.seed(seed)
+        seed_search_rng(seed)
+        for value in values:
+            t = perf_counter()
+            op(value)
+            elapsed = perf_counter() - t
+            times.append(elapsed)
+            total += elapsed
+
+    # Peak memory is measured on a separate pass, since tracing slows down allocations
+    values = make_values()
+    random.seed(seed)
+    seed_search_rng(seed)
+    tracemalloc.start()
+    for value in values:
+        op(value)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times.sort()
+    return {
+        "ops_per_sec": len(times) / total,
+        "p50_us": _percentile(times, 0.5) * 1e6,
+        "p99_us": _percentile(times, 0.99) * 1e6,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def sample_states(num_states: int, state_class=GameState, seed: int = 0) -> List:
+    """
+    States visited in seeded games between safe ais, for the game state benchmarks
+    """
+    random.seed(seed)
+    states = []
+    while len(states) < num_states:
+        gs = state_class(4)
+        while not gs.is_game_over() and len(states) < num_states:
+            states.append(gs.__copy__())
+            gs.resolve_action(safe_ai_better_die_saving(gs, gs.get_next_actions()))
+    return states
+
+
+def _resolve_first_action(args) -> None:
+    game_state, action = args
+    game_state.resolve_action(action)
+
+
+def run_benchmarks(quick: bool = False, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Run every benchmark with fixed seeds and validation turned off. The caller's validation mode is restored after
+    :param quick: Run fewer iterations, for a smoke test
+    :param seed: Seed for the sampled states and every benchmark
+    :return: Dictionary mapping benchmark name to its results. See measure
+    """
+    caller_validation_mode = get_validation_mode()
+    set_validation_mode(VALIDATION_OFF)
+    try:
+        return _run_benchmarks(quick, seed)
+    finally:
+        set_validation_mode(*caller_validation_mode)
+
+
+def _run_benchmarks(quick: bool, seed: int) -> Dict[str, Dict[str, float]]:
+    num_states = 200 if quick else 2000
+    num_decisions = 3 if quick else 20
+    num_games = {"random": 2 if quick else 50, "safe": 2 if quick else 50, "mcts_vs_safe": 1 if quick else 3}
+
+    results = {}
+    for state_class in (GameState, CompactGameState):
+        name = state_class.__name__
+        states = sample_states(num_states, state_class, seed)
+        results[f"{name}.get_next_actions"] = measure(lambda: states, lambda gs: gs.get_next_actions(), repeat=5,
+                                                      seed=seed)
+        results[f"{name}.__copy__"] = measure(lambda: states, lambda gs: gs.__copy__(), repeat=5, seed=seed)
+
+        # Resolve on copies, so every pass starts from the same states
+        results[f"{name}.resolve_action"] = measure(
+            lambda: [(gs.__copy__(), gs.get_next_actions()[0]) for gs in states], _resolve_first_action, repeat=5,
+            seed=seed)
+
+        rollout_states = states[:num_states // 10]
+        results[f"{name}.random_rollout_result"] = measure(
+            lambda: [gs.__copy__() for gs in rollout_states], lambda gs: random_rollout_result(gs, gs.player_turn),
+            repeat=5, seed=seed)
+
+    decision_states = [gs for gs in sample_states(num_states, GameState, seed)
+                       if len(gs.get_next_actions()) > 1][:num_decisions]
+    results["monte_carlo_ai_random_playouts"] = measure(
+        lambda: decision_states, lambda gs: monte_carlo_ai_random_playouts(gs, gs.get_next_actions()), seed=seed)
+
+    for lineup, player_ais in LINEUPS.items():
+        results[f"play_game.{lineup}"] = measure(lambda: range(num_games[lineup]), lambda _: play_game(4, player_ais),
+                                                 seed=seed)
+    return results
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                        tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    :return: Names of the benchmarks whose ops/sec dropped by more than tolerance compared to baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["ops_per_sec"] < baseline[name]["ops_per_sec"] * (1 - tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]] = None) -> None:
+    print(f"{'benchmark':<40}{'ops/sec':>12}{'p50 us':>12}{'p99 us':>12}{'peak KB':>10}{'vs base':>10}")
+    for name, r in results.items():
+        change = ""
+        if baseline is not None and name in baseline:
+            change = f"{r['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1:+.0%}"
+        print(f"{name:<40}{r['ops_per_sec']:>12.1f}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}"
+              f"{r['peak_memory_kb']:>10.1f}{change:>10}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the game engine and ais")
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE_PATH,
+                        help="JSON file of earlier results to compare against. Defaults to benchmark_baseline.json "
+                             "when given without a file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Fraction ops/sec can drop below the baseline before it counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="Run fewer iterations")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(quick=args.quick, seed=args.seed)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "seed": args.seed, "quick": args.quick,
+                       "results": results}, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Slower than baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
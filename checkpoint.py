@@ -0,0 +1,137 @@
+import os
+import pickle
+import time
+from typing import Iterator, Set
+from CompactGameState import CompactGameState
+from results import ResultsWriter
+from tournament import GameRecord, TournamentSummary, run_tournament
+
+CHECKPOINT_VERSION = 1
+
+
+class TournamentCheckpoint:
+    """
+    Progress of a tournament: which games are finished, their aggregate statistics and how much of the results file
+    holds their records. Every game is seeded from the tournament seed and its game number, so the games left can be
+    played from the checkpoint alone
+    """
+
+    def __init__(self, num_games: int, num_players: int, seed: int, use_numpy_rng: bool = False):
+        self.version = CHECKPOINT_VERSION
+        self.num_games = num_games
+        self.num_players = num_players
+        self.seed = seed
+        self.use_numpy_rng = use_numpy_rng
+        self.summary = TournamentSummary(num_players)
+        # Every game below next_game is finished. Games finish out of order, so later finished games are kept in
+        # finished until next_game reaches them
+        self.next_game = 0
+        self.finished: Set[int] = set()
+        # Size in bytes of the results file holding the records of the finished games
+        self.results_size = 0
+
+    def add(self, record: GameRecord) -> None:
+        self.summary.add(record)
+        self.finished.add(record.game_num)
+        while self.next_game in self.finished:
+            self.finished.remove(self.next_game)
+            self.next_game += 1
+
+    def is_finished(self, game_num: int) -> bool:
+        return game_num < self.next_game or game_num in self.finished
+
+    def remaining_games(self) -> Iterator[int]:
+        """
+        :return: Iterator of the game numbers left to play, in order
+        """
+        finished = frozenset(self.finished)
+        return (game_num for game_num in range(self.next_game, self.num_games) if game_num not in finished)
+
+    def save(self, path: str) -> None:
+        """
+        Write the checkpoint to a temporary file and move it over path, so a crash while saving leaves the previous
+        checkpoint
+        """
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load(path: str) -> 'TournamentCheckpoint':
+        with open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+        if not isinstance(checkpoint, TournamentCheckpoint) or checkpoint.version != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is not a version {CHECKPOINT_VERSION} tournament checkpoint")
+        return checkpoint
+
+
+def run_checkpointed_tournament(num_games: int, num_players: int, player_ais, checkpoint_path: str,
+                                results_path: str = None, checkpoint_interval: float = 60.0,
+                                num_processes: int = None, seed: int = 0, state_class=CompactGameState,
+                                validation_mode: str = None, chunksize: int = 4,
+                                use_numpy_rng: bool = False) -> TournamentSummary:
+    """
+    Play a tournament like tournament.run_tournament, saving its progress to a checkpoint as games finish. Running
+    it again with the same checkpoint resumes where the last checkpoint stopped: finished games are not played
+    again, and games that finished after the last checkpoint are dropped from the results file and played again.
+    Games are seeded by game number, so a resumed tournament has the same results as an uninterrupted one for ais
+    without random state of their own
+    :param num_games: Number of games in the tournament. Can be raised when resuming to play more games
+    :param num_players: Number of players in each game
+    :param player_ais: Dictionary mapping player number to ai function. Must be picklable
+    :param checkpoint_path: Checkpoint file. Resumed from if it exists
+    :param results_path: CSV file to write the record of every game to. See results.ResultsWriter. Must be empty or
+    missing when the checkpoint does not exist. Defaults to checkpoint_path with .csv appended
+    :param checkpoint_interval: Seconds between checkpoints. A checkpoint is also saved when the tournament finishes
+    :param num_processes: Number of worker processes. See run_tournament
+    :param seed: Tournament seed
+    :param state_class: Game state representation to play on. GameState or CompactGameState
+    :param validation_mode: Validation mode for the workers. See validation.set_validation_mode. None to inherit
+    :param chunksize: Number of games sent to a worker at a time
+    :param use_numpy_rng: Roll dice with NumPy Generators. See play_game_record
+    :return: Summary of every game in the tournament, including the games played before resuming
+    """
+    if results_path is None:
+        results_path = checkpoint_path + ".csv"
+
+    if os.path.exists(checkpoint_path):
+        checkpoint = TournamentCheckpoint.load(checkpoint_path)
+        if (checkpoint.num_players, checkpoint.seed, checkpoint.use_numpy_rng) != (num_players, seed, use_numpy_rng):
+            raise ValueError(f"{checkpoint_path} is a checkpoint of a tournament with different players or seed")
+        checkpoint.num_games = num_games
+        if not os.path.exists(results_path) or os.path.getsize(results_path) < checkpoint.results_size:
+            raise ValueError(f"{results_path} is missing records saved in {checkpoint_path}")
+        # Drop the records of games finished after the checkpoint. They are played again
+        with open(results_path, "ab") as f:
+            f.truncate(checkpoint.results_size)
+    else:
+        # Records already in the file would be counted as games of this tournament on resume
+        if os.path.exists(results_path) and os.path.getsize(results_path) > 0:
+            raise ValueError(f"{results_path} already has results and {checkpoint_path} does not exist")
+        checkpoint = TournamentCheckpoint(num_games, num_players, seed, use_numpy_rng)
+
+    with ResultsWriter(results_path, num_players) as writer:
+
+        def save_checkpoint():
+            writer.sync()
+            checkpoint.results_size = os.path.getsize(results_path)
+            checkpoint.save(checkpoint_path)
+
+        # Save before the first game, so a crash before the first interval resumes from an empty tournament
+        save_checkpoint()
+        last_checkpoint = time.perf_counter()
+        for record in run_tournament(num_games, num_players, player_ais, num_processes=num_processes, seed=seed,
+                                     state_class=state_class, validation_mode=validation_mode,
+                                     chunksize=chunksize, use_numpy_rng=use_numpy_rng,
+                                     game_nums=checkpoint.remaining_games()):
+            writer.add(record)
+            checkpoint.add(record)
+            if time.perf_counter() - last_checkpoint >= checkpoint_interval:
+                save_checkpoint()
+                last_checkpoint = time.perf_counter()
+        save_checkpoint()
+
+    return checkpoint.summary
@@ -0,0 +1,113 @@
+import random
+from bisect import bisect_right
+from functools import lru_cache
+from math import factorial
+from typing import List, Tuple
+
+MAX_DICE = 8
+NUM_DIE_NUMBERS = 6
+
+
+def _enumerate_counts(num_dice: int) -> List[Tuple[int, ...]]:
+    # Every way to split num_dice dice between the six die numbers
+    if num_dice == 0:
+        return [(0,) * NUM_DIE_NUMBERS]
+    counts = []
+
+    def add_counts(prefix, dice_left):
+        if len(prefix) == NUM_DIE_NUMBERS - 1:
+            counts.append(prefix + (dice_left,))
+            return
+        for c in range(dice_left + 1):
+            add_counts(prefix + (c,), dice_left - c)
+
+    add_counts((), num_dice)
+    return counts
+
+
+def _num_orderings(counts: Tuple[int, ...]) -> int:
+    ways = factorial(sum(counts))
+    for c in counts:
+        ways //= factorial(c)
+    return ways
+
+
+# Indexed by number of dice. ROLL_COUNTS[n][i] is the count of each die number in the i-th distinct roll of n dice,
+# where ROLL_COUNTS[n][i][d - 1] is the number of dice showing d
+ROLL_COUNTS: Tuple[Tuple[Tuple[int, ...], ...], ...] = tuple(tuple(_enumerate_counts(n)) for n in range(MAX_DICE + 1))
+
+# Number of ordered rolls of n dice giving each distinct roll, and its probability
+ROLL_WAYS = tuple(tuple(_num_orderings(c) for c in counts) for counts in ROLL_COUNTS)
+ROLL_PROBABILITIES = tuple(tuple(w / NUM_DIE_NUMBERS ** n for w in ways) for n, ways in enumerate(ROLL_WAYS))
+
+# Dice of each distinct roll in ascending order
+ROLL_DICE = tuple(tuple(tuple(d for d in range(1, NUM_DIE_NUMBERS + 1) for _ in range(c[d - 1])) for c in counts)
+                  for counts in ROLL_COUNTS)
+
+# Bitmask of the die numbers in each distinct roll. Bit d is set if die number d was rolled
+ROLL_MASKS = tuple(tuple(sum(1 << d for d in range(1, NUM_DIE_NUMBERS + 1) if c[d - 1]) for c in counts)
+                   for counts in ROLL_COUNTS)
+
+_CUMULATIVE_WAYS = tuple(tuple(sum(ways[:i + 1]) for i in range(len(ways))) for ways in ROLL_WAYS)
+
+
+@lru_cache(maxsize=None)
+def roll_outcomes(num_dice: int) -> Tuple[Tuple[Tuple[int, ...], float], ...]:
+    """
+    Every distinct roll of num_dice dice and its probability
+    :return: Tuple of (counts, probability) pairs. counts[i] is the number of dice showing i + 1
+    """
+    return tuple(zip(ROLL_COUNTS[num_dice], ROLL_PROBABILITIES[num_dice]))
+
+
+@lru_cache(maxsize=None)
+def non_bust_outcomes(num_dice: int, saved_mask: int) -> Tuple[Tuple[Tuple[int, ...], float], ...]:
+    """
+    Distinct rolls of num_dice dice that include at least one die number that has not been saved
+    :param num_dice: Number of dice rolled
+    :param saved_mask: Bitmask of saved die numbers. Bit d is set if die number d has been saved
+    :return: Tuple of (counts, probability) pairs, as in roll_outcomes
+    """
+    return tuple((counts, p) for counts, p, mask in
+                 zip(ROLL_COUNTS[num_dice], ROLL_PROBABILITIES[num_dice], ROLL_MASKS[num_dice])
+                 if mask & ~saved_mask)
+
+
+@lru_cache(maxsize=None)
+def non_bust_roll_indices(num_dice: int, saved_mask: int) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+    """
+    Same rolls as non_bust_outcomes, as indices in the tables for num_dice dice
+    :return: Tuple of the roll indices and the cumulative probabilities of the rolls
+    """
+    indices = tuple(i for i, mask in enumerate(ROLL_MASKS[num_dice]) if mask & ~saved_mask)
+    cumulative = []
+    total = 0
+    for i in indices:
+        total += ROLL_PROBABILITIES[num_dice][i]
+        cumulative.append(total)
+    return indices, tuple(cumulative)
+
+
+def bust_probability(num_dice: int, saved_mask: int) -> float:
+    """
+    Probability that every die rolled shows a die number that has already been saved
+    """
+    return (bin(saved_mask & 0b1111110).count("1") / NUM_DIE_NUMBERS) ** num_dice
+
+
+def sample_roll_index(num_dice: int, rng=random) -> int:
+    """
+    Sample a roll of num_dice dice with a single random draw
+    :param rng: Random number generator with a randrange method
+    :return: Index of the distinct roll in the tables for num_dice dice
+    """
+    return bisect_right(_CUMULATIVE_WAYS[num_dice], rng.randrange(NUM_DIE_NUMBERS ** num_dice))
+
+
+def sample_roll(num_dice: int, rng=random) -> Tuple[int, ...]:
+    """
+    Sample a roll of num_dice dice with a single random draw
+    :param rng: Random number generator with a randrange method
+    :return: Dice rolled, in ascending order
+    """
+    return ROLL_DICE[num_dice][sample_roll_index(num_dice, rng)]
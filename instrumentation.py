@@ -0,0 +1,303 @@
+import atexit
+import json
+import os
+import random
+import sys
+from collections import Counter
+from functools import partial, wraps
+from time import perf_counter
+from typing import Dict, List
+
+# Environment variable to turn instrumentation on without code edits. "1" prints the histograms when the process
+# exits, and any other value is a JSON file to save them to
+INSTRUMENTATION_ENV_VAR = "PICKOMINO_INSTRUMENT"
+
+
+class Histogram:
+    """
+    Count, total, min and max of a metric, with values grouped into buckets. Memory does not grow with the number of
+    values
+    """
+
+    def __init__(self, log_buckets: bool = False):
+        """
+        :param log_buckets: Group values into power of two buckets instead of one bucket per int value
+        """
+        self.log_buckets = log_buckets
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value) -> None:
+        if self.log_buckets:
+            bucket = 1
+            while bucket < value:
+                bucket *= 2
+        else:
+            bucket = int(value)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def merge(self, other: 'Histogram') -> None:
+        """
+        Add the values recorded in another histogram with the same buckets to this histogram
+        """
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def to_dict(self) -> Dict:
+        """
+        :return: Summary and buckets. With log_buckets, each bucket counts the values <= the bucket and greater than
+        half of it
+        """
+        return {"count": self.count, "total": self.total, "mean": self.mean(), "min": self.min, "max": self.max,
+                "buckets": {str(b): n for b, n in sorted(self.buckets.items())}}
+
+
+class Instrumentation:
+    """
+    Histograms of the metrics recorded while instrumentation is on. See enable
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters = Counter()
+
+    def record(self, name: str, value, log_buckets: bool = False) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(log_buckets)
+        histogram.add(value)
+
+    def merge(self, other: 'Instrumentation') -> None:
+        """
+        Add the metrics recorded in another Instrumentation, such as a worker process's, to this one
+        """
+        self.counters.update(other.counters)
+        for name, other_histogram in other.histograms.items():
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(other_histogram.log_buckets)
+            histogram.merge(other_histogram)
+
+    def drain(self) -> 'Instrumentation':
+        """
+        Move the metrics recorded so far to a new Instrumentation and start again from empty histograms
+        :return: Instrumentation with the metrics recorded so far
+        """
+        drained = Instrumentation()
+        drained.histograms, drained.counters = self.histograms, self.counters
+        self.histograms = {}
+        self.counters = Counter()
+        return drained
+
+    def to_dict(self) -> Dict:
+        return {"counters": dict(self.counters),
+                "histograms": {name: h.to_dict() for name, h in sorted(self.histograms.items())}}
+
+    def export(self, path: str) -> None:
+        """
+        Save the counters and histograms to a JSON file
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def print_summary(self) -> None:
+        print("####### Instrumentation #######")
+        for name, n in sorted(self.counters.items()):
+            print(f"{name}:\t{n}")
+        for name, h in sorted(self.histograms.items()):
+            print(f"{name}:\tcount {h.count}\tmean {h.mean():.1f}\tmin {h.min}\tmax {h.max}\ttotal {h.total:.0f}")
+
+
+# Instrumentation recording metrics, or None when instrumentation is off
+instrumentation: Instrumentation = None
+
+# Original functions replaced by hooks, as (owner, attribute name, original) triples
+_originals = []
+
+
+def agent_name(ai) -> str:
+    """
+    Name of an ai function, ai class instance or functools.partial of an ai function
+    """
+    if isinstance(ai, partial):
+        return agent_name(ai.func)
+    return getattr(ai, "__name__", type(ai).__name__)
+
+
+def game_phase(game_state) -> str:
+    """
+    Phase of the game, by the number of community dominoes left: early (more than 10), mid or late (5 or fewer)
+    """
+    num_dominoes = bin(game_state.community).count("1")
+    if num_dominoes > 10:
+        return "early"
+    if num_dominoes > 5:
+        return "mid"
+    return "late"
+
+
+def _timed_ai(ai, recorder: Instrumentation):
+    name = agent_name(ai)
+
+    def timed(game_state, possible_actions):
+        phase = game_phase(game_state)
+        t = perf_counter()
+        action = ai(game_state, possible_actions)
+        elapsed = (perf_counter() - t) * 1e6
+        recorder.record(f"decision_latency_us.{name}", elapsed, log_buckets=True)
+        recorder.record(f"decision_latency_us.{name}.{phase}", elapsed, log_buckets=True)
+        recorder.counters["actions"] += 1
+        return action
+    return timed
+
+
+def _install(owner, attribute: str, make_hook) -> None:
+    original = getattr(owner, attribute)
+    _originals.append((owner, attribute, original))
+    setattr(owner, attribute, make_hook(original))
+
+
+def _main_modules() -> List:
+    import main
+    modules = [main]
+    # Run as a script, main.py is the __main__ module, a copy separate from the imported main module
+    script = sys.modules.get("__main__")
+    script_path = getattr(script, "__file__", None)
+    if script is not main and script_path is not None and \
+            os.path.abspath(script_path) == os.path.abspath(main.__file__):
+        modules.append(script)
+    return modules
+
+
+def enable() -> Instrumentation:
+    """
+    Start recording metrics. Hooks are installed by wrapping the functions that are measured, so nothing is measured
+    and no time is spent on instrumentation while it is off. Tournament worker processes started while
+    instrumentation is on record metrics too, and tournament.run_tournament merges them into this process's
+    Instrumentation as games finish.
+
+    Records per-agent decision latency (overall and by game phase), actions per game, MCTS simulations, tree size and
+    time per search, random playout lengths, and copies of game states
+    :return: Instrumentation the metrics are recorded in
+    """
+    global instrumentation
+    if instrumentation is not None:
+        return instrumentation
+    recorder = instrumentation = Instrumentation()
+
+    import ai
+    import tournament
+    from CompactGameState import CompactGameState
+    from GameState import GameState
+
+    def play_turn_hook(play_turn):
+        @wraps(play_turn)
+        def hook(game_state, player_ai, *args, **kwargs):
+            return play_turn(game_state, _timed_ai(player_ai, recorder), *args, **kwargs)
+        return hook
+
+    def game_hook(play_game):
+        @wraps(play_game)
+        def hook(*args, **kwargs):
+            num_actions = recorder.counters["actions"]
+            result = play_game(*args, **kwargs)
+            recorder.record("actions_per_game", recorder.counters["actions"] - num_actions)
+            recorder.counters["games"] += 1
+            return result
+        return hook
+
+    def run_mcts_hook(run_mcts):
+        @wraps(run_mcts)
+        def hook(game_state, Qsa, Nsa, Ns, visited, *args, **kwargs):
+            t = perf_counter()
+            num_sims = run_mcts(game_state, Qsa, Nsa, Ns, visited, *args, **kwargs)
+            recorder.record("mcts_search_us", (perf_counter() - t) * 1e6, log_buckets=True)
+            recorder.record("mcts_sims_per_decision", num_sims, log_buckets=True)
+            recorder.record("mcts_tree_size", len(visited), log_buckets=True)
+            return num_sims
+        return hook
+
+    def rollout_hook(rollout):
+        @wraps(rollout)
+        def hook(game_state, num_rollouts=1, rng=random, lengths=None):
+            lengths = [] if lengths is None else lengths
+            changes = rollout(game_state, num_rollouts, rng, lengths)
+            for length in lengths[-num_rollouts:]:
+                recorder.record("rollout_length", length)
+            return changes
+        return hook
+
+    def copy_hook(copy):
+        @wraps(copy)
+        def hook(self):
+            recorder.counters[f"{type(self).__name__}.__copy__"] += 1
+            return copy(self)
+        return hook
+
+    # play_turn is looked up in main by play_game and imported into tournament
+    for main in _main_modules():
+        _install(main, "play_turn", play_turn_hook)
+        _install(main, "play_game", game_hook)
+    _install(tournament, "play_turn", play_turn_hook)
+    _install(tournament, "play_game_record", game_hook)
+    _install(ai, "run_mcts", run_mcts_hook)
+    _install(ai, "random_rollout_worm_changes", rollout_hook)
+    _install(GameState, "__copy__", copy_hook)
+    _install(CompactGameState, "__copy__", copy_hook)
+    return recorder
+
+
+def disable() -> Instrumentation:
+    """
+    Stop recording metrics and remove the hooks
+    :return: Instrumentation with the metrics recorded while instrumentation was on, or None if it was off
+    """
+    global instrumentation
+    while _originals:
+        owner, attribute, original = _originals.pop()
+        setattr(owner, attribute, original)
+    recorder, instrumentation = instrumentation, None
+    return recorder
+
+
+def enable_from_env() -> None:
+    """
+    Turn instrumentation on if the PICKOMINO_INSTRUMENT environment variable is set, and print or save the histograms
+    when the process exits
+    :return: None
+    """
+    value = os.environ.get(INSTRUMENTATION_ENV_VAR)
+    if not value:
+        return
+    recorder = enable()
+    if value == "1":
+        atexit.register(recorder.print_summary)
+    else:
+        atexit.register(recorder.export, value)
+
+
+def enable_in_worker() -> None:
+    """
+    Turn instrumentation on in a tournament worker process, with empty metrics. Forked workers inherit the parent's
+    hooks and metrics, so those are removed first
+    :return: None
+    """
+    disable()
+    enable()
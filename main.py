@@ -1,52 +1,132 @@
 from ai import *
 from GameState import GameState
-import matplotlib.pyplot as plt
-import numpy
+from replay import ReplayWriter, check_seed, encode_rolls
+from rng import game_rng
+from validation import ActionLog, set_validation_mode_from_env
+from instrumentation import enable_from_env as enable_instrumentation_from_env
 
 
-def play_game(num_players: int, player_ais) -> GameState:
+def play_game(num_players: int, player_ais, state_class=GameState, action_log: ActionLog = None,
+              rng=None, seed: int = None, replay_writer: ReplayWriter = None) -> GameState:
     """
     Play a game until the game finishes. The player ai for each position chooses moves to play
     on its turn
     :param num_players: Number of players in the game
     :param player_ais: Dictionary mapping player number to ai function
+    :param state_class: Game state representation to play on. GameState or CompactGameState
+    :param action_log: Optional ActionLog to record the game in. See validation.check_action_log
+    :param rng: Random number generator to roll the dice with, or None to use the random module. See rng.make_rng
+    :param seed: Seed of the game. If given, the dice are rolled from rng.game_rng(seed). Cannot be given with rng
+    :param replay_writer: Optional ReplayWriter to record the game in. Needs the seed. See replay.replay_game
     :return: Final GameState
     """
+    if rng is not None and seed is not None:
+        raise ValueError("A game is rolled from its rng or its seed, not both")
+    if replay_writer is not None:
+        if seed is None:
+            raise ValueError("Recording a game needs its seed")
+        check_seed(seed)
+
     # Initialize a new game
-    gs = GameState(num_players)
+    gs = state_class(num_players)
+    gs.rng = rng if seed is None else game_rng(seed)
+    if action_log is not None:
+        action_log.num_players = num_players
+        gs.dice_log = action_log.rolls
+    action_codes = None
+    if replay_writer is not None:
+        action_codes = bytearray()
+        if gs.dice_log is None:
+            gs.dice_log = []
 
     # Every player plays a turn until the game is over
     while not gs.is_game_over():
         ai = player_ais.get(gs.player_turn)
-        play_turn(gs, ai)
+        play_turn(gs, ai, action_log, action_codes)
 
+    if replay_writer is not None:
+        replay_writer.add_game(seed, num_players, action_codes, encode_rolls(gs.dice_log))
     return gs
 
 
-def play_turn(game_state: GameState, ai) -> None:
+def play_turn(game_state: GameState, ai, action_log: ActionLog = None, action_codes: bytearray = None) -> None:
     """
     Play a single turn in a game using the ai to select moves to take.
     :param game_state: GameState at the start of the turn
     :param ai: Function to choose the next action, based on the current GameState
+    :param action_log: Optional ActionLog to record the chosen actions in
+    :param action_codes: Optional bytearray to append the code of each chosen action to. See replay.ReplayWriter
     :return: None
     """
     current_player = game_state.player_turn
 
+    # resolve_action validates the state according to the validation mode
     while game_state.player_turn == current_player:
-        game_state.assert_valid_game_state()
         chosen_action = ai(game_state, game_state.get_next_actions())
+        if action_log is not None:
+            action_log.actions.append(chosen_action.to_code())
+        if action_codes is not None:
+            action_codes.append(chosen_action.to_code())
         game_state.resolve_action(chosen_action)
 
 
-def simulate_games(num_games: int) -> None:
+def play_games(num_players: int, player_ais, rngs: List, state_class=GameState) -> List[GameState]:
+    """
+    Play many games together until they all finish. Every step, the pending decision of each unfinished game is
+    grouped with the other decisions for the same ai, and each ai chooses the actions of its group in one call to
+    ai.decide_batch. Ais with a batch implementation, like vector_policies.vector_safe_ai, score the whole group at
+    once. Each game plays the same as play_game with the same ais and rng
+    :param num_players: Number of players in each game
+    :param player_ais: Dictionary mapping player number to ai function
+    :param rngs: Random number generator of each game, or None in place of a generator to use the random module. The
+    number of games is len(rngs)
+    :param state_class: Game state representation to play on. GameState or CompactGameState
+    :return: Final GameState of each game
+    """
+    games = []
+    for game_rng in rngs:
+        gs = state_class(num_players)
+        gs.rng = game_rng
+        games.append(gs)
+
+    pending = [gs for gs in games if not gs.is_game_over()]
+    while pending:
+        # Group the pending decisions by ai, in the order the ais are first seen
+        groups = {}
+        for gs in pending:
+            ai = player_ais.get(gs.player_turn)
+            groups.setdefault(id(ai), (ai, []))[1].append(gs)
+
+        for ai, group in groups.values():
+            chosen_actions = decide_batch(ai, group, [gs.get_next_actions() for gs in group])
+            for gs, chosen_action in zip(group, chosen_actions):
+                gs.resolve_action(chosen_action)
+        pending = [gs for gs in pending if not gs.is_game_over()]
+
+    return games
+
+
+def simulate_games(num_games: int, num_processes: int = None, seed: int = 0, results_path: str = None,
+                   plot: bool = True, plot_path: str = None, checkpoint_path: str = None) -> None:
     """
     Simulates num_games and plot the results. The number of worms held by the player is the x-axis and the number
     of games with that number of worms is the y-axis
 
     Games are simulated with a set of ai functions defined in the function
     :param num_games: Number of games to simulate
+    :param num_processes: Number of worker processes to simulate games in. Defaults to the number of cores
+    :param seed: Seed for the simulated games
+    :param results_path: Optional CSV file to append a record of every game to. See results.aggregate_results
+    :param plot: Plot the results when the games are finished
+    :param plot_path: Image file to save the plot to. If None, the plot is shown in a window
+    :param checkpoint_path: Optional checkpoint file to save progress to. Running again with the same checkpoint
+    resumes the games. See checkpoint.run_checkpointed_tournament
     :return: None
     """
+    from checkpoint import run_checkpointed_tournament
+    from tournament import run_tournament, TournamentSummary
+    from results import ResultsWriter, plot_worm_histograms
+
     num_players = 4
     # Assign an ai to each player
     player_ais = dict([
@@ -64,54 +144,29 @@ def simulate_games(num_games: int) -> None:
     ])
 
     # Simulate games
-    game_results = []
-    for i in range(num_games):
-        game_results.append(play_game(num_players, player_ais))
-        print(f"Finished game {i}")
-
-    domino_counts = dict()
-    for i in range(num_players):
-        domino_counts[i] = []
-    print(domino_counts)
+    if checkpoint_path is not None:
+        summary = run_checkpointed_tournament(num_games, num_players, player_ais, checkpoint_path, results_path,
+                                              num_processes=num_processes, seed=seed)
+    else:
+        summary = TournamentSummary(num_players)
+        writer = ResultsWriter(results_path, num_players) if results_path is not None else None
+        try:
+            for record in run_tournament(num_games, num_players, player_ais, num_processes=num_processes,
+                                         seed=seed):
+                summary.add(record)
+                if writer is not None:
+                    writer.add(record)
+        finally:
+            if writer is not None:
+                writer.close()
+    print(summary)
+
     # Analyze results
-    for g_num, game in enumerate(game_results):
-        # Counts for each game
-        c = game.calculate_worm_count()
-        print(c)
-        for player_num, wc in c.items():
-            domino_counts[player_num].append(wc)
-
-    print(domino_counts)
-    fig, ax = plt.subplots()
-    colors = {
-        0: "bs-",
-        1: "g^-",
-        2: "cv-",
-        3: "mh-"
-    }
-    for player_num in range(num_players):
-        dc = numpy.array(domino_counts[player_num])
-        unique, counts = numpy.unique(dc, return_counts=True)
-        c = dict(zip(unique, counts))
-        x = []
-        y = []
-        # Add 0 in for all numbers of worms that were not ended the game with
-        for _ in range(21):
-            if _ not in c:
-                x.append(_)
-                y.append(0)
-            else:
-                x.append(_)
-                y.append(c[_])
-
-        print(c)
-
-        ax.set_autoscaley_on(False)
-        ax.set_ylim([0, num_games])
-        ax.set_autoscalex_on(False)
-        ax.set_xlim([0, 20])
-        plt.plot(x, y, colors[player_num])
-    plt.show()
-
-
-simulate_games(50)
+    if plot:
+        plot_worm_histograms(summary, plot_path)
+
+
+if __name__ == "__main__":
+    set_validation_mode_from_env()
+    enable_instrumentation_from_env()
+    simulate_games(50)
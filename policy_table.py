@@ -0,0 +1,286 @@
+import argparse
+import mmap
+import random
+import struct
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+from Action import Action
+from CompactGameState import CompactGameState, DIE_SCORES
+from dice_tables import MAX_DICE, ROLL_COUNTS
+from GameState import GameState
+from solver import TurnSolver, exact_solver_ai, turn_context, ALL_DIE_NUMBERS_MASK, WORM_DIE
+
+# File layout: header, then one context key per block, then the blocks of entries. See build_policy_table
+MAGIC = b"PKPT"
+VERSION = 1
+_HEADER = struct.Struct("<4sHII")
+
+# Highest score of a turn
+MAX_SCORE = MAX_DICE * DIE_SCORES[WORM_DIE]
+
+# A context key is the worms taken at each score from MIN_DOMINO to MAX_SCORE, followed by the worms lost on a bust.
+# Turns with equal keys have the same best actions, so they share a block
+KEY_SIZE = MAX_SCORE - GameState.MIN_DOMINO + 2
+
+# Entry for taking the domino with the most worms. Other entries are action codes
+TAKE_DOMINO = 255
+
+
+def _enumerate_turn_states() -> List[Tuple[int, int, int]]:
+    # Every (saved_mask, dice_left, score) reachable in a turn
+    states = set()
+
+    def add_states(saved_mask, dice_left, score):
+        if (saved_mask, dice_left, score) in states:
+            return
+        states.add((saved_mask, dice_left, score))
+        for die in range(1, 7):
+            if not saved_mask >> die & 1:
+                for count in range(1, dice_left + 1):
+                    add_states(saved_mask | 1 << die, dice_left - count, score + DIE_SCORES[die] * count)
+
+    add_states(0, MAX_DICE, 0)
+    return sorted(states)
+
+
+def _can_roll(saved_mask: int, dice_left: int) -> bool:
+    return dice_left > 0 and saved_mask != ALL_DIE_NUMBERS_MASK
+
+
+# Turn states, in the order of their resolved entries at the start of each block
+TURN_STATES = _enumerate_turn_states()
+STATE_INDICES: Dict[Tuple[int, int, int], int] = {state: i for i, state in enumerate(TURN_STATES)}
+
+# Index of each distinct roll of n dice, keyed by its counts as in dice_tables.ROLL_COUNTS
+ROLL_INDICES: List[Dict[Tuple[int, ...], int]] = [{counts: i for i, counts in enumerate(rolls)} for rolls in ROLL_COUNTS]
+
+
+def _roll_offsets() -> Tuple[Tuple[int, ...], int]:
+    # Offset of the first roll entry of each turn state the dice can be rolled from (-1 for others), and block size
+    offsets = []
+    size = len(TURN_STATES)
+    for saved_mask, dice_left, _ in TURN_STATES:
+        if _can_roll(saved_mask, dice_left):
+            offsets.append(size)
+            size += len(ROLL_COUNTS[dice_left])
+        else:
+            offsets.append(-1)
+    return tuple(offsets), size
+
+
+ROLL_OFFSETS, BLOCK_SIZE = _roll_offsets()
+
+
+def context_key(solver: TurnSolver) -> bytes:
+    """
+    :return: Key of the block of best actions for the turns solved by solver
+    """
+    return bytes([solver.take_worms(score) for score in range(GameState.MIN_DOMINO, MAX_SCORE + 1)] +
+                 [-solver.bust_value])
+
+
+def solve_block(solver: TurnSolver) -> bytearray:
+    """
+    Best action in every decision of a turn. Ties are broken like exact_solver_ai, which takes the first best action
+    in the order of get_next_actions
+    :param solver: TurnSolver for the dominoes available in the turn
+    :return: Block of entries. Entry i is the best action once the roll of turn state TURN_STATES[i] is resolved.
+    Entry ROLL_OFFSETS[i] + j is the die number to save after rolling ROLL_COUNTS[dice_left][j] from turn state i
+    """
+    block = bytearray([Action.CODE_NEXT_PLAYER_TURN]) * BLOCK_SIZE
+    for i, (saved_mask, dice_left, score) in enumerate(TURN_STATES):
+        # Take actions come before rolling again, so a take wins ties
+        worms = solver.take_worms(score) if saved_mask >> WORM_DIE & 1 else 0
+        can_roll = _can_roll(saved_mask, dice_left)
+        if worms and (not can_roll or worms >= solver.roll_value(saved_mask, dice_left, score)):
+            block[i] = TAKE_DOMINO
+        elif can_roll:
+            block[i] = Action.CODE_ROLL_DICE
+
+        if not can_roll:
+            continue
+        for j, counts in enumerate(ROLL_COUNTS[dice_left]):
+            # Save actions are in ascending die order, so the smallest die wins ties
+            best = None
+            for die in range(1, 7):
+                count = counts[die - 1]
+                if count and not saved_mask >> die & 1:
+                    v = solver.resolved_value(saved_mask | 1 << die, dice_left - count,
+                                              score + DIE_SCORES[die] * count)
+                    if best is None or v > best:
+                        best = v
+                        block[ROLL_OFFSETS[i] + j] = die
+    return block
+
+
+class PolicyTable:
+    """
+    Best actions of every single-turn decision for a set of turn contexts, memory-mapped from a file written by
+    build_policy_table. Processes that load the same file share its pages, and each decision is an index computation
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Table file written by build_policy_table
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, num_contexts, block_size = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION or block_size != BLOCK_SIZE:
+                raise ValueError(f"{path} is not a version {VERSION} policy table")
+            self.entries = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Offset of each block in the file, keyed by context key
+        blocks_start = _HEADER.size + num_contexts * KEY_SIZE
+        self.blocks: Dict[bytes, int] = {}
+        for i in range(num_contexts):
+            start = _HEADER.size + i * KEY_SIZE
+            self.blocks[self.entries[start:start + KEY_SIZE]] = blocks_start + i * BLOCK_SIZE
+        # Block offset of each turn context looked up so far, or None if the table does not cover it
+        self._context_blocks: Dict[Tuple[int, Tuple[int, ...], int], int] = {}
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def block_offset(self, game_state: GameState) -> int:
+        """
+        :return: Offset of the block for the current turn of game_state in the file, or None if the table does not
+        cover it
+        """
+        context = turn_context(game_state)
+        if context not in self._context_blocks:
+            self._context_blocks[context] = self.blocks.get(context_key(TurnSolver(*context)))
+        return self._context_blocks[context]
+
+    def lookup(self, game_state: GameState) -> int:
+        """
+        :return: Entry for the current decision of game_state (an action code or TAKE_DOMINO), or None if the table
+        does not cover the current turn
+        """
+        block = self.block_offset(game_state)
+        if block is None:
+            return None
+        saved_mask = 0
+        score = 0
+        for die in game_state.saved_dice:
+            saved_mask |= 1 << die
+            score += DIE_SCORES[die]
+        dice_left = game_state.num_dice - len(game_state.saved_dice)
+        i = STATE_INDICES[(saved_mask, dice_left, score)]
+        if game_state.is_roll_resolved:
+            return self.entries[block + i]
+
+        counts = [0] * 6
+        for die in game_state.dice_roll:
+            counts[die - 1] += 1
+        return self.entries[block + ROLL_OFFSETS[i] + ROLL_INDICES[dice_left][tuple(counts)]]
+
+
+@lru_cache(maxsize=None)
+def load_policy_table(path: str) -> PolicyTable:
+    """
+    PolicyTable for path, opened once per process
+    """
+    return PolicyTable(path)
+
+
+class PolicyTableAi:
+    """
+    Plays like exact_solver_ai by looking up the best action in a PolicyTable. Decisions in turns the table does not
+    cover fall back to exact_solver_ai. Pickles as the table path, so tournament workers memory-map the file themselves
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Table file written by build_policy_table
+        """
+        self.path = path
+        self.num_lookups = 0
+        self.num_misses = 0
+
+    def __call__(self, game_state: GameState, possible_actions: List[Action]) -> Action:
+        if len(possible_actions) == 1:
+            return possible_actions[0]
+
+        self.num_lookups += 1
+        entry = load_policy_table(self.path).lookup(game_state)
+        if entry is None:
+            self.num_misses += 1
+            return exact_solver_ai(game_state, possible_actions)
+
+        if entry == TAKE_DOMINO:
+            best = None
+            for action in possible_actions:
+                if action.name == Action.ACTION_TAKE_DOMINO and (best is None or
+                                                                 action.optional_args[1] > best.optional_args[1]):
+                    best = action
+            return best
+        for action in possible_actions:
+            if action.to_code() == entry:
+                return action
+        raise RuntimeError(f"Policy table entry {entry} is not a possible action")
+
+
+def collect_contexts(num_games: int, num_players: int = 4, seed: int = 0,
+                     player_ai=exact_solver_ai) -> List[Tuple[int, Tuple[int, ...], int]]:
+    """
+    Turn contexts seen in seeded games, in the order they were first seen
+    :param num_games: Number of games to play
+    :param num_players: Number of players in each game
+    :param seed: Seed of the random module
+    :param player_ai: Ai for every player
+    :return: List of (community, steal_dominoes, bust_worms) arguments of TurnSolver
+    """
+    random.seed(seed)
+    contexts = {}
+    for _ in range(num_games):
+        gs = CompactGameState(num_players)
+        while not gs.is_game_over():
+            contexts.setdefault(turn_context(gs), None)
+            gs.resolve_action(player_ai(gs, gs.get_next_actions()))
+    return list(contexts)
+
+
+def build_policy_table(path: str, contexts: Iterable[Tuple[int, Tuple[int, ...], int]]) -> int:
+    """
+    Solve every single-turn decision for each turn context and write the best actions to path. The file has a
+    header (magic, version, number of blocks, block size), then the key of every block, then the blocks of one byte
+    entries. See solve_block
+    :param path: File to write
+    :param contexts: (community, steal_dominoes, bust_worms) arguments of TurnSolver. Contexts with equal keys are
+    solved once
+    :return: Number of blocks written
+    """
+    blocks = {}
+    for context in contexts:
+        solver = TurnSolver(*context)
+        key = context_key(solver)
+        if key not in blocks:
+            blocks[key] = solve_block(solver)
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(blocks), BLOCK_SIZE))
+        for key in blocks:
+            f.write(key)
+        for block in blocks.values():
+            f.write(block)
+    return len(blocks)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build a policy table for the turn contexts seen in seeded games")
+    parser.add_argument("--output", required=True, help="Table file to write")
+    parser.add_argument("--games", type=int, default=100, help="Number of games to collect turn contexts from")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    contexts = collect_contexts(args.games, args.players, args.seed)
+    num_blocks = build_policy_table(args.output, contexts)
+    print(f"Wrote {num_blocks} blocks of {BLOCK_SIZE} entries for {len(contexts)} turn contexts to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from typing import Iterable, Iterator, Tuple
+from Action import Action
+from dice_tables import ROLL_DICE
+from GameState import GameState
+
+# File layout: header, then one record per game. A game record is a game header followed by one byte per action
+# code (see Action.to_code), then the encoded dice rolls (see encode_rolls). The offset of every game record is kept
+# in an index file next to the log
+MAGIC = b"PKRL"
+VERSION = 2
+_HEADER = struct.Struct("<4sH")
+# Seed, number of players, flags, number of actions, size of the encoded rolls
+_GAME_HEADER = struct.Struct("<qBBII")
+_OFFSET = struct.Struct("<Q")
+# Flag set for games that rolled their dice with a NumPy Generator
+FLAG_NUMPY_RNG = 1
+# Range of the seeds a game record can hold
+MIN_SEED = -(1 << 63)
+MAX_SEED = (1 << 63) - 1
+
+# Recorded game. actions is a bytes of action codes and rolls a bytes of encoded rolls
+ReplayGame = namedtuple("ReplayGame", ["seed", "num_players", "use_numpy_rng", "actions", "rolls"])
+
+# Index of each roll in ROLL_DICE, keyed by its dice in ascending order
+_ROLL_INDICES = tuple({dice: i for i, dice in enumerate(rolls)} for rolls in ROLL_DICE)
+# Bytes used by the index of a roll of n dice
+_ROLL_INDEX_SIZES = tuple(1 if len(rolls) <= 256 else 2 for rolls in ROLL_DICE)
+
+
+def encode_rolls(rolls: Iterable[Tuple[int, ...]]) -> bytes:
+    """
+    Encode dice rolls as their index in dice_tables.ROLL_DICE, in one byte for rolls of up to five dice and two
+    bytes (little-endian) for more. The number of dice is not stored; the replay knows how many dice are rolled
+    :param rolls: Dice of every roll, in the order they were rolled. See GameState.dice_log
+    :return: Encoded rolls
+    """
+    encoded = bytearray()
+    for dice in rolls:
+        num_dice = len(dice)
+        i = _ROLL_INDICES[num_dice][tuple(sorted(dice))]
+        encoded += i.to_bytes(_ROLL_INDEX_SIZES[num_dice], "little")
+    return bytes(encoded)
+
+
+def check_seed(seed: int) -> None:
+    """
+    Raise ValueError if seed does not fit in a game record, so a game can be checked before it is played
+    """
+    if not isinstance(seed, int) or not MIN_SEED <= seed <= MAX_SEED:
+        raise ValueError(f"Replay seeds must be 64-bit signed integers. Got {seed!r}")
+
+
+def index_path(path: str) -> str:
+    """
+    :return: Path of the index file of the replay log at path
+    """
+    return path + ".idx"
+
+
+class ReplayWriter:
+    """
+    Appends games to a replay log. Each game is its seed, number of players, action codes and dice rolls, and takes
+    a byte per action and one or two per roll. The rolls are recorded instead of rolled again from the seed, so
+    replaying does not depend on the random number generator that rolled them
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Replay log to write. Games are appended to an existing log
+        """
+        self.path = path
+        self.log = open(path, "ab")
+        self.index = open(index_path(path), "ab")
+        if self.log.tell() == 0:
+            self.index.truncate(0)
+            self.log.write(_HEADER.pack(MAGIC, VERSION))
+        else:
+            with open(path, "rb") as f:
+                if _HEADER.unpack(f.read(_HEADER.size)) != (MAGIC, VERSION):
+                    raise ValueError(f"{path} is not a version {VERSION} replay log")
+        self.num_games = self.index.tell() // _OFFSET.size
+        self._drop_unindexed()
+
+    def _drop_unindexed(self) -> None:
+        # A crash can leave part of an offset at the end of the index and part of a game at the end of the log.
+        # Cut both back to the last indexed game, so new games are appended at aligned offsets
+        self.index.truncate(self.num_games * _OFFSET.size)
+        if self.num_games == 0:
+            end = _HEADER.size
+        else:
+            with open(index_path(self.path), "rb") as f:
+                f.seek((self.num_games - 1) * _OFFSET.size)
+                offset, = _OFFSET.unpack(f.read(_OFFSET.size))
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                _, _, _, num_actions, rolls_size = _GAME_HEADER.unpack(f.read(_GAME_HEADER.size))
+            end = offset + _GAME_HEADER.size + num_actions + rolls_size
+        self.log.truncate(end)
+        self.log.seek(0, os.SEEK_END)
+        self.index.seek(0, os.SEEK_END)
+
+    def add_game(self, seed: int, num_players: int, actions: bytes, rolls: bytes,
+                 use_numpy_rng: bool = False) -> int:
+        """
+        Record a game
+        :param seed: Seed of the game, kept to identify it. See rng.game_rng
+        :param num_players: Number of players in the game
+        :param actions: Code of every action played, in order
+        :param rolls: Every dice roll of the game, encoded with encode_rolls
+        :param use_numpy_rng: The game rolled its dice with a NumPy Generator
+        :return: Game number of the recorded game in the log
+        """
+        check_seed(seed)
+        # The game is indexed after it is written, so a game cut off by a crash is never read
+        offset = self.log.tell()
+        self.log.write(_GAME_HEADER.pack(seed, num_players, FLAG_NUMPY_RNG if use_numpy_rng else 0, len(actions),
+                                         len(rolls)))
+        self.log.write(actions)
+        self.log.write(rolls)
+        self.index.write(_OFFSET.pack(offset))
+        self.num_games += 1
+        return self.num_games - 1
+
+    def flush(self) -> None:
+        self.log.flush()
+        self.index.flush()
+
+    def close(self) -> None:
+        self.log.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ReplayReader:
+    """
+    Random access to the games of a replay log. The log is memory-mapped and the index gives the offset of every
+    game, so reading game N does not read the games before it
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Replay log written by ReplayWriter
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} replay log")
+            self.log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.offsets = array("Q")
+        with open(index_path(path), "rb") as f:
+            # Ignore an offset cut off by a crash
+            self.offsets.frombytes(f.read(os.fstat(f.fileno()).st_size // _OFFSET.size * _OFFSET.size))
+        if sys.byteorder == "big":
+            self.offsets.byteswap()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def game(self, game_num: int) -> ReplayGame:
+        """
+        :return: Recorded game number game_num
+        """
+        offset = self.offsets[game_num]
+        seed, num_players, flags, num_actions, rolls_size = _GAME_HEADER.unpack_from(self.log, offset)
+        start = offset + _GAME_HEADER.size
+        rolls_start = start + num_actions
+        return ReplayGame(seed, num_players, bool(flags & FLAG_NUMPY_RNG), self.log[start:rolls_start],
+                          self.log[rolls_start:rolls_start + rolls_size])
+
+    def __iter__(self) -> Iterator[ReplayGame]:
+        for game_num in range(len(self)):
+            yield self.game(game_num)
+
+    def replay(self, game_num: int, num_actions: int = None, state_class=GameState):
+        """
+        :return: Game state of game number game_num after its first num_actions actions. See replay_game
+        """
+        return replay_game(self.game(game_num), num_actions, state_class)
+
+    def close(self) -> None:
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def replay_game(game: ReplayGame, num_actions: int = None, state_class=GameState):
+    """
+    Rebuild the state of a recorded game by playing its actions again with its recorded dice rolls. No ais are run.
+    The state is validated according to the validation mode, so replaying with validation on checks a game that was
+    played with validation off
+    :param game: Recorded game
+    :param num_actions: Number of actions to play, or None for the whole game
+    :param state_class: Game state representation to rebuild. GameState or CompactGameState
+    :return: Game state after the actions
+    """
+    gs = state_class(game.num_players)
+    actions = game.actions if num_actions is None else game.actions[:num_actions]
+    resolve_action_code = getattr(gs, "resolve_action_code", None)
+    rolls = game.rolls
+    roll_offset = 0
+    for code in actions:
+        dice = None
+        if code == Action.CODE_ROLL_DICE:
+            num_dice = gs.num_dice - len(gs.saved_dice)
+            size = _ROLL_INDEX_SIZES[num_dice]
+            if roll_offset + size > len(rolls):
+                raise ValueError("Replay has fewer dice rolls than roll actions")
+            dice = ROLL_DICE[num_dice][int.from_bytes(rolls[roll_offset:roll_offset + size], "little")]
+            roll_offset += size
+        if resolve_action_code is not None:
+            resolve_action_code(code, dice)
+        else:
+            gs.resolve_action(Action.from_code(code), dice)
+    return gs
@@ -0,0 +1,125 @@
+import csv
+import os
+from tournament import GameRecord, TournamentSummary
+from typing import Iterable, Iterator
+
+
+class ResultsWriter:
+    """
+    Append-only CSV file of GameRecords. Records are written as they arrive, so memory does not grow with the number
+    of games and finished games survive a crash. Use as a context manager
+    """
+
+    def __init__(self, path: str, num_players: int, flush_every: int = 100):
+        """
+        :param path: CSV file to append records to. Created with a header if it does not exist
+        :param num_players: Number of players in each game
+        :param flush_every: Number of records between flushes to disk
+        """
+        self.path = path
+        self.num_players = num_players
+        self.flush_every = flush_every
+        self.num_records = 0
+
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="")
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(["game_num", "seed", "num_turns", "winner"] +
+                                  [f"worms_{p}" for p in range(num_players)])
+
+    def add(self, record: GameRecord) -> None:
+        self._writer.writerow([record.game_num, record.seed, record.num_turns, record.winner] +
+                              list(record.worm_counts))
+        self.num_records += 1
+        if self.num_records % self.flush_every == 0:
+            self._file.flush()
+
+    def add_many(self, records: Iterable[GameRecord]) -> None:
+        for record in records:
+            self.add(record)
+
+    def sync(self) -> None:
+        """
+        Write every record added so far to disk
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'ResultsWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def read_results(path: str) -> Iterator[GameRecord]:
+    """
+    Read GameRecords written by a ResultsWriter one at a time
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            values = [int(v) for v in row]
+            yield GameRecord(values[0], values[1], tuple(values[4:]), values[2], values[3])
+
+
+def aggregate_results(path: str) -> TournamentSummary:
+    """
+    Build the summary and worm count histograms of a results file. Memory does not depend on the number of games
+    """
+    summary = None
+    for record in read_results(path):
+        if summary is None:
+            summary = TournamentSummary(len(record.worm_counts))
+        summary.add(record)
+    if summary is None:
+        raise ValueError(f"{path} has no results")
+    return summary
+
+
+def plot_worm_histograms(summary: TournamentSummary, output_path: str = None) -> None:
+    """
+    Plot the results. The number of worms held by the player is the x-axis and the number of games with that number
+    of worms is the y-axis
+    :param summary: Results to plot
+    :param output_path: Image file to save the plot to. If None, the plot is shown in a window
+    :return: None
+    """
+    import matplotlib
+    if output_path is not None:
+        # Save without a display
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    colors = {
+        0: "bs-",
+        1: "g^-",
+        2: "cv-",
+        3: "mh-"
+    }
+    for player_num in range(summary.num_players):
+        c = summary.worm_count_histograms[player_num]
+        x = []
+        y = []
+        # Add 0 in for all numbers of worms that were not ended the game with
+        for _ in range(21):
+            x.append(_)
+            y.append(c.get(_, 0))
+
+        ax.set_autoscaley_on(False)
+        ax.set_ylim([0, summary.num_games])
+        ax.set_autoscalex_on(False)
+        ax.set_xlim([0, 20])
+        plt.plot(x, y, colors.get(player_num, "k.-"))
+
+    if output_path is not None:
+        fig.savefig(output_path)
+        plt.close(fig)
+    else:
+        plt.show()
@@ -0,0 +1,96 @@
+import random
+from typing import List, Sequence
+
+# Number of values drawn from a NumPy Generator at a time for each range
+DEFAULT_BLOCK_SIZE = 1024
+
+
+class NumpyRandom:
+    """
+    Random number generator backed by a NumPy Generator, with the methods of random.Random that game states, ais and
+    rollouts use (randrange, random, choice and getrandbits). Values are pre-generated in blocks for each range, so
+    dice rolls, which always draw from one of eight ranges, cost a list pop each
+    """
+
+    def __init__(self, generator, block_size: int = DEFAULT_BLOCK_SIZE):
+        """
+        :param generator: numpy.random.Generator to draw from
+        :param block_size: Number of values to pre-generate at a time for each range
+        """
+        self.generator = generator
+        self.block_size = block_size
+        self._int_blocks = {}
+        self._float_block = []
+
+    def randrange(self, stop: int) -> int:
+        """
+        :return: Random int in [0, stop)
+        """
+        block = self._int_blocks.get(stop)
+        if not block:
+            if stop <= 0:
+                raise ValueError(f"empty range for randrange({stop})")
+            block = self.generator.integers(0, stop, size=self.block_size).tolist()
+            self._int_blocks[stop] = block
+        return block.pop()
+
+    def random(self) -> float:
+        """
+        :return: Random float in [0, 1)
+        """
+        if not self._float_block:
+            self._float_block = self.generator.random(self.block_size).tolist()
+        return self._float_block.pop()
+
+    def choice(self, seq: Sequence):
+        return seq[self.randrange(len(seq))]
+
+    def getrandbits(self, k: int) -> int:
+        num_bytes = (k + 7) // 8
+        return int.from_bytes(self.generator.bytes(num_bytes), "little") >> (8 * num_bytes - k)
+
+    def spawn(self, n: int) -> List['NumpyRandom']:
+        """
+        :return: n generators with streams independent of this generator and each other
+        """
+        return [NumpyRandom(g, self.block_size) for g in self.generator.spawn(n)]
+
+
+def make_rng(seed: int = None, use_numpy: bool = False, block_size: int = DEFAULT_BLOCK_SIZE):
+    """
+    Create a random number generator for a game or an ai
+    :param seed: Seed, or None for a random seed
+    :param use_numpy: Use a NumPy Generator with pre-generated blocks of values instead of random.Random
+    :param block_size: Number of values to pre-generate at a time for each range, with use_numpy
+    :return: random.Random or NumpyRandom
+    """
+    if use_numpy:
+        import numpy as np
+        return NumpyRandom(np.random.default_rng(seed), block_size)
+    return random.Random(seed)
+
+
+def spawn_rngs(seed: int, n: int, use_numpy: bool = False, block_size: int = DEFAULT_BLOCK_SIZE) -> List:
+    """
+    Create n random number generators with independent streams, such as one per worker process or per player. The
+    same seed always gives the same streams
+    :param seed: Seed of the parent stream
+    :param n: Number of generators
+    :param use_numpy: Spawn NumPy Generators from a SeedSequence instead of random.Random
+    :return: List of random.Random or NumpyRandom
+    """
+    if use_numpy:
+        import numpy as np
+        return [NumpyRandom(np.random.default_rng(s), block_size) for s in np.random.SeedSequence(seed).spawn(n)]
+    return [random.Random(f"{seed}:{i}") for i in range(n)]
+
+
+def game_rng(seed: int, use_numpy: bool = False):
+    """
+    Dice stream of a seeded game. Tournament games and replays roll from it, so a game can be replayed from its seed
+    and actions
+    :param seed: Seed of the game
+    :param use_numpy: Use a NumPy Generator. See spawn_rngs
+    :return: random.Random or NumpyRandom
+    """
+    return spawn_rngs(seed, 1, use_numpy)[0]
@@ -0,0 +1,160 @@
+import random
+from time import perf_counter
+from typing import List
+from CompactGameState import CompactGameState, WORMS, DIE_SCORES
+from dice_tables import ROLL_COUNTS, ROLL_MASKS, sample_roll_index
+from GameState import GameState
+
+ALL_DIE_NUMBERS_MASK = 0b1111110
+WORM_DIE = 6
+
+# Die numbers set in a bitmask, in ascending order. Bit d is set for die number d
+MASK_DICE = tuple(tuple(d for d in range(1, 7) if mask >> d & 1) for mask in range(1 << 7))
+
+
+def _rollout_start(game_state):
+    # Current player's turn as ints: (saved mask, number of saved dice, score, counts of the unresolved roll or None,
+    # community bitmask, dominoes on top of the other stacks, worms lost by busting)
+    turn = game_state.player_turn
+    steal_dominoes = set()
+    if isinstance(game_state, CompactGameState):
+        for player_num, stack in enumerate(game_state.player_stacks):
+            if player_num != turn and stack:
+                steal_dominoes.add(stack[-1])
+        own_stack = game_state.player_stacks[turn]
+        bust_worms = WORMS[own_stack[-1]] if own_stack else 0
+        counts = None
+        if not game_state.is_roll_resolved:
+            counts = tuple(game_state.roll.count(d) for d in range(1, 7))
+        return (game_state.saved_mask, game_state.num_saved, game_state.score, counts, game_state.community,
+                steal_dominoes, bust_worms)
+
+    for player_num, stack in enumerate(game_state.player_states):
+        if player_num != turn and stack:
+            steal_dominoes.add(stack[-1][0])
+    own_stack = game_state.player_states[turn]
+    bust_worms = own_stack[-1][1] if own_stack else 0
+    saved_mask = 0
+    for die in game_state.saved_dice:
+        saved_mask |= 1 << die
+    counts = None
+    if not game_state.is_roll_resolved:
+        counts = tuple(game_state.dice_roll.count(d) for d in range(1, 7))
+    return (saved_mask, len(game_state.saved_dice), game_state.score, counts, game_state.community, steal_dominoes,
+            bust_worms)
+
+
+def random_rollout_worm_changes(game_state, num_rollouts: int = 1, rng=random, lengths: List[int] = None) -> List[int]:
+    """
+    Play the rest of the current player's turn randomly num_rollouts times. Every possible action is equally likely,
+    as in ai.random_rollout_result, but the turn is played on ints without changing game_state or creating Actions
+    :param game_state: GameState or CompactGameState to roll out from
+    :param num_rollouts: Number of rollouts to play
+    :param rng: Random number generator with a randrange method
+    :param lengths: Optional list to append the number of actions played in each rollout to
+    :return: Change in the current player's worm count at the end of their turn for each rollout
+    """
+    start_mask, start_saved, start_score, start_counts, community, steal_dominoes, bust_worms = \
+        _rollout_start(game_state)
+    start_roll_mask = 0
+    if start_counts is not None:
+        for die in range(1, 7):
+            if start_counts[die - 1]:
+                start_roll_mask |= 1 << die
+    randrange = rng.randrange
+
+    changes = []
+    for _ in range(num_rollouts):
+        saved_mask = start_mask
+        num_saved = start_saved
+        score = start_score
+        counts = start_counts
+        roll_mask = start_roll_mask
+        while True:
+            if counts is not None:
+                # Save a random die number that was rolled and not saved yet
+                dice = MASK_DICE[roll_mask & ~saved_mask]
+                die = dice[randrange(len(dice))] if len(dice) > 1 else dice[0]
+                count = counts[die - 1]
+                saved_mask |= 1 << die
+                num_saved += count
+                score += DIE_SCORES[die] * count
+                counts = None
+                continue
+
+            # Take the best community domino, steal a domino or roll again
+            take_worms = 0
+            steal_worms = 0
+            if saved_mask >> WORM_DIE & 1:
+                if score >= GameState.MIN_DOMINO:
+                    available = community & ((1 << (score - GameState.MIN_DOMINO + 1)) - 1)
+                    if available:
+                        take_worms = WORMS[GameState.MIN_DOMINO - 1 + available.bit_length()]
+                if score in steal_dominoes:
+                    steal_worms = WORMS[score]
+            can_roll = saved_mask != ALL_DIE_NUMBERS_MASK and num_saved < GameState.NUM_DICE
+
+            num_actions = (take_worms > 0) + (steal_worms > 0) + can_roll
+            if num_actions == 0:
+                change = -bust_worms
+                break
+            pick = randrange(num_actions) if num_actions > 1 else 0
+            if take_worms:
+                if pick == 0:
+                    change = take_worms
+                    break
+                pick -= 1
+            if steal_worms:
+                if pick == 0:
+                    change = steal_worms
+                    break
+
+            # Roll the dice that have not been saved
+            num_dice = GameState.NUM_DICE - num_saved
+            index = sample_roll_index(num_dice, rng)
+            roll_mask = ROLL_MASKS[num_dice][index]
+            if not roll_mask & ~saved_mask:
+                change = -bust_worms
+                break
+            counts = ROLL_COUNTS[num_dice][index]
+
+        changes.append(change)
+        if lengths is not None:
+            # Every save follows a roll, except a save of the starting roll. The turn ends with one more action, either
+            # a roll that busts or an action that takes a domino or ends the turn
+            num_saves = bin(saved_mask).count("1") - bin(start_mask).count("1")
+            lengths.append(2 * num_saves - (start_counts is not None) + 1)
+    return changes
+
+
+def benchmark_rollouts(num_rollouts: int = 20000, seed: int = 0) -> None:
+    """
+    Print the rollouts per second of ai.random_rollout_result and random_rollout_worm_changes from the start of a game
+    and from the middle of a turn
+    """
+    from ai import random_rollout_result
+    from validation import set_validation_mode, VALIDATION_OFF
+    set_validation_mode(VALIDATION_OFF)
+
+    mid_turn = GameState(4)
+    mid_turn.saved_dice = [6, 6, 5]
+    mid_turn.dice_roll = [1, 2, 2, 4, 5]
+    mid_turn.is_roll_resolved = False
+    for name, start in (("start of game", GameState(4)), ("mid turn", mid_turn)):
+        for state in (start, CompactGameState.from_game_state(start)):
+            random.seed(seed)
+            t = perf_counter()
+            for _ in range(num_rollouts):
+                random_rollout_result(state.__copy__(), state.player_turn)
+            baseline = num_rollouts / (perf_counter() - t)
+
+            random.seed(seed)
+            t = perf_counter()
+            random_rollout_worm_changes(state, num_rollouts)
+            kernel = num_rollouts / (perf_counter() - t)
+            print(f"{name}, {type(state).__name__}:\trandom_rollout_result {baseline:.0f}/s\t"
+                  f"random_rollout_worm_changes {kernel:.0f}/s\t({kernel / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark_rollouts()
@@ -0,0 +1,192 @@
+from functools import lru_cache
+from Action import Action
+from CompactGameState import WORMS, DIE_SCORES
+from dice_tables import non_bust_outcomes, bust_probability
+from GameState import GameState
+from typing import Dict, List, Tuple
+
+ALL_DIE_NUMBERS_MASK = 0b1111110
+WORM_DIE = 6
+
+
+class TurnSolver:
+    """
+    Exact expectimax solver for the rest of a turn. Values are the expected change in the current player's worm count
+    by the end of their turn, assuming they play optimally. States are memoized on (saved die numbers, dice left,
+    score) for a fixed set of available dominoes
+    """
+
+    def __init__(self, community: int, steal_dominoes: Tuple[int, ...], bust_worms: int):
+        """
+        :param community: Bitmask of community dominoes. Bit i is set if domino MIN_DOMINO + i is available
+        :param steal_dominoes: Dominoes on top of the other players' stacks
+        :param bust_worms: Number of worms on top of the current player's stack, lost if the player busts
+        """
+        self.community = community
+        self.steal_dominoes = steal_dominoes
+        self.bust_value = -bust_worms
+        self._resolved_values: Dict[Tuple[int, int, int], float] = {}
+        self._roll_values: Dict[Tuple[int, int, int], float] = {}
+
+    def take_worms(self, score: int) -> int:
+        """
+        :return: Worms on the best domino that can be taken with score, or 0 if no domino can be taken
+        """
+        worms = 0
+        if score >= GameState.MIN_DOMINO:
+            available = self.community & ((1 << (score - GameState.MIN_DOMINO + 1)) - 1)
+            if available:
+                worms = WORMS[GameState.MIN_DOMINO - 1 + available.bit_length()]
+        if score in self.steal_dominoes and WORMS[score] > worms:
+            worms = WORMS[score]
+        return worms
+
+    def resolved_value(self, saved_mask: int, dice_left: int, score: int) -> float:
+        """
+        Value of a state where the last roll has been resolved
+        :param saved_mask: Bitmask of saved die numbers. Bit i is set if die number i has been saved
+        :param dice_left: Number of dice that have not been saved
+        :param score: Score of the saved dice
+        """
+        key = (saved_mask, dice_left, score)
+        value = self._resolved_values.get(key)
+        if value is None:
+            # Best of taking a domino and rolling again. The player busts if neither is possible
+            choices = []
+            if saved_mask >> WORM_DIE & 1:
+                worms = self.take_worms(score)
+                if worms:
+                    choices.append(worms)
+            if dice_left > 0 and saved_mask != ALL_DIE_NUMBERS_MASK:
+                choices.append(self.roll_value(saved_mask, dice_left, score))
+            value = max(choices) if choices else self.bust_value
+            self._resolved_values[key] = value
+        return value
+
+    def roll_value(self, saved_mask: int, dice_left: int, score: int) -> float:
+        """
+        Expected value of rolling the dice left, then saving the best die number
+        """
+        key = (saved_mask, dice_left, score)
+        value = self._roll_values.get(key)
+        if value is None:
+            value = bust_probability(dice_left, saved_mask) * self.bust_value
+            for counts, probability in non_bust_outcomes(dice_left, saved_mask):
+                best = None
+                for die in range(1, 7):
+                    count = counts[die - 1]
+                    if count and not saved_mask >> die & 1:
+                        v = self.resolved_value(saved_mask | 1 << die, dice_left - count,
+                                                score + DIE_SCORES[die] * count)
+                        if best is None or v > best:
+                            best = v
+                value += probability * best
+            self._roll_values[key] = value
+        return value
+
+
+def _new_turn_solver(community: int, steal_dominoes: Tuple[int, ...], bust_worms: int) -> TurnSolver:
+    """
+    Shared TurnSolver for a set of available dominoes, so solved states are reused across decisions and turns. The
+    most recently used solvers are kept. See set_turn_solver_cache_size
+    """
+    return TurnSolver(community, steal_dominoes, bust_worms)
+
+
+# Number of TurnSolvers kept by get_turn_solver. A solved turn holds about 0.3 MB of tables, and every tournament
+# worker process keeps its own cache
+DEFAULT_TURN_SOLVER_CACHE_SIZE = 32
+
+get_turn_solver = lru_cache(maxsize=DEFAULT_TURN_SOLVER_CACHE_SIZE)(_new_turn_solver)
+
+
+def set_turn_solver_cache_size(maxsize: int) -> None:
+    """
+    Change the number of TurnSolvers kept by get_turn_solver. Drops the solvers kept so far
+    :param maxsize: Number of solvers to keep. None keeps every solver
+    """
+    global get_turn_solver
+    get_turn_solver.cache_clear()
+    get_turn_solver = lru_cache(maxsize=maxsize)(_new_turn_solver)
+
+
+def clear_turn_solver_cache() -> None:
+    """
+    Drop the TurnSolvers kept by get_turn_solver to free their memory
+    """
+    get_turn_solver.cache_clear()
+
+
+def turn_context(game_state: GameState) -> Tuple[int, Tuple[int, ...], int]:
+    """
+    :return: Arguments of TurnSolver for the dominoes available to the current player of game_state, as (community,
+    steal_dominoes, bust_worms)
+    """
+    community = game_state.community
+    steal_dominoes = []
+    bust_worms = 0
+    for player_num, dominoes in enumerate(game_state.player_states):
+        if len(dominoes) > 0:
+            if player_num == game_state.player_turn:
+                bust_worms = dominoes[-1][1]
+            else:
+                steal_dominoes.append(dominoes[-1][0])
+    return community, tuple(sorted(steal_dominoes)), bust_worms
+
+
+def get_game_state_solver(game_state: GameState) -> TurnSolver:
+    """
+    :return: TurnSolver for the dominoes available to the current player of game_state
+    """
+    return get_turn_solver(*turn_context(game_state))
+
+
+def action_values(game_state: GameState, possible_actions: List[Action]) -> List[float]:
+    """
+    Expected change in the current player's worm count by the end of their turn for each possible action, assuming
+    optimal play afterwards
+    :param game_state: Current GameState
+    :param possible_actions: Possible actions to take
+    :return: Value of each action, in the same order as possible_actions
+    """
+    solver = get_game_state_solver(game_state)
+    saved_mask = 0
+    score = 0
+    for die in game_state.saved_dice:
+        saved_mask |= 1 << die
+        score += DIE_SCORES[die]
+    dice_left = game_state.num_dice - len(game_state.saved_dice)
+
+    values = []
+    for action in possible_actions:
+        if action.name == Action.ACTION_SAVE_DICE:
+            die = action.optional_args
+            count = game_state.dice_roll.count(die)
+            values.append(solver.resolved_value(saved_mask | 1 << die, dice_left - count,
+                                                score + DIE_SCORES[die] * count))
+        elif action.name == Action.ACTION_TAKE_DOMINO:
+            values.append(action.optional_args[1])
+        elif action.name == Action.ACTION_ROLL_DICE:
+            values.append(solver.roll_value(saved_mask, dice_left, score))
+        else:
+            values.append(solver.bust_value)
+    return values
+
+
+def exact_solver_ai(game_state: GameState, possible_actions: List[Action]) -> Action:
+    """
+    Takes the action that maximizes the expected change in worm count by the end of the turn. Turn states are solved
+    exactly and memoized, so after warm-up each decision is a table lookup
+    :param game_state: Current GameState
+    :param possible_actions: Possible actions to take
+    :return: Next action to take
+    """
+    if len(possible_actions) == 1:
+        return possible_actions[0]
+
+    values = action_values(game_state, possible_actions)
+    best = 0
+    for i in range(1, len(values)):
+        if values[i] > values[best]:
+            best = i
+    return possible_actions[best]
@@ -0,0 +1,163 @@
+import ai as ai_module
+import random
+import unittest
+from GameState import GameState
+from Action import Action
+from CompactGameState import CompactGameState
+from time import perf_counter
+from solver import get_game_state_solver
+from ai import make_parallel_mcts_ai, make_mcts_ai, mcts_visit_counts, make_full_game_mcts_ai, policy_rollout, \
+    game_state_score, safe_ai_better_die_saving, undo_actions, make_chance_mcts_ai, SCORE_MARGIN, SCORE_RANK, \
+    SCORE_WORMS, BUST_OUTCOME, seed_search_rng, close_mcts_pools
+
+
+class AiTests(unittest.TestCase):
+    def setUp(self) -> None:
+        gs = GameState(4)
+        gs.saved_dice = [6, 6, 5, 5, 1]
+        self.game_state = CompactGameState.from_game_state(gs)
+
+    def test_mcts_visit_counts(self):
+        visit_counts = mcts_visit_counts(self.game_state, 50)
+        self.assertEqual(sum(visit_counts.values()), 49)
+        self.assertSetEqual(set(visit_counts), set(self.game_state.get_next_action_codes()))
+
+    def test_leaf_batch(self):
+        visit_counts = mcts_visit_counts(self.game_state, 50, leaf_batch=4)
+        self.assertEqual(sum(visit_counts.values()), 49)
+
+    def test_root_parallel(self):
+        ai = make_parallel_mcts_ai(2, num_sims=50)
+        possible_actions = self.game_state.get_next_actions()
+        seed_search_rng(1)
+        action = ai(self.game_state, possible_actions)
+        seed_search_rng(1)
+        self.assertEqual(ai(self.game_state, possible_actions), action)
+        self.assertIn(action, possible_actions)
+
+        workers = list(ai_module._mcts_pools[2]._pool)
+        close_mcts_pools()
+        self.assertDictEqual(ai_module._mcts_pools, {})
+        self.assertFalse(any(worker.is_alive() for worker in workers))
+        # The next search starts new workers
+        seed_search_rng(1)
+        self.assertEqual(ai(self.game_state, possible_actions), action)
+        close_mcts_pools()
+
+    def test_search_leaves_game_rng(self):
+        self.game_state.rng = random.Random(3)
+        rng_state = self.game_state.rng.getstate()
+        for ai in (make_mcts_ai(max_sims=30), make_chance_mcts_ai(max_sims=30), make_full_game_mcts_ai(max_sims=10),
+                   make_parallel_mcts_ai(2, num_sims=30)):
+            ai(self.game_state, self.game_state.get_next_actions())
+            self.assertEqual(self.game_state.rng.getstate(), rng_state)
+        close_mcts_pools()
+
+    def test_simulation_budget(self):
+        ai = make_mcts_ai(max_sims=30)
+        action = ai(self.game_state, self.game_state.get_next_actions())
+        self.assertIn(action, self.game_state.get_next_actions())
+        self.assertEqual(ai.last_num_sims, 30)
+
+    def test_time_budget(self):
+        ai = make_mcts_ai(time_budget=0.005, max_sims=100000)
+        start = perf_counter()
+        action = ai(self.game_state, self.game_state.get_next_actions())
+        self.assertLess(perf_counter() - start, 0.1)
+        self.assertGreater(ai.last_num_sims, 0)
+        self.assertIn(action, self.game_state.get_next_actions())
+
+    def test_reuse_tree(self):
+        random.seed(0)
+        seed_search_rng(0)
+        ai = make_mcts_ai(max_sims=100, reuse_tree=True)
+        gs = CompactGameState(2)
+        reused = False
+        while gs.player_turn == 0:
+            possible_actions = gs.get_next_actions()
+            action = ai(gs, possible_actions)
+            if len(possible_actions) > 1:
+                # Every state left in the tree is reachable from the root
+                self.assertTrue(all(sa[0] in ai.visited for sa in ai.Nsa))
+                reused = reused or ai.Ns[gs.canonical_key()] > ai.last_num_sims - 1
+            gs.resolve_action(action)
+        self.assertTrue(reused)
+
+        # The tree is cleared at the start of the next player's turn
+        gs.roll = (1, 2, 3, 4, 5, 6, 6, 6)
+        gs.is_roll_resolved = False
+        ai(gs, gs.get_next_actions())
+        self.assertEqual(ai.player_turn, 1)
+        self.assertEqual(ai.Ns[gs.canonical_key()], ai.last_num_sims - 1)
+
+    def test_full_game_mcts(self):
+        key = self.game_state.key()
+        for state in (self.game_state, self.game_state.to_game_state()):
+            ai = make_full_game_mcts_ai(max_sims=30, max_rollout_turns=None, scoring=SCORE_RANK)
+            self.assertIn(ai(state, state.get_next_actions()), state.get_next_actions())
+            self.assertEqual(ai.last_num_sims, 30)
+        self.assertEqual(self.game_state.key(), key)
+
+    def test_policy_rollout_turn_cap(self):
+        random.seed(0)
+        gs = CompactGameState(3)
+        key = gs.key()
+        records = []
+        policy_rollout(gs, 0, safe_ai_better_die_saving, safe_ai_better_die_saving, max_turns=2,
+                       undo_records=records)
+        self.assertEqual(gs.player_turn, 2)
+        undo_actions(gs, records)
+        self.assertEqual(gs.key(), key)
+
+    def test_game_state_score(self):
+        gs = GameState(3)
+        gs.player_states = [[(36, 4)], [(21, 1)], [(25, 2)]]
+        self.assertEqual(game_state_score(gs, 0, SCORE_WORMS), 4)
+        self.assertEqual(game_state_score(gs, 0, SCORE_MARGIN), 2)
+        self.assertEqual(game_state_score(gs, 1, SCORE_MARGIN), -3)
+        self.assertEqual(game_state_score(gs, 0, SCORE_RANK), 1)
+        self.assertEqual(game_state_score(gs, 2, SCORE_RANK), 0.5)
+
+    def test_chance_mcts(self):
+        key = self.game_state.key()
+        ai = make_chance_mcts_ai(max_sims=100, widening_constant=1, widening_exponent=0.5)
+        possible_actions = self.game_state.get_next_actions()
+        self.assertIn(ai(self.game_state, possible_actions), possible_actions)
+        self.assertEqual(self.game_state.key(), key)
+        self.assertEqual(ai.last_num_sims, 100)
+        self.assertLessEqual(ai.tree_size(), 100)
+
+        s = self.game_state.canonical_key()
+        node = ai.outcomes[s]
+        # 1, 5 and 6 are saved, so 3 dice bust with probability (3/6)^3
+        self.assertAlmostEqual(node[BUST_OUTCOME][0], 1 / 8)
+        num_rolls = ai.table.Nsa[(s, Action.CODE_ROLL_DICE)]
+        self.assertLessEqual(len(node) - 1, num_rolls ** 0.5 + 1)
+        self.assertEqual(sum([n for o, (_, n, _) in node.items() if o != BUST_OUTCOME]), num_rolls)
+
+    def test_chance_node_value_matches_solver(self):
+        # 35 with 6s and 5s saved: rolling the last die takes 36 on 1-4 and busts on 5 or 6
+        gs = CompactGameState(2)
+        for die, count in ((6, 4), (5, 3)):
+            gs.resolve_action(Action(Action.ACTION_ROLL_DICE), (die,) * count + (1,) * (8 - count - gs.num_saved))
+            gs.resolve_action(Action(Action.ACTION_SAVE_DICE, die))
+        ai = make_chance_mcts_ai(max_sims=30, widening_constant=0.25, widening_exponent=0.5, rng=random.Random(0))
+        ai(gs, gs.get_next_actions())
+
+        s = gs.canonical_key()
+        node = ai.outcomes[s]
+        # Only some of the rolls that do not bust have been tried
+        self.assertLess(len(node) - 1, 4)
+        expected = get_game_state_solver(gs).roll_value(1 << 5 | 1 << 6, 1, 35)
+        self.assertAlmostEqual(ai.table.Qsa[(s, Action.CODE_ROLL_DICE)], expected)
+
+    def test_resolve_roll_with_dice(self):
+        for gs in (self.game_state.to_game_state(), self.game_state.__copy__()):
+            key = gs.key()
+            record = gs.resolve_action(Action(Action.ACTION_ROLL_DICE), (2, 2, 3))
+            self.assertListEqual(list(gs.dice_roll), [2, 2, 3])
+            gs.undo_action(record)
+            self.assertEqual(gs.key(), key)
+
+if __name__ == '__main__':
+    unittest.main()
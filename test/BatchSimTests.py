@@ -0,0 +1,102 @@
+import random
+import unittest
+import numpy as np
+from ai import safe_ai, safe_ai_better_die_saving, random_ai
+from batch_sim import BatchGameState, simulate_batch, batch_safe_policy, batch_safe_better_die_saving_policy, \
+    BATCH_POLICIES, CUMULATIVE_WAYS_TABLES
+from CompactGameState import CompactGameState
+from dice_tables import ROLL_DICE
+from tournament import play_game_record
+from validation import set_validation_mode, VALIDATION_OFF, VALIDATION_FULL
+
+
+class RecordedDice:
+    """
+    Generator for a BatchGameState of one game that rolls the dice in rolls, in order. See BatchGameState._roll
+    """
+
+    def __init__(self, rolls):
+        self.rolls = rolls
+        self.num_rolled = 0
+
+    def integers(self, low, high, size):
+        dice = tuple(sorted(self.rolls[self.num_rolled]))
+        self.num_rolled += 1
+        # The largest draw that samples the roll
+        return np.full(size, CUMULATIVE_WAYS_TABLES[len(dice)][ROLL_DICE[len(dice)].index(dice)] - 1)
+
+
+class BatchSimTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.state = BatchGameState(2, 3, np.random.default_rng(0))
+        self.idx = np.arange(2)
+
+    def test_steal_domino(self):
+        self.state.community[:] &= ~(1 << (30 - 21))
+        self.state.stacks[:, 1, 0] = 30
+        self.state.stack_heights[:, 1] = 1
+        self.state.tops[:, 1] = 30
+        self.state.saved_mask[:] = 0b1100000
+        self.state.score[:] = 30
+        np.testing.assert_array_equal(batch_safe_policy(self.state, self.idx), [30, 30])
+
+        self.state.resolve_actions(self.idx, np.array([30, 30]))
+        np.testing.assert_array_equal(self.state.worm_counts(), [[3, 0, 0], [3, 0, 0]])
+        np.testing.assert_array_equal(self.state.player_turn, [1, 1])
+
+    def test_lose_domino(self):
+        self.state.resolve_actions(self.idx, np.array([25, 36]))
+        self.state.player_turn[:] = 0
+        self.state.resolve_actions(self.idx, np.array([7, 7]))
+        np.testing.assert_array_equal(self.state.worm_counts(), [[0, 0, 0], [0, 0, 0]])
+        # The lost domino goes back and the highest community domino is removed
+        self.assertEqual(self.state.community[0], (1 << 15) - 1)
+        self.assertEqual(self.state.community[1], (1 << 15) - 1)
+
+    def test_save_worm(self):
+        self.state.saved_mask[:] = 0b0001110
+        self.state.roll_counts[:, 5] = [3, 1]
+        self.state.roll_counts[:, 6] = [1, 1]
+        self.state.roll_mask[:] = 0b1100000
+        self.state.is_roll_resolved[:] = False
+        np.testing.assert_array_equal(batch_safe_better_die_saving_policy(self.state, self.idx), [6, 6])
+        np.testing.assert_array_equal(batch_safe_policy(self.state, self.idx), [6, 6])
+
+    def test_matches_scalar_engine_step_by_step(self):
+        # On the same dice, the batch policies choose the same actions as the ais and every action has the same effect
+        player_ais = {0: safe_ai, 1: safe_ai_better_die_saving, 2: safe_ai_better_die_saving}
+        idx = np.arange(1)
+        for seed in range(30):
+            gs = CompactGameState(3)
+            gs.rng = random.Random(seed)
+            gs.dice_log = []
+            state = BatchGameState(1, 3, RecordedDice(gs.dice_log))
+            while not gs.is_game_over():
+                action = player_ais[gs.player_turn](gs, gs.get_next_actions())
+                code = action.to_code()
+                self.assertEqual(BATCH_POLICIES[player_ais[gs.player_turn]](state, idx)[0], code)
+                gs.resolve_action(action)
+                state.resolve_actions(idx, np.array([code]))
+                self.assertEqual((state.player_turn[0], state.score[0], state.saved_mask[0], state.community[0]),
+                                 (gs.player_turn, gs.score, gs.saved_mask, gs.community))
+                self.assertEqual(tuple(state.worm_counts()[0]), gs.worm_counts)
+            self.assertEqual(state.active_games().size, 0)
+
+    def test_random_policy_matches_scalar_engine(self):
+        # Random policies draw from different streams, so compare mean worm counts within 4 standard errors
+        player_ais = {0: random_ai, 1: safe_ai, 2: random_ai}
+        batch_worms = simulate_batch(20000, 3, player_ais, seed=0).worm_counts()
+
+        set_validation_mode(VALIDATION_OFF)
+        try:
+            records = [play_game_record(3, player_ais, i, i) for i in range(2000)]
+        finally:
+            set_validation_mode(VALIDATION_FULL)
+        scalar_worms = np.array([r.worm_counts for r in records])
+        standard_error = np.sqrt(batch_worms.var(axis=0, ddof=1) / len(batch_worms) +
+                                 scalar_worms.var(axis=0, ddof=1) / len(scalar_worms))
+        np.testing.assert_array_less(np.abs(batch_worms.mean(axis=0) - scalar_worms.mean(axis=0)), 4 * standard_error)
+
+
+if __name__ == '__main__':
+    unittest.main()
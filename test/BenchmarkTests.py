@@ -0,0 +1,36 @@
+import json
+import unittest
+from benchmark import measure, compare_to_baseline, sample_states, run_benchmarks, DEFAULT_BASELINE_PATH
+from CompactGameState import CompactGameState
+from validation import get_validation_mode, set_validation_mode, VALIDATION_FULL, VALIDATION_SAMPLED
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_measure(self):
+        states = sample_states(50, CompactGameState)
+        self.assertEqual(len(states), 50)
+        result = measure(lambda: states, lambda gs: gs.get_next_actions(), repeat=2)
+        self.assertSetEqual(set(result), {"ops_per_sec", "p50_us", "p99_us", "peak_memory_kb"})
+        self.assertGreater(result["ops_per_sec"], 0)
+        self.assertLessEqual(result["p50_us"], result["p99_us"])
+
+    def test_compare_to_baseline(self):
+        baseline = {"a": {"ops_per_sec": 100.0}, "b": {"ops_per_sec": 100.0}}
+        results = {"a": {"ops_per_sec": 85.0}, "b": {"ops_per_sec": 75.0}, "c": {"ops_per_sec": 1.0}}
+        self.assertListEqual(compare_to_baseline(results, baseline, tolerance=0.2), ["b"])
+
+
+    def test_run_benchmarks(self):
+        set_validation_mode(VALIDATION_SAMPLED, 7)
+        try:
+            results = run_benchmarks(quick=True)
+            self.assertEqual(get_validation_mode(), (VALIDATION_SAMPLED, 7))
+        finally:
+            set_validation_mode(VALIDATION_FULL)
+        # The committed baseline covers every benchmark
+        with open(DEFAULT_BASELINE_PATH) as f:
+            self.assertSetEqual(set(json.load(f)["results"]), set(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
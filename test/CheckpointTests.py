@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from ai import safe_ai, safe_ai_better_die_saving, random_ai
+from checkpoint import TournamentCheckpoint, run_checkpointed_tournament
+from results import read_results
+from tournament import GameRecord, run_tournament
+
+# Number of ai decisions left before failing_ai raises, or None to never raise
+decisions_before_crash = None
+
+
+def failing_ai(game_state, possible_actions):
+    global decisions_before_crash
+    if decisions_before_crash is not None:
+        if decisions_before_crash == 0:
+            raise RuntimeError("Simulated crash")
+        decisions_before_crash -= 1
+    return safe_ai(game_state, possible_actions)
+
+
+class CheckpointTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.directory.name, "tournament.ckpt")
+        self.results_path = self.checkpoint_path + ".csv"
+
+    def tearDown(self):
+        global decisions_before_crash
+        decisions_before_crash = None
+        self.directory.cleanup()
+
+    def test_resume_after_crash(self):
+        global decisions_before_crash
+        player_ais = {0: failing_ai, 1: safe_ai_better_die_saving, 2: random_ai}
+        expected = sorted(run_tournament(20, 3, player_ais, num_processes=1, seed=5))
+
+        decisions_before_crash = 1500
+        with self.assertRaises(RuntimeError):
+            run_checkpointed_tournament(20, 3, player_ais, self.checkpoint_path, checkpoint_interval=0,
+                                        num_processes=1, seed=5)
+        checkpoint = TournamentCheckpoint.load(self.checkpoint_path)
+        self.assertGreater(checkpoint.next_game, 0)
+        self.assertLess(checkpoint.next_game, 20)
+        self.assertTrue(checkpoint.is_finished(0))
+        self.assertFalse(checkpoint.is_finished(19))
+        # A record cut off by the crash is dropped on resume
+        with open(self.results_path, "a") as f:
+            f.write("19,123")
+
+        decisions_before_crash = None
+        summary = run_checkpointed_tournament(20, 3, player_ais, self.checkpoint_path, num_processes=1, seed=5)
+        self.assertEqual(sorted(read_results(self.results_path)), expected)
+        self.assertEqual(summary.num_games, 20)
+        self.assertEqual(summary.wins, [sum(r.winner == p for r in expected) for p in range(3)])
+
+        # Resuming a finished tournament plays only the new games
+        summary = run_checkpointed_tournament(24, 3, player_ais, self.checkpoint_path, num_processes=2, seed=5)
+        self.assertEqual(summary.num_games, 24)
+        self.assertEqual(sorted(read_results(self.results_path)),
+                         sorted(run_tournament(24, 3, player_ais, num_processes=1, seed=5)))
+
+    def test_resume_after_crash_before_first_checkpoint(self):
+        global decisions_before_crash
+        player_ais = {0: failing_ai, 1: safe_ai}
+        expected = sorted(run_tournament(20, 2, player_ais, num_processes=1, seed=2))
+
+        decisions_before_crash = 1500
+        with self.assertRaises(RuntimeError):
+            run_checkpointed_tournament(20, 2, player_ais, self.checkpoint_path, checkpoint_interval=3600,
+                                        num_processes=1, seed=2)
+        self.assertEqual(TournamentCheckpoint.load(self.checkpoint_path).next_game, 0)
+
+        decisions_before_crash = None
+        summary = run_checkpointed_tournament(20, 2, player_ais, self.checkpoint_path, checkpoint_interval=3600,
+                                              num_processes=1, seed=2)
+        self.assertEqual(list(read_results(self.results_path)), expected)
+        self.assertEqual(summary.num_games, 20)
+
+    def test_out_of_order_games(self):
+        checkpoint = TournamentCheckpoint(6, 2, 0)
+        for game_num in (1, 3, 0, 5):
+            checkpoint.add(GameRecord(game_num, 0, (1, 2), 10, 1))
+        self.assertEqual((checkpoint.next_game, checkpoint.finished), (2, {3, 5}))
+        self.assertEqual(list(checkpoint.remaining_games()), [2, 4])
+
+    def test_different_tournament(self):
+        player_ais = {0: safe_ai, 1: safe_ai}
+        run_checkpointed_tournament(2, 2, player_ais, self.checkpoint_path, num_processes=1, seed=1)
+        with self.assertRaises(ValueError):
+            run_checkpointed_tournament(2, 2, player_ais, self.checkpoint_path, num_processes=1, seed=2)
+        os.remove(self.results_path)
+        with self.assertRaises(ValueError):
+            run_checkpointed_tournament(2, 2, player_ais, self.checkpoint_path, num_processes=1, seed=1)
+        # Results of another run are not counted in a new tournament
+        os.remove(self.checkpoint_path)
+        with open(self.results_path, "w") as f:
+            f.write("game_num,seed,num_turns,winner,worms_0,worms_1\n0,1,10,0,3,2\n")
+        with self.assertRaises(ValueError):
+            run_checkpointed_tournament(2, 2, player_ais, self.checkpoint_path, num_processes=1, seed=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
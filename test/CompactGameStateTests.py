@@ -0,0 +1,108 @@
+import random
+import unittest
+from GameState import GameState
+from CompactGameState import CompactGameState
+from Action import Action
+from ai import random_ai, safe_ai, safe_ai_better_die_saving, monte_carlo_ai_random_playouts, seed_search_rng
+from main import play_game
+
+
+class CompactGameStateTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.game_state = CompactGameState(4)
+
+    def test_new_game_matches_game_state(self):
+        gs = GameState(4)
+        self.assertEqual(str(self.game_state), str(gs))
+        self.assertEqual(self.game_state.key(), CompactGameState.from_game_state(gs).key())
+
+    def test_action_codes(self):
+        actions = [Action(Action.ACTION_ROLL_DICE), Action(Action.ACTION_NEXT_PLAYER_TURN),
+                   Action(Action.ACTION_SAVE_DICE, 1), Action(Action.ACTION_SAVE_DICE, 6),
+                   Action(Action.ACTION_TAKE_DOMINO, (21, 1)), Action(Action.ACTION_TAKE_DOMINO, (36, 4))]
+        for action in actions:
+            self.assertEqual(Action.from_code(action.to_code()), action)
+        self.assertEqual(len(set(a.to_code() for a in actions)), len(actions))
+
+    def test_steal_domino(self):
+        gs = GameState(4)
+        gs.community_dominoes.remove((22, 1))
+        gs.community_dominoes.remove((25, 2))
+        gs.community_dominoes.remove((30, 3))
+        gs.player_states = [[], [(22, 1), (30, 3)], [(25, 2)], []]
+        gs.saved_dice = [6, 6, 6, 5, 5, 3]
+        compact = CompactGameState.from_game_state(gs)
+        self.assertListEqual(compact.get_next_actions(), gs.get_next_actions())
+
+        compact.resolve_action(Action(Action.ACTION_TAKE_DOMINO, (30, 3)))
+        self.assertListEqual(compact.player_states, [[(30, 3)], [(22, 1)], [(25, 2)], []])
+
+    def test_key_matches_str(self):
+        a = CompactGameState(2)
+        a.roll = (3, 4)
+        a.is_roll_resolved = False
+        b = a.__copy__()
+        b.roll = (4, 3)
+        self.assertNotEqual(str(a), str(b))
+        self.assertNotEqual(a.key(), b.key())
+
+        a.resolve_action(Action(Action.ACTION_SAVE_DICE, 3))
+        b.resolve_action(Action(Action.ACTION_SAVE_DICE, 3))
+        self.assertEqual(str(a), str(b))
+        self.assertEqual(a.key(), b.key())
+
+    def test_saved_dice_order(self):
+        gs = GameState(4)
+        gs.saved_dice = [5, 5, 6, 1, 1, 1]
+        compact = CompactGameState.from_game_state(gs)
+        self.assertListEqual(compact.saved_dice, gs.saved_dice)
+        self.assertEqual(compact.score, 18)
+        self.assertEqual(str(compact.to_game_state()), str(gs))
+
+    def test_games_identical_to_game_state(self):
+        player_ais = {0: safe_ai, 1: safe_ai_better_die_saving, 2: random_ai, 3: safe_ai_better_die_saving}
+        for seed in range(20):
+            random.seed(seed)
+            expected = play_game(4, player_ais)
+            random.seed(seed)
+            actual = play_game(4, player_ais, state_class=CompactGameState)
+            self.assertEqual(str(actual), str(expected))
+
+    def test_undo_action_restores_state(self):
+        random.seed(1)
+        for _ in range(20):
+            gs = CompactGameState(3)
+            states = []
+            records = []
+            while not gs.is_game_over():
+                states.append(gs.key())
+                records.append(gs.resolve_action(random_ai(gs, gs.get_next_actions())))
+            while records:
+                gs.undo_action(records.pop())
+                self.assertEqual(gs.key(), states.pop())
+
+    def test_monte_carlo_identical_to_game_state(self):
+        gs = GameState(4)
+        gs.saved_dice = [6, 6, 5, 5, 1]
+        compact = CompactGameState.from_game_state(gs)
+        for seed in range(3):
+            seed_search_rng(seed)
+            expected = monte_carlo_ai_random_playouts(gs, gs.get_next_actions())
+            seed_search_rng(seed)
+            actual = monte_carlo_ai_random_playouts(compact, compact.get_next_actions())
+            self.assertEqual(actual, expected)
+
+    def test_monte_carlo_games_identical_to_game_state(self):
+        player_ais = {0: monte_carlo_ai_random_playouts, 1: safe_ai_better_die_saving}
+        for seed in range(2):
+            random.seed(seed)
+            seed_search_rng(seed)
+            expected = play_game(2, player_ais)
+            random.seed(seed)
+            seed_search_rng(seed)
+            actual = play_game(2, player_ais, state_class=CompactGameState)
+            self.assertEqual(str(actual), str(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
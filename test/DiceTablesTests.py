@@ -0,0 +1,45 @@
+import random
+import unittest
+from collections import Counter
+from dice_tables import roll_outcomes, non_bust_outcomes, bust_probability, sample_roll, ROLL_DICE, ROLL_COUNTS
+
+
+class DiceTablesTests(unittest.TestCase):
+    def test_roll_outcomes(self):
+        for num_dice in range(1, 9):
+            outcomes = roll_outcomes(num_dice)
+            self.assertAlmostEqual(sum(p for _, p in outcomes), 1.0)
+            self.assertTrue(all(sum(counts) == num_dice for counts, _ in outcomes))
+        self.assertEqual(len(roll_outcomes(8)), 1287)
+
+    def test_roll_dice_match_counts(self):
+        for num_dice in range(1, 9):
+            for counts, dice in zip(ROLL_COUNTS[num_dice], ROLL_DICE[num_dice]):
+                self.assertListEqual([dice.count(d) for d in range(1, 7)], list(counts))
+                self.assertListEqual(list(dice), sorted(dice))
+
+    def test_bust_probability(self):
+        for num_dice in range(1, 9):
+            for saved_mask in range(0, 128, 2):
+                non_bust = sum(p for _, p in non_bust_outcomes(num_dice, saved_mask))
+                self.assertAlmostEqual(non_bust + bust_probability(num_dice, saved_mask), 1.0)
+        self.assertAlmostEqual(bust_probability(2, 0b1100000), 1 / 9)
+
+    def test_sample_roll(self):
+        rng = random.Random(0)
+        num_samples = 60000
+        die_counts = Counter()
+        for _ in range(num_samples):
+            roll = sample_roll(3, rng)
+            self.assertEqual(len(roll), 3)
+            die_counts.update(roll)
+        for d in range(1, 7):
+            self.assertAlmostEqual(die_counts[d] / (3 * num_samples), 1 / 6, delta=0.01)
+
+        # All three dice show the same number with probability 1/36
+        same = sum(len(set(sample_roll(3, rng))) == 1 for _ in range(num_samples))
+        self.assertAlmostEqual(same / num_samples, 1 / 36, delta=0.005)
+
+
+if __name__ == '__main__':
+    unittest.main()
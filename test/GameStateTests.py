@@ -1,6 +1,8 @@
+import random
 import unittest
 from GameState import GameState
 from Action import Action
+from ai import random_ai
 
 
 class GameStateTests(unittest.TestCase):
@@ -30,7 +32,7 @@ class GameStateTests(unittest.TestCase):
         for player_num, gs_copy_player_dominoes in enumerate(gs_copy.player_states):
             self.assertListEqual(gs_copy_player_dominoes, self.game_state.player_states[player_num])
 
-        self.assertListEqual(gs_copy.community_dominoes, self.game_state.community_dominoes)
+        self.assertListEqual(list(gs_copy.community_dominoes), list(self.game_state.community_dominoes))
 
         self.assertEqual(gs_copy.player_turn, self.game_state.player_turn)
         self.assertEqual(gs_copy.num_dice, self.game_state.num_dice)
@@ -51,7 +53,7 @@ class GameStateTests(unittest.TestCase):
         gs_copy.resolve_action(action)
         self.assertListEqual(gs_copy.player_states, [[(30, 3)], [(22, 1)], [(25, 2)], []])
 
-        self.assertListEqual(self.game_state.community_dominoes, starting_dominoes)
+        self.assertListEqual(list(self.game_state.community_dominoes), starting_dominoes)
         self.assertListEqual(self.game_state.player_states, starting_player_states)
 
     def test_action_strings(self):
@@ -70,6 +72,60 @@ class GameStateTests(unittest.TestCase):
         self.assertEqual(pa[0], Action(Action.ACTION_TAKE_DOMINO, (30, 3)))
         self.assertEqual(str(pa[0]), str(Action(Action.ACTION_TAKE_DOMINO, (30, 3))))
 
+    def test_incremental_values_match_recompute(self):
+        random.seed(0)
+        for _ in range(20):
+            gs = GameState(3)
+            while not gs.is_game_over():
+                gs.resolve_action(random_ai(gs, gs.get_next_actions()))
+                self.assertEqual(gs.score, GameState.calculate_score(gs.saved_dice))
+                for player_num, dominoes in enumerate(gs.player_states):
+                    self.assertEqual(gs.get_worm_count(player_num), sum([d[1] for d in dominoes]))
+                for score in range(0, 40):
+                    expected = max([d for d in gs.community_dominoes if d[0] <= score], default=None)
+                    self.assertEqual(gs.community_dominoes.highest_at_or_below(score), expected)
+                gs.assert_valid_game_state()
+
+    def test_assigning_lists_updates_values(self):
+        self.game_state.saved_dice = [6, 6, 5]
+        self.game_state.player_states = [[(25, 2), (36, 4)], [], [(21, 1)], []]
+        self.game_state.community_dominoes = [(22, 1), (30, 3)]
+        self.assertEqual(self.game_state.score, 15)
+        self.assertEqual(self.game_state.get_worm_count(0), 6)
+        self.assertEqual(self.game_state.get_worm_count(2), 1)
+        self.assertEqual(self.game_state.community_dominoes.highest_at_or_below(29), (22, 1))
+        self.game_state.community_dominoes.remove((22, 1))
+        self.assertIsNone(self.game_state.community_dominoes.highest_at_or_below(29))
+        self.game_state.assert_valid_game_state()
+
+    def test_community_bitmask(self):
+        community_dominoes = self.game_state.community_dominoes
+        self.assertEqual(len(community_dominoes), 16)
+        self.assertEqual(community_dominoes.pop(), (36, 4))
+        community_dominoes.remove((21, 1))
+        self.assertNotIn((21, 1), community_dominoes)
+        self.assertNotIn((22, 4), community_dominoes)
+        with self.assertRaises(ValueError):
+            community_dominoes.remove((21, 1))
+        community_dominoes.add((21, 1))
+        self.assertEqual(community_dominoes[0], (21, 1))
+        self.assertEqual(community_dominoes[-1], (35, 4))
+        self.assertEqual(self.game_state.community, (1 << 15) - 1)
+
+    def test_undo_action_restores_state(self):
+        random.seed(1)
+        for _ in range(20):
+            gs = GameState(3)
+            states = []
+            records = []
+            while not gs.is_game_over():
+                states.append(str(gs))
+                records.append(gs.resolve_action(random_ai(gs, gs.get_next_actions())))
+            while records:
+                gs.undo_action(records.pop())
+                self.assertEqual(str(gs), states.pop())
+                gs.assert_valid_game_state()
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,108 @@
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from functools import partial
+from unittest import mock
+import instrumentation
+import main
+from ai import safe_ai, monte_carlo_ai_random_playouts
+from GameState import GameState
+from tournament import run_tournament
+
+
+class InstrumentationTests(unittest.TestCase):
+    def tearDown(self) -> None:
+        instrumentation.disable()
+
+    def test_records_metrics(self):
+        random.seed(0)
+        recorder = instrumentation.enable()
+        mcts_ai = partial(monte_carlo_ai_random_playouts, num_sims=20)
+        main.play_game(2, {0: mcts_ai, 1: safe_ai})
+        list(run_tournament(2, 2, {0: safe_ai, 1: safe_ai}, num_processes=1))
+
+        histograms = recorder.histograms
+        self.assertEqual(recorder.counters["games"], 3)
+        self.assertEqual(histograms["actions_per_game"].count, 3)
+        self.assertEqual(histograms["actions_per_game"].total, recorder.counters["actions"])
+        self.assertEqual(histograms["decision_latency_us.monte_carlo_ai_random_playouts"].count,
+                         sum(h.count for name, h in histograms.items()
+                             if name.startswith("decision_latency_us.monte_carlo_ai_random_playouts.")))
+        self.assertIn("decision_latency_us.safe_ai.early", histograms)
+        self.assertEqual(histograms["mcts_sims_per_decision"].max, 20)
+        self.assertGreater(histograms["mcts_tree_size"].count, 0)
+        self.assertEqual(histograms["rollout_length"].count, histograms["mcts_tree_size"].total)
+        self.assertGreater(histograms["rollout_length"].min, 0)
+        self.assertGreater(recorder.counters["GameState.__copy__"], 0)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "instrumentation.json")
+            recorder.export(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)["counters"]["games"], 3)
+
+    def test_records_metrics_in_workers(self):
+        recorder = instrumentation.enable()
+        mcts_ai = partial(monte_carlo_ai_random_playouts, num_sims=10)
+        records = list(run_tournament(6, 2, {0: mcts_ai, 1: safe_ai}, num_processes=2, seed=1))
+
+        self.assertEqual(recorder.counters["games"], 6)
+        self.assertEqual(recorder.histograms["actions_per_game"].count, 6)
+        self.assertEqual(recorder.histograms["actions_per_game"].total, recorder.counters["actions"])
+        self.assertEqual(recorder.histograms["decision_latency_us.safe_ai"].count +
+                         recorder.histograms["decision_latency_us.monte_carlo_ai_random_playouts"].count,
+                         recorder.counters["actions"])
+        self.assertGreater(recorder.histograms["mcts_sims_per_decision"].count, 0)
+        # Metrics recorded in the parent before the tournament are not counted again by forked workers
+        list(run_tournament(2, 2, {0: safe_ai, 1: safe_ai}, num_processes=2, seed=1))
+        self.assertEqual(recorder.counters["games"], 8)
+        self.assertEqual(len(records), 6)
+
+    def test_merge(self):
+        a = instrumentation.Instrumentation()
+        b = instrumentation.Instrumentation()
+        for value in (1, 5):
+            a.record("x", value, log_buckets=True)
+        b.record("x", 9, log_buckets=True)
+        b.record("y", 2)
+        b.counters["games"] += 1
+        a.merge(b.drain())
+        self.assertEqual((a.histograms["x"].count, a.histograms["x"].min, a.histograms["x"].max), (3, 1, 9))
+        self.assertEqual(a.histograms["x"].buckets, {1: 1, 8: 1, 16: 1})
+        self.assertEqual(a.histograms["y"].total, 2)
+        self.assertEqual(a.counters["games"], 1)
+        self.assertEqual((b.histograms, b.counters), ({}, {}))
+
+    def test_records_metrics_when_main_is_the_script(self):
+        # python main.py runs a copy of main as __main__, separate from the imported main module
+        spec = importlib.util.spec_from_file_location("main_script", main.__file__)
+        script = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(script)
+        play_game = script.play_game
+        with mock.patch.dict(sys.modules, {"__main__": script}):
+            recorder = instrumentation.enable()
+            script.play_game(2, {0: safe_ai, 1: safe_ai}, seed=0)
+            self.assertEqual(recorder.counters["games"], 1)
+            self.assertGreater(recorder.counters["actions"], 0)
+            instrumentation.disable()
+        self.assertIs(script.play_game, play_game)
+
+    def test_disable_removes_hooks(self):
+        play_turn = main.play_turn
+        copy = GameState.__copy__
+        instrumentation.enable()
+        self.assertIsNot(main.play_turn, play_turn)
+        recorder = instrumentation.disable()
+        self.assertIs(main.play_turn, play_turn)
+        self.assertIs(GameState.__copy__, copy)
+        GameState(2).__copy__()
+        self.assertEqual(recorder.counters["GameState.__copy__"], 0)
+        self.assertIsNone(instrumentation.instrumentation)
+
+
+if __name__ == '__main__':
+    unittest.main()
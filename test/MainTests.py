@@ -0,0 +1,41 @@
+import random
+import unittest
+from ai import decide_batch, random_ai, safe_ai, safe_ai_better_die_saving
+from CompactGameState import CompactGameState
+from GameState import GameState
+from main import play_game, play_games
+from vector_policies import vector_safe_ai, vector_safe_ai_better_die_saving
+
+
+class MainTests(unittest.TestCase):
+    def test_play_games_matches_play_game(self):
+        for state_class in (GameState, CompactGameState):
+            player_ais = {0: vector_safe_ai, 1: safe_ai, 2: vector_safe_ai_better_die_saving, 3: vector_safe_ai}
+            games = play_games(4, player_ais, [random.Random(i) for i in range(20)], state_class=state_class)
+            self.assertEqual(len(games), 20)
+            for i, gs in enumerate(games):
+                self.assertTrue(gs.is_game_over())
+                expected = play_game(4, player_ais, state_class=state_class, rng=random.Random(i))
+                self.assertEqual(str(gs), str(expected))
+
+    def test_decide_batch(self):
+        games = [CompactGameState(2) for _ in range(10)]
+        for i, gs in enumerate(games):
+            gs.rng = random.Random(i)
+            gs.resolve_action(gs.get_next_actions()[0])
+        possible_actions = [gs.get_next_actions() for gs in games]
+        expected = [safe_ai_better_die_saving(gs, actions) for gs, actions in zip(games, possible_actions)]
+        # Batch implementation and the one decision at a time fallback
+        self.assertEqual(decide_batch(vector_safe_ai_better_die_saving, games, possible_actions), expected)
+        self.assertEqual(decide_batch(safe_ai_better_die_saving, games, possible_actions), expected)
+
+    def test_seed_and_rng(self):
+        with self.assertRaises(ValueError):
+            play_game(2, {0: random_ai, 1: random_ai}, rng=random.Random(0), seed=0)
+
+    def test_play_games_no_games(self):
+        self.assertEqual(play_games(2, {0: random_ai, 1: random_ai}, []), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
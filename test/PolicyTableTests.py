@@ -0,0 +1,58 @@
+import os
+import pickle
+import random
+import tempfile
+import unittest
+from CompactGameState import CompactGameState
+from GameState import GameState
+from policy_table import PolicyTable, PolicyTableAi, build_policy_table, load_policy_table
+from solver import exact_solver_ai, turn_context
+
+
+class PolicyTableTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.path = os.path.join(tempfile.mkdtemp(), "policy_table.bin")
+
+    def tearDown(self) -> None:
+        load_policy_table.cache_clear()
+        os.remove(self.path)
+
+    def test_matches_exact_solver(self):
+        random.seed(0)
+        decisions = []
+        for state_class in (GameState, CompactGameState):
+            gs = state_class(2)
+            for _ in range(60):
+                actions = gs.get_next_actions()
+                decisions.append((gs.__copy__(), actions))
+                gs.resolve_action(exact_solver_ai(gs, actions))
+        contexts = {turn_context(gs) for gs, _ in decisions}
+        self.assertLessEqual(build_policy_table(self.path, contexts), len(contexts))
+
+        ai = PolicyTableAi(self.path)
+        for gs, actions in decisions:
+            self.assertEqual(ai(gs, actions), exact_solver_ai(gs, actions))
+        self.assertGreater(ai.num_lookups, 0)
+        self.assertEqual(ai.num_misses, 0)
+
+    def test_miss_falls_back_to_solver(self):
+        gs = GameState(2)
+        build_policy_table(self.path, [])
+        self.assertEqual(len(load_policy_table(self.path)), 0)
+
+        gs.dice_roll = [1, 2, 3, 4, 5, 6, 6, 6]
+        gs.is_roll_resolved = False
+        ai = pickle.loads(pickle.dumps(PolicyTableAi(self.path)))
+        actions = gs.get_next_actions()
+        self.assertEqual(ai(gs, actions), exact_solver_ai(gs, actions))
+        self.assertEqual(ai.num_misses, 1)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a policy table")
+        with self.assertRaises(ValueError):
+            PolicyTable(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import random
+import tempfile
+import unittest
+from functools import partial
+from ai import safe_ai, safe_ai_better_die_saving, random_ai, monte_carlo_ai_random_playouts, \
+    make_mcts_ai
+from CompactGameState import CompactGameState
+from GameState import GameState
+from main import play_game
+from replay import ReplayReader, ReplayWriter, encode_rolls, index_path, replay_game
+from rng import game_rng
+from tournament import run_tournament, game_seed
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "games.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replay_play_game(self):
+        player_ais = {0: safe_ai, 1: random_ai, 2: safe_ai_better_die_saving}
+        with ReplayWriter(self.path) as writer:
+            games = [play_game(3, player_ais, seed=seed, replay_writer=writer) for seed in range(10)]
+
+        with ReplayReader(self.path) as reader:
+            self.assertEqual(len(reader), 10)
+            for game_num, expected in enumerate(games):
+                game = reader.game(game_num)
+                self.assertEqual((game.seed, game.num_players, game.use_numpy_rng), (game_num, 3, False))
+                self.assertEqual(str(reader.replay(game_num)), str(expected))
+                self.assertEqual(str(reader.replay(game_num, state_class=CompactGameState)), str(expected))
+
+    def test_replay_intermediate_states(self):
+        random.seed(4)
+        with ReplayWriter(self.path) as writer:
+            gs = GameState(2)
+            gs.rng = game_rng(7)
+            gs.dice_log = []
+            states = [str(gs)]
+            actions = bytearray()
+            while not gs.is_game_over():
+                action = random_ai(gs, gs.get_next_actions())
+                actions.append(action.to_code())
+                gs.resolve_action(action)
+                states.append(str(gs))
+            writer.add_game(7, 2, actions, encode_rolls(gs.dice_log))
+
+        with ReplayReader(self.path) as reader:
+            for num_actions in range(0, len(states), 7):
+                self.assertEqual(str(reader.replay(0, num_actions)), states[num_actions])
+
+    def test_replay_mcts_games(self):
+        # Replays of search ais use the recorded rolls and never run the searches
+        player_ais = {0: partial(monte_carlo_ai_random_playouts, num_sims=20), 1: safe_ai_better_die_saving,
+                      2: make_mcts_ai(max_sims=20)}
+        with ReplayWriter(self.path) as writer:
+            games = [play_game(3, player_ais, seed=seed, replay_writer=writer) for seed in range(2)]
+        path = os.path.join(self.directory.name, "tournament.bin")
+        records = list(run_tournament(3, 3, player_ais, num_processes=1, replay_path=path))
+
+        with ReplayReader(self.path) as reader:
+            for game_num, expected in enumerate(games):
+                self.assertEqual(str(reader.replay(game_num)), str(expected))
+        with ReplayReader(path) as reader:
+            for record in records:
+                gs = reader.replay(record.game_num, state_class=CompactGameState)
+                worm_counts = gs.calculate_worm_count()
+                self.assertEqual(tuple([worm_counts[p] for p in range(3)]), record.worm_counts)
+
+    def test_play_game_needs_seed(self):
+        with ReplayWriter(self.path) as writer:
+            with self.assertRaises(ValueError):
+                play_game(2, {0: safe_ai, 1: safe_ai}, replay_writer=writer)
+
+    def test_seed_range(self):
+        with ReplayWriter(self.path) as writer:
+            expected = play_game(2, {0: safe_ai, 1: safe_ai}, seed=-1, replay_writer=writer)
+            # Seeds that do not fit are refused before the game is played
+            with self.assertRaises(ValueError):
+                play_game(2, {0: safe_ai, 1: safe_ai}, seed=1 << 63, replay_writer=writer)
+        with ReplayReader(self.path) as reader:
+            self.assertEqual(len(reader), 1)
+            self.assertEqual(reader.game(0).seed, -1)
+            self.assertEqual(str(reader.replay(0)), str(expected))
+
+    def test_append_and_truncated_index(self):
+        for seed in range(2):
+            with ReplayWriter(self.path) as writer:
+                play_game(2, {0: safe_ai, 1: safe_ai}, seed=seed, replay_writer=writer)
+                self.assertEqual(writer.num_games, seed + 1)
+        # A crash while writing the index leaves part of an offset, and a crash while writing a game part of a game
+        with open(index_path(self.path), "ab") as f:
+            f.write(b"\x01\x02")
+        with ReplayReader(self.path) as reader:
+            self.assertEqual([game.seed for game in reader], [0, 1])
+        with open(self.path, "ab") as f:
+            f.write(b"\x03" * 5)
+        with ReplayWriter(self.path) as writer:
+            self.assertEqual(writer.num_games, 2)
+            play_game(2, {0: safe_ai, 1: safe_ai}, seed=2, replay_writer=writer)
+        self.assertEqual(os.path.getsize(index_path(self.path)), 3 * 8)
+        with ReplayReader(self.path) as reader:
+            self.assertEqual([game.seed for game in reader], [0, 1, 2])
+            self.assertEqual(str(reader.replay(2)), str(play_game(2, {0: safe_ai, 1: safe_ai}, seed=2)))
+        with open(self.path, "wb") as f:
+            f.write(b"not a log")
+        with self.assertRaises(ValueError):
+            ReplayReader(self.path)
+
+    def test_tournament_replays(self):
+        player_ais = {0: safe_ai, 1: safe_ai_better_die_saving}
+        for num_processes, use_numpy_rng in ((1, False), (2, True)):
+            path = os.path.join(self.directory.name, f"tournament{num_processes}.bin")
+            records = list(run_tournament(12, 2, player_ais, num_processes=num_processes, seed=3,
+                                          use_numpy_rng=use_numpy_rng, replay_path=path))
+            with ReplayReader(path) as reader:
+                self.assertEqual(len(reader), 12)
+                for record in records:
+                    game = reader.game(record.game_num)
+                    self.assertEqual(game.seed, game_seed(3, record.game_num))
+                    self.assertEqual(game.use_numpy_rng, use_numpy_rng)
+                    gs = replay_game(game, state_class=CompactGameState)
+                    self.assertTrue(gs.is_game_over())
+                    worm_counts = gs.calculate_worm_count()
+                    self.assertEqual(tuple([worm_counts[p] for p in range(2)]), record.worm_counts)
+
+
+if __name__ == '__main__':
+    unittest.main()
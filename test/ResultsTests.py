@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from ai import safe_ai, random_ai
+from results import ResultsWriter, read_results, aggregate_results, plot_worm_histograms
+from tournament import run_tournament
+
+
+class ResultsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "results.csv")
+        self.records = list(run_tournament(6, 2, {0: safe_ai, 1: random_ai}, num_processes=1))
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        with ResultsWriter(self.path, 2) as writer:
+            writer.add_many(self.records[:3])
+        # Appending to an existing file does not repeat the header
+        with ResultsWriter(self.path, 2) as writer:
+            writer.add_many(self.records[3:])
+        self.assertListEqual(list(read_results(self.path)), self.records)
+
+    def test_aggregate_and_plot(self):
+        with ResultsWriter(self.path, 2) as writer:
+            writer.add_many(self.records)
+        summary = aggregate_results(self.path)
+        self.assertEqual(summary.num_games, 6)
+        self.assertEqual(sum(summary.worm_count_histograms[0].values()), 6)
+
+        plot_path = os.path.join(self.dir.name, "results.png")
+        plot_worm_histograms(summary, plot_path)
+        self.assertGreater(os.path.getsize(plot_path), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
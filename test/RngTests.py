@@ -0,0 +1,66 @@
+import pickle
+import random
+import unittest
+from functools import partial
+from ai import random_ai, safe_ai, make_mcts_ai
+from CompactGameState import CompactGameState
+from GameState import GameState
+from main import play_game
+from rng import make_rng, spawn_rngs
+from tournament import run_tournament
+
+
+class RngTests(unittest.TestCase):
+    def test_numpy_random(self):
+        a = make_rng(3, use_numpy=True, block_size=16)
+        b = make_rng(3, use_numpy=True, block_size=16)
+        values = [a.randrange(6 ** 4) for _ in range(100)]
+        self.assertListEqual(values, [b.randrange(6 ** 4) for _ in range(100)])
+        self.assertTrue(all(0 <= v < 6 ** 4 for v in values))
+        self.assertTrue(0 <= a.random() < 1)
+        self.assertIn(a.choice("abc"), "abc")
+        self.assertLess(a.getrandbits(63), 2 ** 63)
+        with self.assertRaises(ValueError):
+            a.randrange(0)
+
+    def test_spawned_streams_are_independent_and_reproducible(self):
+        for use_numpy in (False, True):
+            streams = [[rng.randrange(1000) for _ in range(20)] for rng in spawn_rngs(7, 3, use_numpy)]
+            self.assertEqual(len(set(map(tuple, streams))), 3)
+            again = [[rng.randrange(1000) for _ in range(20)] for rng in spawn_rngs(7, 3, use_numpy)]
+            self.assertListEqual(streams, again)
+
+    def test_game_rng_does_not_depend_on_global_random(self):
+        for use_numpy in (False, True):
+            games = []
+            for global_seed in range(2):
+                random.seed(global_seed)
+                player_ais = {0: partial(random_ai, rng=random.Random(1)), 1: safe_ai}
+                games.append(str(play_game(2, player_ais, state_class=CompactGameState,
+                                           rng=make_rng(5, use_numpy))))
+            self.assertEqual(games[0], games[1])
+
+    def test_mcts_rng_does_not_change_game_dice(self):
+        gs = GameState(2)
+        gs.rng = random.Random(5)
+        gs.dice_roll = [1, 2, 3, 4, 4, 5, 6, 6]
+        gs.is_roll_resolved = False
+        state = gs.rng.getstate()
+        ai = make_mcts_ai(max_sims=50, rng=random.Random(1))
+        ai(gs, gs.get_next_actions())
+        self.assertEqual(gs.rng.getstate(), state)
+
+    def test_pickle_state_with_rng(self):
+        gs = CompactGameState(2)
+        gs.rng = make_rng(1, use_numpy=True)
+        copy = pickle.loads(pickle.dumps(gs.to_game_state()))
+        self.assertEqual(tuple(copy.roll_dice(8)), gs.roll_dice(8))
+
+    def test_numpy_tournament(self):
+        records = list(run_tournament(4, 2, {0: safe_ai, 1: safe_ai}, num_processes=1, use_numpy_rng=True))
+        again = list(run_tournament(4, 2, {0: safe_ai, 1: safe_ai}, num_processes=1, use_numpy_rng=True))
+        self.assertListEqual(sorted(records), sorted(again))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import random
+import unittest
+from collections import Counter
+from GameState import GameState
+from CompactGameState import CompactGameState
+from ai import random_rollout_result
+from rollout import random_rollout_worm_changes
+from validation import set_validation_mode, VALIDATION_OFF, VALIDATION_FULL
+
+
+class RolloutTests(unittest.TestCase):
+    def setUp(self) -> None:
+        set_validation_mode(VALIDATION_OFF)
+        self.game_state = GameState(3)
+        self.game_state.player_states = [[(27, 2)], [(24, 1)], []]
+        self.game_state.community_dominoes = [d for d in self.game_state.community_dominoes
+                                              if d not in [(24, 1), (27, 2)]]
+
+    def tearDown(self) -> None:
+        set_validation_mode(VALIDATION_FULL)
+
+    def assert_same_distribution(self, game_state, num_rollouts=20000):
+        player = game_state.player_turn
+        random.seed(0)
+        expected = Counter()
+        for _ in range(num_rollouts):
+            end = random_rollout_result(game_state.__copy__(), player)
+            expected[end.get_worm_count(player) - game_state.get_worm_count(player)] += 1
+        random.seed(1)
+        actual = Counter(random_rollout_worm_changes(game_state, num_rollouts))
+
+        for change in set(expected) | set(actual):
+            self.assertAlmostEqual(actual[change] / num_rollouts, expected[change] / num_rollouts, delta=0.015)
+
+    def test_start_of_turn(self):
+        self.assert_same_distribution(self.game_state)
+
+    def test_unresolved_roll(self):
+        self.game_state.saved_dice = [6, 6, 5]
+        self.game_state.dice_roll = [1, 2, 2, 4, 5]
+        self.game_state.is_roll_resolved = False
+        self.assert_same_distribution(self.game_state)
+        self.assert_same_distribution(CompactGameState.from_game_state(self.game_state))
+
+    def test_steal(self):
+        self.game_state.saved_dice = [6, 6, 6, 3, 3]
+        self.game_state.player_turn = 2
+        self.assert_same_distribution(self.game_state)
+
+    def test_does_not_change_state(self):
+        compact = CompactGameState.from_game_state(self.game_state)
+        expected = str(self.game_state), compact.key()
+        random_rollout_worm_changes(self.game_state, 100)
+        random_rollout_worm_changes(compact, 100)
+        self.assertEqual((str(self.game_state), compact.key()), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import random
+import unittest
+from GameState import GameState
+from CompactGameState import CompactGameState
+from Action import Action
+from ai import safe_ai_better_die_saving
+from main import play_game
+import solver
+from solver import action_values, exact_solver_ai, get_game_state_solver
+
+
+class SolverTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.game_state = GameState(4)
+
+    def test_last_die(self):
+        self.game_state.saved_dice = [6, 6, 6, 6, 5, 5, 5]
+        possible_actions = self.game_state.get_next_actions()
+        values = action_values(self.game_state, possible_actions)
+        # Rolling a 1-4 takes domino 36 (4 worms). Rolling a 5 or 6 busts with no dominoes to lose
+        self.assertListEqual(values, [4, 4 * 4 / 6])
+        self.assertEqual(exact_solver_ai(self.game_state, possible_actions),
+                         Action(Action.ACTION_TAKE_DOMINO, (35, 4)))
+
+    def test_bust_loses_top_domino(self):
+        self.game_state.community_dominoes.remove((30, 3))
+        self.game_state.player_states = [[(30, 3)], [], [], []]
+        self.game_state.saved_dice = [6, 6, 6, 6, 5, 5, 5]
+        solver = get_game_state_solver(self.game_state)
+        self.assertAlmostEqual(solver.roll_value(0b1100000, 1, 35), (4 * 4 - 2 * 3) / 6)
+
+    def test_better_than_greedy(self):
+        random.seed(0)
+        player_ais = {0: exact_solver_ai, 1: safe_ai_better_die_saving}
+        worms = [0, 0]
+        for _ in range(10):
+            counts = play_game(2, player_ais, state_class=CompactGameState).calculate_worm_count()
+            worms[0] += counts[0]
+            worms[1] += counts[1]
+        self.assertGreater(worms[0], worms[1])
+
+    def test_turn_solver_cache_size(self):
+        try:
+            solver.set_turn_solver_cache_size(2)
+            for bust_worms in range(4):
+                solver.get_turn_solver(GameState(2).community, (), bust_worms)
+            self.assertEqual(solver.get_turn_solver.cache_info().currsize, 2)
+            solver.clear_turn_solver_cache()
+            self.assertEqual(solver.get_turn_solver.cache_info().currsize, 0)
+        finally:
+            solver.set_turn_solver_cache_size(solver.DEFAULT_TURN_SOLVER_CACHE_SIZE)
+        self.assertEqual(solver.get_turn_solver.cache_info().maxsize, solver.DEFAULT_TURN_SOLVER_CACHE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
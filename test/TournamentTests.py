@@ -0,0 +1,79 @@
+import random
+import unittest
+import solver
+from ai import safe_ai, safe_ai_better_die_saving, random_ai, make_mcts_ai, search_rng
+from GameState import GameState
+from tournament import run_tournament, TournamentSummary, play_game_record, game_seed
+from validation import get_validation_mode, set_validation_mode, VALIDATION_FULL, VALIDATION_OFF, VALIDATION_SAMPLED
+
+
+class TournamentTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.player_ais = {0: safe_ai, 1: safe_ai_better_die_saving, 2: random_ai}
+
+    def test_results_independent_of_processes(self):
+        serial = sorted(run_tournament(8, 3, self.player_ais, num_processes=1, seed=3))
+        parallel = sorted(run_tournament(8, 3, self.player_ais, num_processes=2, seed=3))
+        self.assertListEqual(serial, parallel)
+        self.assertListEqual([r.game_num for r in serial], list(range(8)))
+
+    def test_in_process_keeps_caller_globals(self):
+        random.seed(11)
+        random_state = random.getstate()
+        search_state = search_rng.getstate()
+        set_validation_mode(VALIDATION_SAMPLED, 7)
+        try:
+            records = list(run_tournament(3, 3, self.player_ais, num_processes=1, seed=3,
+                                          validation_mode=VALIDATION_OFF, solver_cache_size=4))
+            self.assertEqual(random.getstate(), random_state)
+            self.assertEqual(search_rng.getstate(), search_state)
+            self.assertEqual(get_validation_mode(), (VALIDATION_SAMPLED, 7))
+            self.assertEqual(solver.get_turn_solver.cache_info().maxsize, solver.DEFAULT_TURN_SOLVER_CACHE_SIZE)
+        finally:
+            set_validation_mode(VALIDATION_FULL)
+        self.assertListEqual(sorted(records), sorted(run_tournament(3, 3, self.player_ais, num_processes=2, seed=3)))
+
+    def test_state_classes_match(self):
+        seed = game_seed(0, 0)
+        self.assertEqual(play_game_record(3, self.player_ais, 0, seed),
+                         play_game_record(3, self.player_ais, 0, seed, state_class=GameState))
+
+    def test_mcts_games_reproducible(self):
+        # Searches draw from their own stream, so the dice and the decisions are the same every time
+        player_ais = {0: make_mcts_ai(max_sims=20), 1: safe_ai}
+        rolls = []
+        record = play_game_record(2, player_ais, 0, 12345, rolls=rolls)
+        for _ in range(2):
+            repeat_rolls = []
+            self.assertEqual(play_game_record(2, player_ais, 0, 12345, rolls=repeat_rolls), record)
+            self.assertListEqual(repeat_rolls, rolls)
+
+    def test_summary(self):
+        summary = TournamentSummary(3)
+        even = TournamentSummary(3)
+        odd = TournamentSummary(3)
+        records = list(run_tournament(12, 3, self.player_ais, num_processes=1))
+        for record in records:
+            summary.add(record)
+            (even if record.game_num % 2 == 0 else odd).add(record)
+        self.assertEqual(summary.num_games, 12)
+        self.assertEqual(sum(summary.wins), 12)
+        self.assertEqual(summary.total_turns, sum(r.num_turns for r in records))
+        for player_num in range(3):
+            self.assertEqual(sum(summary.worm_count_histograms[player_num].values()), 12)
+            self.assertEqual(summary.total_worms[player_num], sum(r.worm_counts[player_num] for r in records))
+
+        even.merge(odd)
+        self.assertEqual(even.num_games, summary.num_games)
+        self.assertEqual(even.total_turns, summary.total_turns)
+        self.assertListEqual(even.wins, summary.wins)
+        self.assertListEqual(even.total_worms, summary.total_worms)
+        for player_num in range(3):
+            self.assertAlmostEqual(even.mean_worms(player_num), summary.mean_worms(player_num))
+            self.assertDictEqual(dict(even.worm_count_histograms[player_num]),
+                                 dict(summary.worm_count_histograms[player_num]))
+        self.assertEqual(str(even), str(summary))
+
+
+if __name__ == '__main__':
+    unittest.main()
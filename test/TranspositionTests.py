@@ -0,0 +1,76 @@
+import unittest
+from GameState import GameState
+from CompactGameState import CompactGameState
+from Action import Action
+from ai import make_mcts_ai, mcts_visit_counts, seed_search_rng
+from transposition import TranspositionTable, EVICT_LRU, EVICT_VISITS
+
+
+class TranspositionTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.game_state = GameState(3)
+        self.game_state.saved_dice = [6, 6, 5]
+        self.game_state.dice_roll = [1, 2, 2, 4, 5]
+        self.game_state.is_roll_resolved = False
+
+    def test_save_order_has_same_canonical_key(self):
+        a = GameState(3)
+        a.saved_dice = [6, 6, 5, 5, 1]
+        b = GameState(3)
+        b.saved_dice = [1, 5, 5, 6, 6]
+        self.assertNotEqual(a.key(), b.key())
+        self.assertEqual(a.canonical_key(), b.canonical_key())
+        self.assertEqual(CompactGameState.from_game_state(a).canonical_key(),
+                         CompactGameState.from_game_state(b).canonical_key())
+
+        b.saved_dice = [1, 5, 6, 6, 6]
+        self.assertNotEqual(a.canonical_key(), b.canonical_key())
+
+    def test_limit(self):
+        for eviction in (EVICT_LRU, EVICT_VISITS):
+            seed_search_rng(0)
+            ai = make_mcts_ai(max_sims=2000, max_table_states=100, eviction=eviction)
+            action = ai(self.game_state, self.game_state.get_next_actions())
+            self.assertLessEqual(len(ai.table), 100)
+            self.assertGreater(ai.table.num_evicted, 0)
+            self.assertEqual(action, Action(Action.ACTION_SAVE_DICE, 4))
+
+    def test_visit_eviction_keeps_most_visited(self):
+        table = TranspositionTable(max_states=4, eviction=EVICT_VISITS, evict_fraction=0.5)
+        for s, n in enumerate([5, 1, 7, 2, 9]):
+            table.visited.add(s)
+            table.Ns[s] = n
+            table.Qsa[(s, 0)] = 0
+            table.Nsa[(s, 0)] = n
+        self.assertEqual(table.enforce_limit(), 3)
+        self.assertSetEqual(table.visited, {2, 4})
+        self.assertSetEqual(set(table.Nsa), {(2, 0), (4, 0)})
+
+    def test_lru_eviction_keeps_recently_updated(self):
+        table = TranspositionTable(max_states=2, evict_fraction=0.5)
+        for s in range(3):
+            table.visited.add(s)
+            table.Ns[s] = 0
+        table.Ns[0] += 1
+        table.enforce_limit()
+        self.assertSetEqual(table.visited, {0})
+
+    def test_shared_table(self):
+        seed_search_rng(0)
+        ai = make_mcts_ai(max_sims=200, share_table=True)
+        ai(self.game_state, self.game_state.get_next_actions())
+        size = len(ai.table)
+        ai(self.game_state, self.game_state.get_next_actions())
+        self.assertGreater(len(ai.table), size)
+        self.assertEqual(ai.table.Ns[self.game_state.canonical_key()], 399)
+
+    def test_search_on_both_state_classes_is_identical(self):
+        compact = CompactGameState.from_game_state(self.game_state)
+        seed_search_rng(3)
+        expected = mcts_visit_counts(self.game_state, 500)
+        seed_search_rng(3)
+        self.assertEqual(mcts_visit_counts(compact, 500), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import random
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from GameState import GameState, InvalidGameStateError
+from CompactGameState import CompactGameState
+from Action import Action
+from ai import safe_ai, random_ai
+from main import play_game
+from validation import ActionLog, check_action_log, set_validation_mode, VALIDATION_OFF, VALIDATION_SAMPLED, \
+    VALIDATION_FULL
+
+
+class ValidationTests(unittest.TestCase):
+    def tearDown(self) -> None:
+        set_validation_mode(VALIDATION_FULL)
+
+    def test_validation_off(self):
+        set_validation_mode(VALIDATION_OFF)
+        gs = GameState(4)
+        gs.saved_dice = [1] * 9
+        gs.resolve_action(Action(Action.ACTION_NEXT_PLAYER_TURN))
+        self.assertEqual(gs.player_turn, 1)
+
+    def test_validation_sampled(self):
+        set_validation_mode(VALIDATION_SAMPLED, sample_every=3)
+        gs = GameState(4)
+        self.assertEqual([gs.validation_due() for _ in range(6)], [False, False, True, False, False, True])
+
+    def test_set_validation_mode_resets_counter(self):
+        for state_class in (GameState, CompactGameState):
+            set_validation_mode(VALIDATION_SAMPLED, sample_every=5)
+            gs = state_class(4)
+            for _ in range(3):
+                gs.validation_due()
+            set_validation_mode(VALIDATION_SAMPLED, sample_every=3)
+            self.assertEqual([gs.validation_due() for _ in range(3)], [False, False, True])
+
+    def test_validation_full(self):
+        gs = CompactGameState(4)
+        gs.num_saved = 9
+        with redirect_stdout(StringIO()):
+            self.assertRaises(InvalidGameStateError, gs.resolve_action, Action(Action.ACTION_NEXT_PLAYER_TURN))
+
+    def test_replay_action_log(self):
+        set_validation_mode(VALIDATION_OFF)
+        player_ais = {0: safe_ai, 1: random_ai}
+        for state_class in (GameState, CompactGameState):
+            random.seed(5)
+            action_log = ActionLog()
+            final_state = play_game(2, player_ais, state_class=state_class, action_log=action_log)
+            self.assertEqual(str(check_action_log(action_log)), str(final_state))
+
+    def test_replay_invalid_action(self):
+        action_log = ActionLog(2)
+        action_log.actions = [Action.CODE_ROLL_DICE, Action.CODE_ROLL_DICE]
+        action_log.rolls = [(1, 1, 2, 2, 3, 3, 4, 4)]
+        with redirect_stdout(StringIO()):
+            self.assertRaises(InvalidGameStateError, check_action_log, action_log)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import random
+import unittest
+import numpy as np
+from ai import safe_ai, safe_ai_better_die_saving
+from CompactGameState import CompactGameState
+from GameState import GameState
+from vector_policies import encode_decisions, safe_policy, safe_better_die_saving_policy, vector_safe_ai, \
+    vector_safe_ai_better_die_saving
+
+
+def sample_decisions(num_decisions, state_class, seed):
+    random.seed(seed)
+    decisions = []
+    while len(decisions) < num_decisions:
+        gs = state_class(random.randint(2, 4))
+        while not gs.is_game_over() and len(decisions) < num_decisions:
+            actions = gs.get_next_actions()
+            decisions.append((gs.__copy__(), actions))
+            gs.resolve_action(random.choice(actions))
+    return decisions
+
+
+class VectorPoliciesTests(unittest.TestCase):
+    def test_scalar_wrappers_match_greedy_ais(self):
+        for state_class in (GameState, CompactGameState):
+            for gs, actions in sample_decisions(3000, state_class, 0):
+                self.assertEqual(vector_safe_ai(gs, actions), safe_ai(gs, actions))
+                self.assertEqual(vector_safe_ai_better_die_saving(gs, actions), safe_ai_better_die_saving(gs, actions))
+
+    def test_batch_matches_greedy_ais(self):
+        decisions = sample_decisions(2000, GameState, 1)
+        game_states = [gs for gs, _ in decisions]
+        possible_actions = [actions for _, actions in decisions]
+        codes, roll_counts, saved_mask = encode_decisions(game_states, possible_actions)
+        for policy, ai in ((safe_policy, safe_ai), (safe_better_die_saving_policy, safe_ai_better_die_saving)):
+            indices = policy(codes, roll_counts, saved_mask)
+            expected = [actions.index(ai(gs, actions)) for gs, actions in decisions]
+            np.testing.assert_array_equal(indices, expected)
+
+    def test_save_worm(self):
+        gs = GameState(2)
+        gs.saved_dice = [1, 2, 3]
+        gs.dice_roll = [5, 5, 5, 6, 4]
+        gs.is_roll_resolved = False
+        actions = gs.get_next_actions()
+        self.assertEqual(vector_safe_ai_better_die_saving(gs, actions).optional_args, 6)
+        self.assertEqual(vector_safe_ai(gs, actions).optional_args, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+import instrumentation
+import random
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from itertools import repeat
+from multiprocessing import Pool, cpu_count
+from ai import search_rng, seed_search_rng
+from CompactGameState import CompactGameState
+from main import play_turn
+from replay import ReplayWriter, encode_rolls
+from rng import game_rng
+import solver
+from solver import clear_turn_solver_cache, set_turn_solver_cache_size
+from typing import Dict, Iterable, Iterator, List, Tuple
+from validation import get_validation_mode, set_validation_mode
+
+# Compact result of one game. worm_counts is a tuple of the number of worms each player finished with
+GameRecord = namedtuple("GameRecord", ["game_num", "seed", "worm_counts", "num_turns", "winner"])
+
+
+def game_seed(tournament_seed: int, game_num: int) -> int:
+    """
+    Seed for a game in a tournament. Depends only on the tournament seed and game number, so results do not depend
+    on which worker plays the game
+    """
+    return random.Random(f"{tournament_seed}:{game_num}").getrandbits(63)
+
+
+def get_winner(game_state) -> int:
+    """
+    Player with the most worms. Ties are won by the tied player holding the highest domino
+    :return: Player number of the winner
+    """
+    worm_counts = game_state.calculate_worm_count()
+    return max(range(game_state.num_players),
+               key=lambda p: (worm_counts[p], max([d[0] for d in game_state.player_states[p]], default=0)))
+
+
+def play_game_record(num_players: int, player_ais, game_num: int, seed: int, state_class=CompactGameState,
+                     use_numpy_rng: bool = False, action_codes: bytearray = None,
+                     rolls: List[Tuple[int, ...]] = None) -> GameRecord:
+    """
+    Play a seeded game until the game finishes. Dice are rolled from rng.game_rng(seed), the random module is
+    seeded with seed for ais that draw from it, and ai.search_rng is seeded from seed for searches
+    :param use_numpy_rng: Roll dice with a NumPy Generator that pre-generates rolls in blocks
+    :param action_codes: Optional bytearray to append the code of every action played to. See replay.ReplayWriter
+    :param rolls: Optional list to append the dice of every roll to
+    :return: GameRecord of the finished game
+    """
+    random.seed(seed)
+    seed_search_rng(f"{seed}:search")
+    gs = state_class(num_players)
+    gs.rng = game_rng(seed, use_numpy_rng)
+    gs.dice_log = rolls
+    num_turns = 0
+    while not gs.is_game_over():
+        play_turn(gs, player_ais.get(gs.player_turn), action_codes=action_codes)
+        num_turns += 1
+
+    worm_counts = gs.calculate_worm_count()
+    return GameRecord(game_num, seed, tuple([worm_counts[p] for p in range(num_players)]), num_turns,
+                      get_winner(gs))
+
+
+def _play_game_record_task(args: Tuple) -> GameRecord:
+    return play_game_record(*args)
+
+
+def _play_game_replay_task(args: Tuple) -> Tuple[GameRecord, bytes, bytes]:
+    action_codes = bytearray()
+    rolls = []
+    return play_game_record(*args, action_codes, rolls), bytes(action_codes), encode_rolls(rolls)
+
+
+def _run_instrumented_task(args: Tuple) -> Tuple:
+    # Return the worker's metrics with the result, so the parent process can merge them
+    task_function, task = args
+    return task_function(task), instrumentation.instrumentation.drain()
+
+
+def _init_worker(tournament_seed: int, validation_mode, instrument: bool = False,
+                 solver_cache_size: int = None) -> None:
+    random.seed(tournament_seed)
+    # Forked workers start without the parent's solved turns
+    if solver_cache_size is not None:
+        set_turn_solver_cache_size(solver_cache_size)
+    else:
+        clear_turn_solver_cache()
+    if validation_mode is not None:
+        set_validation_mode(validation_mode)
+    if instrument:
+        instrumentation.enable_in_worker()
+
+
+@contextmanager
+def _keep_caller_globals(validation_mode) -> Iterator[None]:
+    # Restore the random module and search stream states and validation mode of the caller's process after playing a
+    # game in it
+    random_state = random.getstate()
+    search_state = search_rng.getstate()
+    caller_validation_mode = get_validation_mode()
+    if validation_mode is not None:
+        set_validation_mode(validation_mode)
+    try:
+        yield
+    finally:
+        random.setstate(random_state)
+        search_rng.setstate(search_state)
+        set_validation_mode(*caller_validation_mode)
+
+
+def _play_in_process(task_function, tasks: Iterator[Tuple], validation_mode, solver_cache_size: int) -> Iterator:
+    # Play the games in this process without changing the caller's random module state, validation mode or solver
+    # cache. Games seed the random module themselves, so they play the same as in a worker
+    caller_cache_size = solver.get_turn_solver.cache_info().maxsize
+    if solver_cache_size is not None:
+        set_turn_solver_cache_size(solver_cache_size)
+    try:
+        for task in tasks:
+            with _keep_caller_globals(validation_mode):
+                result = task_function(task)
+            yield result
+    finally:
+        if solver_cache_size is not None:
+            set_turn_solver_cache_size(caller_cache_size)
+
+
+def run_tournament(num_games: int, num_players: int, player_ais, num_processes: int = None, seed: int = 0,
+                   state_class=CompactGameState, validation_mode: str = None, chunksize: int = 4,
+                   use_numpy_rng: bool = False, replay_path: str = None,
+                   game_nums: Iterable[int] = None, solver_cache_size: int = None) -> Iterator[GameRecord]:
+    """
+    Play num_games seeded games across a pool of worker processes. Records are yielded as soon as games finish, so
+    results can be merged without holding every game in memory. Records may arrive out of game_num order
+    :param num_games: Number of games to play
+    :param num_players: Number of players in each game
+    :param player_ais: Dictionary mapping player number to ai function. Must be picklable
+    :param num_processes: Number of worker processes. Defaults to the number of cores. 1 plays in this process and
+    leaves its random module state, validation mode and solver cache size as they were
+    :param seed: Tournament seed. Every game is seeded from it with game_seed
+    :param state_class: Game state representation to play on. GameState or CompactGameState
+    :param validation_mode: Validation mode for the workers. See validation.set_validation_mode. None to inherit
+    :param chunksize: Number of games sent to a worker at a time
+    :param use_numpy_rng: Roll dice with NumPy Generators. See play_game_record
+    :param replay_path: Optional replay log to append every game to, in game_num order. See replay.ReplayReader
+    :param game_nums: Game numbers to play instead of every game from 0 to num_games - 1, to resume a tournament
+    :param solver_cache_size: Number of solved turns each worker keeps for the solver ais. See
+    solver.set_turn_solver_cache_size. None keeps the default
+    :return: Iterator of GameRecords
+    """
+    if num_processes is None:
+        num_processes = cpu_count()
+    if game_nums is None:
+        game_nums = range(num_games)
+    tasks = ((num_players, player_ais, game_num, game_seed(seed, game_num), state_class, use_numpy_rng)
+             for game_num in game_nums)
+    if replay_path is None:
+        task_function = _play_game_record_task
+        writer = None
+    else:
+        task_function = _play_game_replay_task
+        writer = ReplayWriter(replay_path)
+
+    try:
+        if num_processes == 1:
+            yield from _write_replays(_play_in_process(task_function, tasks, validation_mode, solver_cache_size),
+                                      writer, num_players, use_numpy_rng)
+            return
+
+        recorder = instrumentation.instrumentation
+        if recorder is not None:
+            tasks = zip(repeat(task_function), tasks)
+            task_function = _run_instrumented_task
+        with Pool(num_processes, initializer=_init_worker,
+                  initargs=(seed, validation_mode, recorder is not None, solver_cache_size)) as pool:
+            # Recorded games arrive in order, so the log can be read by game_num
+            results = pool.imap_unordered(task_function, tasks, chunksize=chunksize) if writer is None else \
+                pool.imap(task_function, tasks, chunksize=chunksize)
+            if recorder is not None:
+                results = _merge_metrics(results, recorder)
+            yield from _write_replays(results, writer, num_players, use_numpy_rng)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _merge_metrics(results: Iterator[Tuple], recorder) -> Iterator:
+    for result, metrics in results:
+        recorder.merge(metrics)
+        yield result
+
+
+def _write_replays(results: Iterator, writer: ReplayWriter, num_players: int,
+                   use_numpy_rng: bool) -> Iterator[GameRecord]:
+    # Results are GameRecords, or (GameRecord, action codes, encoded rolls) when recording
+    if writer is None:
+        yield from results
+        return
+    for record, action_codes, rolls in results:
+        writer.add_game(record.seed, num_players, action_codes, rolls, use_numpy_rng)
+        yield record
+
+
+class TournamentSummary:
+    """
+    Streaming aggregate of GameRecords. Uses memory independent of the number of games
+    """
+
+    def __init__(self, num_players: int):
+        self.num_players = num_players
+        self.num_games = 0
+        self.total_turns = 0
+        self.wins = [0] * num_players
+        self.total_worms = [0] * num_players
+        # Player number -> number of worms -> number of games the player finished with that many worms
+        self.worm_count_histograms: Dict[int, Dict[int, int]] = {p: defaultdict(int) for p in range(num_players)}
+
+    def add(self, record: GameRecord) -> None:
+        self.num_games += 1
+        self.total_turns += record.num_turns
+        self.wins[record.winner] += 1
+        for player_num, worms in enumerate(record.worm_counts):
+            self.total_worms[player_num] += worms
+            self.worm_count_histograms[player_num][worms] += 1
+
+    def merge(self, other: 'TournamentSummary') -> None:
+        """
+        Add the games aggregated in another summary to this summary
+        """
+        self.num_games += other.num_games
+        self.total_turns += other.total_turns
+        for player_num in range(self.num_players):
+            self.wins[player_num] += other.wins[player_num]
+            self.total_worms[player_num] += other.total_worms[player_num]
+            for worms, count in other.worm_count_histograms[player_num].items():
+                self.worm_count_histograms[player_num][worms] += count
+
+    def mean_worms(self, player_num: int) -> float:
+        return self.total_worms[player_num] / self.num_games if self.num_games else 0.0
+
+    def __str__(self):
+        mean_turns = self.total_turns / self.num_games if self.num_games else 0.0
+        lines = [f"Games:\t{self.num_games}\tMean turns:\t{mean_turns:.1f}"]
+        for player_num in range(self.num_players):
+            lines.append(f"Player {player_num}:\tWins:\t{self.wins[player_num]}\t"
+                         f"Mean worms:\t{self.mean_worms(player_num):.2f}")
+        return "\n".join(lines)
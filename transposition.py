@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from heapq import nsmallest
+
+EVICT_LRU = "lru"
+EVICT_VISITS = "visits"
+
+
+class _RecencyCounts(OrderedDict):
+    # Visit counts of states, ordered from least to most recently updated. mcts_search updates the count of every
+    # state it passes through, so the first states are the least recently used
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+
+
+class TranspositionTable:
+    """
+    Search statistics of Monte Carlo Tree Search, keyed on canonical state keys (see GameState.canonical_key) so that
+    states reached by saving dice in a different order share one node. Pass Qsa, Nsa, Ns and visited to run_mcts
+    along with the table. The table can be kept across decisions, since the value of a state does not depend on the
+    decision it was searched from.
+
+    When max_states is set, the table evicts states once it holds more than max_states states, either the least
+    recently used states or the least visited states.
+    """
+
+    def __init__(self, max_states: int = None, eviction: str = EVICT_LRU, evict_fraction: float = 0.1):
+        """
+        :param max_states: Maximum number of states to keep, or None to keep every state
+        :param eviction: EVICT_LRU to evict the least recently used states or EVICT_VISITS to evict the least visited
+        states
+        :param evict_fraction: Fraction of max_states to evict at once, so the cost of evicting is spread over many
+        simulations
+        """
+        if eviction not in (EVICT_LRU, EVICT_VISITS):
+            raise ValueError(f"Unknown eviction policy {eviction}")
+        if max_states is not None and max_states < 1:
+            raise ValueError(f"max_states must be >= 1. Got {max_states}")
+        self.max_states = max_states
+        self.eviction = eviction
+        self.evict_fraction = evict_fraction
+        self.num_evicted = 0
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Remove every state from the table
+        """
+        self.Qsa = {}
+        self.Nsa = {}
+        self.Ns = _RecencyCounts() if self.eviction == EVICT_LRU else {}
+        self.visited = set()
+
+    def __len__(self) -> int:
+        return len(self.visited)
+
+    def enforce_limit(self) -> int:
+        """
+        Evict states if the table holds more than max_states states
+        :return: Number of states evicted
+        """
+        if self.max_states is None or len(self.visited) <= self.max_states:
+            return 0
+
+        num_evict = len(self.visited) - int(self.max_states * (1 - self.evict_fraction))
+        if self.eviction == EVICT_LRU:
+            victims = set()
+            for s in self.Ns:
+                if len(victims) == num_evict:
+                    break
+                victims.add(s)
+        else:
+            victims = set(nsmallest(num_evict, self.Ns, key=self.Ns.get))
+
+        for s in victims:
+            del self.Ns[s]
+        self.visited -= victims
+        for sa in [sa for sa in self.Nsa if sa[0] in victims]:
+            del self.Nsa[sa]
+            del self.Qsa[sa]
+        self.num_evicted += len(victims)
+        return len(victims)
@@ -0,0 +1,129 @@
+import json
+import os
+from Action import Action
+from GameState import GameState, InvalidGameStateError
+from CompactGameState import CompactGameState
+from typing import List, Tuple
+
+VALIDATION_OFF = "off"
+VALIDATION_SAMPLED = "sampled"
+VALIDATION_FULL = "full"
+
+# Environment variable to select the validation mode without code edits. "off", "full" or "sampled:N"
+VALIDATION_ENV_VAR = "PICKOMINO_VALIDATION"
+
+DEFAULT_SAMPLE_EVERY = 1000
+
+
+def set_validation_mode(mode: str, sample_every: int = DEFAULT_SAMPLE_EVERY) -> None:
+    """
+    Select how often game states validate themselves while copying and resolving actions
+    :param mode: VALIDATION_OFF to never validate, VALIDATION_SAMPLED to validate every sample_every copies or
+    actions, or VALIDATION_FULL to validate on every copy and action
+    :param sample_every: Number of copies or actions between validations in VALIDATION_SAMPLED mode
+    :return: None
+    """
+    if mode == VALIDATION_OFF:
+        debug, validate_every = False, 1
+    elif mode == VALIDATION_SAMPLED:
+        if sample_every < 1:
+            raise ValueError(f"sample_every must be >= 1. Got {sample_every}")
+        debug, validate_every = True, sample_every
+    elif mode == VALIDATION_FULL:
+        debug, validate_every = True, 1
+    else:
+        raise ValueError(f"Unknown validation mode {mode}")
+
+    for state_class in (GameState, CompactGameState):
+        state_class.DEBUG = debug
+        state_class.VALIDATE_EVERY = validate_every
+        # Count from the start of the new mode, so sampled validation runs after exactly sample_every opportunities
+        state_class._validation_counter = 0
+
+
+def get_validation_mode() -> Tuple[str, int]:
+    """
+    :return: Current validation mode and sample_every, as passed to set_validation_mode
+    """
+    if not GameState.DEBUG:
+        return VALIDATION_OFF, DEFAULT_SAMPLE_EVERY
+    if GameState.VALIDATE_EVERY == 1:
+        return VALIDATION_FULL, DEFAULT_SAMPLE_EVERY
+    return VALIDATION_SAMPLED, GameState.VALIDATE_EVERY
+
+
+def set_validation_mode_from_env() -> None:
+    """
+    Select the validation mode from the PICKOMINO_VALIDATION environment variable, if it is set
+    :return: None
+    """
+    value = os.environ.get(VALIDATION_ENV_VAR)
+    if not value:
+        return
+    mode, _, sample_every = value.partition(":")
+    if sample_every:
+        set_validation_mode(mode, int(sample_every))
+    else:
+        set_validation_mode(mode)
+
+
+class ActionLog:
+    """
+    Record of every action played in a game and every dice roll made, in order. Can be replayed through the fully
+    validated GameState with check_action_log to reproduce bugs found in games played without validation
+    """
+
+    def __init__(self, num_players: int = 0):
+        self.num_players = num_players
+        self.actions: List[int] = []
+        self.rolls: List[Tuple[int, ...]] = []
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"num_players": self.num_players, "actions": self.actions,
+                       "rolls": [list(r) for r in self.rolls]}, f)
+
+    @staticmethod
+    def load(path: str) -> 'ActionLog':
+        with open(path) as f:
+            data = json.load(f)
+        log = ActionLog(data["num_players"])
+        log.actions = data["actions"]
+        log.rolls = [tuple(r) for r in data["rolls"]]
+        return log
+
+
+class _ReplayGameState(GameState):
+    """
+    GameState that is always fully validated and rolls the dice from a recorded list of rolls
+    """
+    DEBUG = True
+    VALIDATE_EVERY = 1
+
+    def __init__(self, num_players, rolls=()):
+        super().__init__(num_players)
+        self.recorded_rolls = iter(rolls)
+
+    def roll_dice(self, num_dice: int, dice: List[int] = None) -> List[int]:
+        dice = next(self.recorded_rolls, None)
+        if dice is None or len(dice) != num_dice:
+            raise InvalidGameStateError(f"Recorded dice roll {dice} does not match {num_dice} dice rolled",
+                                        game_state=self)
+        return list(dice)
+
+
+def check_action_log(action_log: ActionLog) -> GameState:
+    """
+    Replay a recorded game through the fully validated GameState. Every action is checked to be a possible action
+    and the state is validated before and after every action
+    :param action_log: Recorded game
+    :return: GameState after the last action in the log
+    """
+    gs = _ReplayGameState(action_log.num_players, action_log.rolls)
+    for action_num, code in enumerate(action_log.actions):
+        action = Action.from_code(code)
+        if action not in gs.get_next_actions():
+            raise InvalidGameStateError(f"Action {action_num} is not a possible action", game_state=gs,
+                                        action=action)
+        gs.resolve_action(action)
+    return gs
@@ -0,0 +1,113 @@
+import numpy as np
+from functools import partial
+from Action import Action
+from batch_sim import DIE_SCORES_TABLE, MASK_SIZES, WORM_DIE
+from GameState import GameState
+from typing import List, Tuple
+
+# Padding for rows of action codes with fewer actions than the longest row
+NO_ACTION = -1
+
+
+def encode_decisions(game_states: List, possible_actions: List[List[Action]]) -> Tuple[np.ndarray, np.ndarray,
+                                                                                       np.ndarray]:
+    """
+    Arrays of the inputs of the vectorized policies for a batch of decisions
+    :param game_states: GameState or CompactGameState of each decision
+    :param possible_actions: Possible actions of each decision
+    :return: Tuple of action codes (one row per decision, padded with NO_ACTION), dice roll face counts (indexed by
+    die number, column 0 is unused) and saved die number masks (bit d is set if die number d was saved)
+    """
+    num_decisions = len(game_states)
+    codes = np.full((num_decisions, max([len(actions) for actions in possible_actions], default=1)), NO_ACTION,
+                    dtype=np.int16)
+    roll_counts = np.zeros((num_decisions, 7), dtype=np.int16)
+    saved_mask = np.zeros(num_decisions, dtype=np.int16)
+    for i, (game_state, actions) in enumerate(zip(game_states, possible_actions)):
+        codes[i, :len(actions)] = [a.to_code() for a in actions]
+        for die in game_state.dice_roll:
+            roll_counts[i, die] += 1
+        for die in set(game_state.saved_dice):
+            saved_mask[i] |= 1 << die
+    return codes, roll_counts, saved_mask
+
+
+def _take_highest_domino(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Index of the highest domino that can be taken, and whether any domino can be taken
+    is_take = codes >= GameState.MIN_DOMINO
+    return np.argmax(np.where(is_take, codes, NO_ACTION), axis=1), is_take.any(axis=1)
+
+
+def _is_save(codes: np.ndarray) -> np.ndarray:
+    return (codes > Action.CODE_ROLL_DICE) & (codes < Action.CODE_NEXT_PLAYER_TURN)
+
+
+def _decide(codes: np.ndarray, save_index: np.ndarray) -> np.ndarray:
+    take_index, can_take = _take_highest_domino(codes)
+    index = np.where(can_take, take_index, save_index)
+    # A single possible action is always taken
+    return np.where((codes != NO_ACTION).sum(axis=1) == 1, 0, index)
+
+
+def safe_policy(codes: np.ndarray, roll_counts: np.ndarray, saved_mask: np.ndarray) -> np.ndarray:
+    """
+    Vectorized safe_ai. Takes the highest domino possible and otherwise saves the largest die number rolled
+    :param codes: Action codes of the possible actions of each decision, padded with NO_ACTION. See encode_decisions
+    :param roll_counts: Dice roll face counts of each decision. Not used by the safe policy
+    :param saved_mask: Saved die number masks of each decision. Not used by the safe policy
+    :return: Index of the chosen action in each row of codes
+    """
+    return _decide(codes, np.argmax(np.where(_is_save(codes), codes, NO_ACTION), axis=1))
+
+
+def safe_better_die_saving_policy(codes: np.ndarray, roll_counts: np.ndarray, saved_mask: np.ndarray) -> np.ndarray:
+    """
+    Vectorized safe_ai_better_die_saving. Takes the highest domino possible. Otherwise saves a worm if 3 or more die
+    numbers are saved but no worms, and otherwise saves the die number with the largest total score
+    :param codes: Action codes of the possible actions of each decision, padded with NO_ACTION. See encode_decisions
+    :param roll_counts: Dice roll face counts of each decision, indexed by die number
+    :param saved_mask: Saved die number masks of each decision
+    :return: Index of the chosen action in each row of codes
+    """
+    is_save = _is_save(codes)
+    dice = np.where(is_save, codes, 0)
+
+    # Largest total score, with ties broken by the larger die number
+    totals = np.take_along_axis(roll_counts, dice, axis=1) * DIE_SCORES_TABLE[dice] * 8 + dice
+    save_index = np.argmax(np.where(is_save, totals, NO_ACTION), axis=1)
+
+    save_worm = (MASK_SIZES[saved_mask] > 2) & ((saved_mask >> WORM_DIE) & 1 == 0) & (roll_counts[:, WORM_DIE] > 0)
+    worm_index = np.argmax(codes == WORM_DIE, axis=1)
+    return _decide(codes, np.where(save_worm, worm_index, save_index))
+
+
+def _batch_ai(policy, game_states: List, possible_actions: List[List[Action]]) -> List[Action]:
+    indices = policy(*encode_decisions(game_states, possible_actions))
+    return [actions[i] for actions, i in zip(possible_actions, indices.tolist())]
+
+
+def _scalar_ai(policy, game_state, possible_actions: List[Action]) -> Action:
+    if len(possible_actions) == 1:
+        return possible_actions[0]
+    codes, roll_counts, saved_mask = encode_decisions([game_state], [possible_actions])
+    return possible_actions[int(policy(codes, roll_counts, saved_mask)[0])]
+
+
+def vector_safe_ai(game_state: GameState, possible_actions: List[Action]) -> Action:
+    """
+    safe_ai through the vectorized safe_policy. Chooses the same actions as safe_ai
+    """
+    return _scalar_ai(safe_policy, game_state, possible_actions)
+
+
+def vector_safe_ai_better_die_saving(game_state: GameState, possible_actions: List[Action]) -> Action:
+    """
+    safe_ai_better_die_saving through the vectorized safe_better_die_saving_policy. Chooses the same actions as
+    safe_ai_better_die_saving
+    """
+    return _scalar_ai(safe_better_die_saving_policy, game_state, possible_actions)
+
+
+# Batch decision functions. See ai.decide_batch
+vector_safe_ai.decide_batch = partial(_batch_ai, safe_policy)
+vector_safe_ai_better_die_saving.decide_batch = partial(_batch_ai, safe_better_die_saving_policy)